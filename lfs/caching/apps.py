@@ -5,4 +5,6 @@ class LfsCachingAppConfig(AppConfig):
     name = "lfs.caching"
 
     def ready(self):
-        from . import listeners  # NOQA
+        from . import listeners
+
+        listeners.connect_criterion_listeners()
@@ -1,16 +1,26 @@
+from django.apps import apps
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
+from django.db import transaction
 from django.db.models.signals import post_save, m2m_changed, post_delete
 from django.db.models.signals import pre_save
 from django.db.models.signals import pre_delete
 from django.dispatch import receiver
 
-from lfs.caching.utils import clear_cache, delete_cache, invalidate_cache_group_id
+from lfs.caching.utils import cache_delete, cache_set, key_from_instance
+from lfs.caching.utils import clear_cache, delete_cache, invalidate_cache_group_id, invalidate_tags
 from lfs.cart.models import Cart
+from lfs.cart.models import CartItem
 from lfs.catalog.models import Category
+from lfs.catalog.models import DeliveryTime
 from lfs.catalog.models import Product
+from lfs.catalog.models import ProductPropertyValue
+from lfs.catalog.models import Property
+from lfs.catalog.models import PropertyOption
 from lfs.catalog.models import StaticBlock
+from lfs.catalog.settings import PROPERTY_VALUE_TYPE_VARIANT
+from lfs.core.models import Country
 from lfs.core.models import Shop
 from lfs.core.signals import cart_changed
 from lfs.core.signals import product_changed
@@ -18,31 +28,42 @@ from lfs.core.signals import category_changed
 from lfs.core.signals import shop_changed
 from lfs.core.signals import topseller_changed
 from lfs.core.signals import manufacturer_changed
-from lfs.criteria.models import (
-    CountryCriterion,
-    WeightCriterion,
-    WidthCriterion,
-    ShippingMethodCriterion,
-    PaymentMethodCriterion,
-    LengthCriterion,
-    HeightCriterion,
-    CombinedLengthAndGirthCriterion,
-    CartPriceCriterion,
-)
+from lfs.criteria.models import CountryCriterion
+from lfs.criteria.models import Criterion
 from lfs.customer_tax.models import CustomerTax
+from lfs.marketing.models import FeaturedProduct
 from lfs.marketing.models import Topseller
 from lfs.order.models import OrderItem
 from lfs.page.models import Page
+from lfs.payment.models import PaymentMethod
+from lfs.portlet.models import AverageRatingPortlet
+from lfs.portlet.models import CartPortlet
+from lfs.portlet.models import CategoriesPortlet
+from lfs.portlet.models import DeliveryTimePortlet
+from lfs.portlet.models import FeaturedPortlet
+from lfs.portlet.models import FilterPortlet
+from lfs.portlet.models import ForsalePortlet
+from lfs.portlet.models import LatestPortlet
+from lfs.portlet.models import PagesPortlet
+from lfs.portlet.models import RecentProductsPortlet
+from lfs.portlet.models import RelatedProductsPortlet
+from lfs.portlet.models import TextPortlet
+from lfs.portlet.models import TopsellerPortlet
 from lfs.shipping.models import ShippingMethod
 from lfs.tax.models import Tax
 
+from portlets.models import PortletAssignment
+from portlets.models import PortletBlocking
 from reviews.signals import review_added
 
 
 # Shop
 @receiver(shop_changed)
 def shop_changed_listener(sender, **kwargs):
-    clear_cache()
+    # Only the values which have been stored with the "shop" tag depend on the
+    # shop settings, see lfs.caching.utils.set_tagged.
+    invalidate_tags("shop")
+    delete_cache("%s-shop-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, sender.id))
 
 
 # Cart
@@ -56,6 +77,14 @@ def cart_deleted_listener(sender, instance, **kwargs):
     update_cart_cache(instance)
 
 
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def cart_item_changed_listener(sender, instance, **kwargs):
+    delete_cache("%s-cart-items-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, instance.cart_id))
+    # The memoized totals of the cart, see lfs.cart.utils.get_cart_totals
+    invalidate_tags("cart:%s" % instance.cart_id)
+
+
 # Category
 @receiver(pre_delete, sender=Category)
 def category_deleted_listener(sender, instance, **kwargs):
@@ -96,8 +125,6 @@ def manufacturer_changed_listener(sender, **kwargs):
     delete_cache("%s-manufacturer-products-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, sender.slug))
     # list of all manufacturer products
     delete_cache("%s-manufacturer-all-products-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, sender.pk))
-    # if manufacturer assignment was changed then product navigation might be different too
-    invalidate_cache_group_id("product_navigation")
 
 
 # OrderItem
@@ -109,6 +136,7 @@ def order_item_listener(sender, instance, **kwargs):
     that.
     """
     delete_cache("%s-topseller" % settings.CACHE_MIDDLEWARE_KEY_PREFIX)
+    invalidate_tags("topseller")
     try:
         for category in instance.product.get_categories(with_parents=True):
             delete_cache("%s-topseller-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, category.id))
@@ -118,9 +146,49 @@ def order_item_listener(sender, instance, **kwargs):
 
 # Page
 @receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
 def page_saved_listener(sender, instance, **kwargs):
     delete_cache("%s-page-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, instance.slug))
     delete_cache("%s-pages" % settings.CACHE_MIDDLEWARE_KEY_PREFIX)
+    invalidate_tags("pages")
+
+
+# Portlets (see lfs.portlet.utils.render_portlets)
+@receiver(post_save, sender=PortletAssignment)
+@receiver(post_delete, sender=PortletAssignment)
+@receiver(post_save, sender=PortletBlocking)
+@receiver(post_delete, sender=PortletBlocking)
+@receiver(post_save, sender=AverageRatingPortlet)
+@receiver(post_save, sender=CartPortlet)
+@receiver(post_save, sender=CategoriesPortlet)
+@receiver(post_save, sender=DeliveryTimePortlet)
+@receiver(post_save, sender=FeaturedPortlet)
+@receiver(post_save, sender=FilterPortlet)
+@receiver(post_save, sender=ForsalePortlet)
+@receiver(post_save, sender=LatestPortlet)
+@receiver(post_save, sender=PagesPortlet)
+@receiver(post_save, sender=RecentProductsPortlet)
+@receiver(post_save, sender=RelatedProductsPortlet)
+@receiver(post_save, sender=TextPortlet)
+@receiver(post_save, sender=TopsellerPortlet)
+def portlet_changed_listener(sender, instance, **kwargs):
+    invalidate_tags("portlets")
+
+
+# Featured products
+@receiver(post_save, sender=FeaturedProduct)
+@receiver(post_delete, sender=FeaturedProduct)
+def featured_product_changed_listener(sender, instance, **kwargs):
+    invalidate_tags("featured")
+
+
+# Taxes (prices within cached HTML)
+@receiver(post_save, sender=Tax)
+@receiver(post_delete, sender=Tax)
+@receiver(post_save, sender=CustomerTax)
+@receiver(post_delete, sender=CustomerTax)
+def tax_changed_listener(sender, instance, **kwargs):
+    invalidate_tags("prices")
 
 
 # Product
@@ -135,6 +203,20 @@ def product_saved_listener(sender, instance, **kwargs):
     update_category_cache(instance)
 
 
+@receiver(post_save, sender=ProductPropertyValue)
+@receiver(post_delete, sender=ProductPropertyValue)
+def product_property_value_changed_listener(sender, instance, **kwargs):
+    """Invalidates the variant signatures and the variant options matrix of
+    the parent product (see Product.get_variant_signatures and
+    Product.get_variant_options_matrix) when a variant option has been
+    changed.
+    """
+    if instance.type == PROPERTY_VALUE_TYPE_VARIANT:
+        parent_id = Product.objects.filter(pk=instance.product_id).values_list("parent_id", flat=True).first()
+        invalidate_tags("product:%s" % (parent_id or instance.product_id))
+        invalidate_cache_group_id("properties-%s" % (parent_id or instance.product_id))
+
+
 @receiver(post_save, sender=Product)
 def product_pre_saved_listener(sender, instance, **kwargs):
     """If product slug was changed we should have cleared slug based product cache"""
@@ -158,14 +240,54 @@ def product_pre_saved_listener(sender, instance, **kwargs):
 # Shipping Method
 @receiver(post_save, sender=ShippingMethod)
 def shipping_method_saved_listener(sender, instance, **kwargs):
-    delete_cache("%s-shipping-delivery-time" % settings.CACHE_MIDDLEWARE_KEY_PREFIX)
-    delete_cache("%s-shipping-delivery-time-cart" % settings.CACHE_MIDDLEWARE_KEY_PREFIX)
-    delete_cache("all_active_shipping_methods")
+    invalidate_tags("shipping")
+    delete_cache("%s-all-active-shipping-methods" % settings.CACHE_MIDDLEWARE_KEY_PREFIX)
 
 
 @receiver(post_delete, sender=ShippingMethod)
 def shipping_method_deleted_listener(sender, instance, **kwargs):
-    delete_cache("all_active_shipping_methods")
+    invalidate_tags("shipping")
+    delete_cache("%s-all-active-shipping-methods" % settings.CACHE_MIDDLEWARE_KEY_PREFIX)
+
+
+# Delivery Time
+@receiver(post_save, sender=DeliveryTime)
+@receiver(post_delete, sender=DeliveryTime)
+def delivery_time_changed_listener(sender, instance, **kwargs):
+    invalidate_tags("shipping")
+
+
+# Cached managers (see lfs.caching.utils.SimpleCacheManager)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=PaymentMethod)
+@receiver(post_save, sender=Property)
+@receiver(post_save, sender=PropertyOption)
+@receiver(post_save, sender=ShippingMethod)
+@receiver(post_save, sender=Shop)
+@receiver(post_save, sender=Tax)
+def cached_instance_saved_listener(sender, instance, **kwargs):
+    # The instance is written to the cache not before the transaction has
+    # been committed, otherwise other processes could read uncommitted (or
+    # rolled back) data. Until then, the cached value is removed.
+    cache_key = key_from_instance(instance)
+    cache_delete(cache_key)
+    if getattr(settings, "LFS_CACHE_PK_LOOKUPS", False):
+        transaction.on_commit(lambda: cache_set(cache_key, instance))
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=PaymentMethod)
+@receiver(post_delete, sender=Property)
+@receiver(post_delete, sender=PropertyOption)
+@receiver(post_delete, sender=ShippingMethod)
+@receiver(post_delete, sender=Shop)
+@receiver(post_delete, sender=Tax)
+def cached_instance_deleted_listener(sender, instance, **kwargs):
+    # The instance might have been cached again from another process before
+    # the transaction has been committed.
+    cache_key = key_from_instance(instance)
+    cache_delete(cache_key)
+    transaction.on_commit(lambda: cache_delete(cache_key))
 
 
 # Shop
@@ -231,6 +353,19 @@ def tax_rate_deleted_listener(sender, instance, **kwargs):
 
 #####
 def update_category_cache(instance):
+    tags = ["categories"]
+    if isinstance(instance, Category):
+        # The parents display the sub categories and maybe their products.
+        # This is called before the category is saved, hence the current
+        # parents are taken as well as the new ones.
+        categories = []
+        if instance.pk is not None:
+            categories.extend([instance] + instance.get_parents())
+        if instance.parent is not None:
+            categories.extend([instance.parent] + instance.parent.get_parents())
+        tags.extend(set("category:%s" % category.id for category in categories))
+    invalidate_tags(*tags)
+
     # NOTE: ATM, we clear the whole cache if a category has been changed.
     # Otherwise is lasts to long when the a category has a lot of products
     # (1000s) and the shop admin changes a category.
@@ -271,9 +406,11 @@ def update_product_cache(instance):
     else:
         parent = instance
 
-    # if product was changed then we have to clear all product_navigation caches
-    invalidate_cache_group_id("product_navigation")
     invalidate_cache_group_id("properties-%s" % parent.id)
+    categories = parent.get_categories(with_parents=True)
+    invalidate_tags(
+        "product:%s" % parent.id, "products", *["category:%s" % category.id for category in categories]
+    )
     delete_cache("%s-product-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, parent.id))
     delete_cache("%s-product-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, parent.slug))
     delete_cache("%s-product-images-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, parent.id))
@@ -285,13 +422,6 @@ def update_product_cache(instance):
         delete_cache("%s-manufacturer-all-products-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, parent.manufacturer.pk))
         delete_cache("%s-manufacturer-products-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, parent.manufacturer.slug))
 
-    try:
-        c = cache.get("%s-shipping-delivery-time" % settings.CACHE_MIDDLEWARE_KEY_PREFIX)
-        del c["%s-product-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, parent.slug)]
-        cache.set("%s-shipping-delivery-time" % settings.CACHE_MIDDLEWARE_KEY_PREFIX, c)
-    except (KeyError, TypeError):
-        pass
-
     for variant in parent.get_variants():
         delete_cache("%s-product-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, variant.id))
         delete_cache("%s-product-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, parent.slug))
@@ -309,6 +439,7 @@ def update_cart_cache(instance):
 
     delete_cache("%s-cart-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, instance.session))
     delete_cache("%s-cart-items-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, instance.id))
+    invalidate_tags("cart:%s" % instance.id)
     delete_cache("%s-cart-costs-True-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, instance.id))
     delete_cache("%s-cart-costs-False-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, instance.id))
     delete_cache("%s-shipping-delivery-time-cart" % settings.CACHE_MIDDLEWARE_KEY_PREFIX)
@@ -331,29 +462,48 @@ def update_static_block_cache(instance):
 def update_topseller_cache(topseller):
     """Deletes all topseller relevant caches."""
     delete_cache("%s-topseller" % settings.CACHE_MIDDLEWARE_KEY_PREFIX)
+    invalidate_tags("topseller")
     product = topseller.product
     for category in product.get_categories(with_parents=True):
         delete_cache("%s-topseller-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, category.id))
 
 
-@receiver(post_save, sender=WeightCriterion)
-@receiver(post_save, sender=CartPriceCriterion)
-@receiver(post_save, sender=CombinedLengthAndGirthCriterion)
-@receiver(post_save, sender=CountryCriterion)
-@receiver(post_save, sender=HeightCriterion)
-@receiver(post_save, sender=LengthCriterion)
-@receiver(post_save, sender=PaymentMethodCriterion)
-@receiver(post_save, sender=ShippingMethodCriterion)
-@receiver(post_save, sender=WidthCriterion)
-@receiver(pre_delete, sender=WeightCriterion)
-@receiver(pre_delete, sender=CartPriceCriterion)
-@receiver(pre_delete, sender=CombinedLengthAndGirthCriterion)
-@receiver(pre_delete, sender=CountryCriterion)
-@receiver(pre_delete, sender=HeightCriterion)
-@receiver(pre_delete, sender=LengthCriterion)
-@receiver(pre_delete, sender=PaymentMethodCriterion)
-@receiver(pre_delete, sender=ShippingMethodCriterion)
-@receiver(pre_delete, sender=WidthCriterion)
 def clear_criterion_cache(sender, instance, **kwargs):
     cache_key = "criteria_for_model_{}_{}".format(instance.content_id, instance.content_type_id)
     cache.delete(cache_key)
+
+
+# The rule table (see lfs.criteria.rules) holds the criteria of all objects,
+# including the ones of custom criteria, and the ids of the countries, shipping
+# and payment methods they refer to.
+def criterion_changed_listener(sender, instance, **kwargs):
+    invalidate_tags("criteria")
+
+
+def criterion_values_changed_listener(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_tags("criteria")
+
+
+def connect_criterion_listeners():
+    """Connects the criterion listeners to Criterion and all its subclasses,
+    including the ones of other applications (see LFS_CRITERIA), and to their
+    many-to-many relations. This is called when the application is ready.
+    """
+    for model in apps.get_models():
+        if not issubclass(model, Criterion):
+            continue
+
+        post_save.connect(clear_criterion_cache, sender=model)
+        pre_delete.connect(clear_criterion_cache, sender=model)
+        post_save.connect(criterion_changed_listener, sender=model)
+        post_delete.connect(criterion_changed_listener, sender=model)
+        for field in model._meta.local_many_to_many:
+            m2m_changed.connect(criterion_values_changed_listener, sender=field.remote_field.through)
+
+
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=PaymentMethod)
+@receiver(post_delete, sender=ShippingMethod)
+def criterion_value_deleted_listener(sender, instance, **kwargs):
+    invalidate_tags("criteria")
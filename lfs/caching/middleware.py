@@ -0,0 +1,38 @@
+import logging
+
+from lfs.caching.utils import start_request_cache
+from lfs.caching.utils import stop_request_cache
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCacheMiddleware(object):
+    """
+    Puts a per-request identity map in front of Django's cache, see
+    lfs.caching.utils.RequestCache. Values which are looked up several times
+    within one request (the shop, categories, products, cache group ids, ...)
+    are fetched from the cache just once. The identity map is discarded at the
+    end of the request.
+
+    The amount of hits and misses is available as ``request.cache_stats`` and
+    is logged with level DEBUG.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = start_request_cache()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_cache = stop_request_cache(token)
+            request.cache_stats = {"hits": request_cache.hits, "misses": request_cache.misses}
+
+        logger.debug(
+            "Cache lookups for %s: %s hits, %s misses",
+            request.path,
+            request_cache.hits,
+            request_cache.misses,
+        )
+        return response
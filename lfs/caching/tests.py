@@ -1,9 +1,23 @@
 # coding: utf-8
 
+from django.core.cache import cache
+from django.db.models import F
 from django.http import Http404
 from django.test import TestCase
+from django.test.utils import override_settings
+from lfs.caching.middleware import RequestCacheMiddleware
+from lfs.caching.utils import cache_get, cache_get_many, cache_set, delete_cache, get_request_cache
+from lfs.caching.utils import get_tagged, invalidate_tags, key_from_instance, set_tagged
+from lfs.caching.utils import start_request_cache, stop_request_cache
 from lfs.caching.utils import lfs_get_object, lfs_get_object_or_404
+from lfs.catalog.models import Category
 from lfs.catalog.models import Product
+from lfs.core.models import Shop
+from lfs.core.signals import category_changed
+from lfs.core.signals import product_changed
+from lfs.core.signals import shop_changed
+from lfs.tax.models import Tax
+from lfs.tests.utils import RequestFactory
 
 
 class CachingTestCase(TestCase):
@@ -14,3 +28,134 @@ class CachingTestCase(TestCase):
 
     def test_lfs_get_object_or_404(self):
         self.assertRaises(Http404, lfs_get_object_or_404, Product, slug="zażółćgęśląjaźń")
+
+
+class TaggedCacheTestCase(TestCase):
+    fixtures = ["lfs_shop.xml"]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidate_tags(self):
+        set_tagged("tagged-1", "value-1", ["shop", "product:1"])
+        set_tagged("tagged-2", "value-2", ["product:2"])
+        self.assertEqual(get_tagged("tagged-1"), "value-1")
+        self.assertEqual(get_tagged("tagged-2"), "value-2")
+
+        invalidate_tags("product:1")
+        self.assertEqual(get_tagged("tagged-1"), None)
+        self.assertEqual(get_tagged("tagged-1", "default"), "default")
+        self.assertEqual(get_tagged("tagged-2"), "value-2")
+
+        set_tagged("tagged-1", "value-1", ["shop", "product:1"])
+        self.assertEqual(get_tagged("tagged-1"), "value-1")
+
+    def test_shop_changed(self):
+        cache.set("untagged", "value")
+        set_tagged("tagged", "value", ["shop"])
+
+        shop_changed.send(Shop.objects.get(pk=1))
+        self.assertEqual(get_tagged("tagged"), None)
+        self.assertEqual(cache.get("untagged"), "value")
+
+    def test_category_changed(self):
+        parent = Category.objects.create(name="Category 1", slug="category-1")
+        category = Category.objects.create(name="Category 2", slug="category-2", parent=parent)
+        product = Product.objects.create(name="Product 1", slug="product-1", active=True)
+        category.products.add(product)
+
+        set_tagged("category", "value", ["category:%s" % category.id])
+        set_tagged("parent", "value", ["category:%s" % parent.id])
+        category_changed.send(category)
+        self.assertEqual(get_tagged("category"), None)
+        self.assertEqual(get_tagged("parent"), None)
+
+        # The categories display the product
+        set_tagged("category", "value", ["category:%s" % category.id])
+        set_tagged("parent", "value", ["category:%s" % parent.id])
+        product_changed.send(product)
+        self.assertEqual(get_tagged("category"), None)
+        self.assertEqual(get_tagged("parent"), None)
+
+
+class RequestCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache.set("key-1", "value-1")
+        cache.set("key-2", "value-2")
+
+    def test_identity_map(self):
+        token = start_request_cache()
+        try:
+            self.assertEqual(cache_get("key-1"), "value-1")
+            cache.set("key-1", "changed")
+            self.assertEqual(cache_get("key-1"), "value-1")
+
+            self.assertEqual(cache_get_many(["key-1", "key-2", "key-3"]), {"key-1": "value-1", "key-2": "value-2"})
+
+            cache_set("key-3", "value-3")
+            self.assertEqual(cache_get("key-3"), "value-3")
+
+            delete_cache("key-1")
+            self.assertEqual(cache_get("key-1"), None)
+        finally:
+            request_cache = stop_request_cache(token)
+
+        self.assertEqual(get_request_cache(), None)
+        self.assertEqual(request_cache.hits, 3)
+        self.assertEqual(request_cache.misses, 4)
+
+    def test_middleware(self):
+        def get_response(request):
+            cache_get("key-1")
+            cache_get("key-1")
+            return "response"
+
+        request = RequestFactory().get("/")
+        self.assertEqual(RequestCacheMiddleware(get_response)(request), "response")
+        self.assertEqual(request.cache_stats, {"hits": 1, "misses": 1})
+        self.assertEqual(get_request_cache(), None)
+
+
+@override_settings(LFS_CACHE_PK_LOOKUPS=True)
+class SimpleCacheManagerTestCase(TestCase):
+    def setUp(self):
+        self.t1 = Tax.objects.create(rate=19)
+        self.t2 = Tax.objects.create(rate=7)
+        cache.clear()
+
+    def test_get(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Tax.objects.get(pk=self.t1.pk).rate, 19)
+            self.assertEqual(Tax.objects.get(pk=self.t1.pk).rate, 19)
+
+        # Write-through, after the transaction has been committed
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.t1.rate = 20
+            self.t1.save()
+            self.assertEqual(cache.get(key_from_instance(self.t1)), None)
+        for callback in callbacks:
+            callback()
+        with self.assertNumQueries(0):
+            self.assertEqual(Tax.objects.get(pk=self.t1.pk).rate, 20)
+
+        # Locking and annotated lookups aren't served from the cache
+        with self.assertNumQueries(1):
+            Tax.objects.select_for_update().get(pk=self.t1.pk)
+        with self.assertNumQueries(1):
+            Tax.objects.annotate(double_rate=F("rate") * 2).get(pk=self.t1.pk)
+
+        self.t1.delete()
+        self.assertRaises(Tax.DoesNotExist, Tax.objects.get, pk=self.t1.pk)
+
+    def test_filter_pk_in(self):
+        Tax.objects.get(pk=self.t1.pk)
+
+        # Just the missing tax is loaded
+        with self.assertNumQueries(1):
+            taxes = list(Tax.objects.filter(pk__in=[self.t1.pk, self.t2.pk]))
+        self.assertEqual(set(taxes), set([self.t1, self.t2]))
+
+        with self.assertNumQueries(0):
+            taxes = list(Tax.objects.filter(pk__in=[self.t1.pk, self.t2.pk]))
+        self.assertEqual(set(taxes), set([self.t1, self.t2]))
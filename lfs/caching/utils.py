@@ -1,39 +1,229 @@
 # django imports
+import contextvars
 import hashlib
+import time
 
+from django.db import DEFAULT_DB_ALIAS
 from django.db import models
 from django.db.models.query import QuerySet
 from django.conf import settings
 from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
 from django.http import Http404
 from django.shortcuts import _get_queryset
 from django.utils.encoding import force_str
 
 
+_MISSING = object()
+_request_cache = contextvars.ContextVar("lfs_request_cache", default=None)
+
+
+class RequestCache(object):
+    """Identity map which sits in front of Django's cache for the duration of
+    one request, see lfs.caching.middleware.RequestCacheMiddleware.
+
+    **Attributes:**
+
+    values
+        Cache key to value of all values which have been read or written
+        within the request.
+
+    hits / misses
+        The amount of lookups which have been served by / passed through the
+        identity map.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+
+
+def start_request_cache():
+    """Starts a new identity map for the current request (or context). Returns
+    a token to pass to stop_request_cache.
+    """
+    return _request_cache.set(RequestCache())
+
+
+def stop_request_cache(token):
+    """Discards the identity map which has been started with given token and
+    returns it.
+    """
+    request_cache = _request_cache.get()
+    _request_cache.reset(token)
+    return request_cache
+
+
+def get_request_cache():
+    """Returns the identity map of the current request or None."""
+    return _request_cache.get()
+
+
+def cache_get(cache_key, default=None):
+    """Like cache.get but served from the identity map of the current request
+    if there is one.
+    """
+    request_cache = _request_cache.get()
+    if request_cache is None:
+        return cache.get(cache_key, default)
+
+    value = request_cache.values.get(cache_key, _MISSING)
+    if value is not _MISSING:
+        request_cache.hits += 1
+        return value
+
+    request_cache.misses += 1
+    value = cache.get(cache_key, _MISSING)
+    if value is _MISSING:
+        return default
+
+    request_cache.values[cache_key] = value
+    return value
+
+
+def cache_get_many(cache_keys):
+    """Like cache.get_many. Keys which are not within the identity map of the
+    current request are fetched with one round trip.
+    """
+    request_cache = _request_cache.get()
+    if request_cache is None:
+        return cache.get_many(cache_keys)
+
+    result = {}
+    missing = []
+    for cache_key in cache_keys:
+        value = request_cache.values.get(cache_key, _MISSING)
+        if value is _MISSING:
+            missing.append(cache_key)
+        else:
+            result[cache_key] = value
+
+    request_cache.hits += len(result)
+    if missing:
+        request_cache.misses += len(missing)
+        values = cache.get_many(missing)
+        request_cache.values.update(values)
+        result.update(values)
+
+    return result
+
+
+def cache_set(cache_key, value, timeout=None):
+    """Like cache.set, but also stores the value within the identity map of
+    the current request.
+    """
+    request_cache = _request_cache.get()
+    if request_cache is not None:
+        request_cache.values[cache_key] = value
+
+    if timeout is None:
+        cache.set(cache_key, value)
+    else:
+        cache.set(cache_key, value, timeout)
+
+
+def cache_delete(*cache_keys):
+    """Deletes given keys from the cache and the identity map of the current
+    request.
+    """
+    request_cache = _request_cache.get()
+    if request_cache is not None:
+        for cache_key in cache_keys:
+            request_cache.values.pop(cache_key, None)
+
+    cache.delete_many(cache_keys)
+
+
+def prefetch_cache(cache_keys):
+    """Loads given keys into the identity map of the current request with one
+    round trip, so that subsequent lookups of these keys don't hit the cache.
+    """
+    if _request_cache.get() is not None:
+        cache_get_many(cache_keys)
+
+
 def key_from_instance(instance):
-    opts = instance._meta
-    return "%s.%s:%s" % (opts.app_label, opts.module_name, instance.pk)
+    return key_from_pk(instance.__class__, instance.pk)
+
+
+def key_from_pk(model, pk):
+    opts = model._meta
+    return "%s.%s.%s:%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, opts.app_label, opts.model_name, pk)
 
 
 class SimpleCacheQuerySet(QuerySet):
+    """A QuerySet which serves get(pk=...) and filter(pk__in=...) lookups from
+    the cache. The entries are kept up to date by write-through on save and
+    delete, see lfs.caching.listeners.
+
+    This is only active if settings.LFS_CACHE_PK_LOOKUPS is True.
+    """
+
+    def get(self, *args, **kwargs):
+        pk = self._get_cacheable_pk(args, kwargs, ("pk", "pk__exact", "id", "id__exact"))
+        if pk is None:
+            return super(SimpleCacheQuerySet, self).get(*args, **kwargs)
+
+        cache_key = key_from_pk(self.model, pk)
+        obj = cache_get(cache_key)
+        if obj is None:
+            obj = super(SimpleCacheQuerySet, self).get(*args, **kwargs)
+            cache_set(cache_key, obj)
+        return obj
+
     def filter(self, *args, **kwargs):
-        pk = None
-        for val in ("pk", "pk__exact", "id", "id__exact"):
-            if val in kwargs:
-                pk = kwargs[val]
-                break
-        if pk is not None:
-            opts = self.model._meta
-            key = "%s.%s.%s:%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, opts.app_label, opts.module_name, pk)
-            obj = cache.get(key)
-            if obj is not None:
-                self._result_cache = [obj]
-        return super(SimpleCacheQuerySet, self).filter(*args, **kwargs)
+        pks = self._get_cacheable_pk(args, kwargs, ("pk__in", "id__in"))
+        clone = super(SimpleCacheQuerySet, self).filter(*args, **kwargs)
+        if pks is None or isinstance(pks, QuerySet):
+            return clone
+
+        pks = list(pks)
+        keys = dict((key_from_pk(self.model, pk), pk) for pk in pks)
+        objs = cache_get_many(list(keys.keys()))
+
+        missing = [pk for (key, pk) in keys.items() if key not in objs]
+        if missing:
+            for obj in super(SimpleCacheQuerySet, self).filter(pk__in=missing):
+                cache_set(key_from_pk(self.model, obj.pk), obj)
+                objs[key_from_pk(self.model, obj.pk)] = obj
+
+        clone._result_cache = self._sort(list(objs.values()), clone.query.order_by or self.model._meta.ordering)
+        clone._prefetch_done = True
+        return clone
+
+    def _get_cacheable_pk(self, args, kwargs, lookups):
+        """Returns the pk (or pks) of the lookup if it can be served from the
+        cache, otherwise None.
+        """
+        if not getattr(settings, "LFS_CACHE_PK_LOOKUPS", False):
+            return None
+        if args or len(kwargs) != 1 or list(kwargs.keys())[0] not in lookups:
+            return None
+        if self.query.where or self.query.is_sliced or self._fields is not None or self.query.deferred_loading[0]:
+            return None
+        if self.query.select_for_update or self.query.annotations or self.query.select_related or self.query.extra:
+            return None
+        if self._db is not None and self._db != DEFAULT_DB_ALIAS:
+            return None
+        return list(kwargs.values())[0]
+
+    def _sort(self, objs, ordering):
+        for field_name in reversed(ordering):
+            if not isinstance(field_name, str) or "__" in field_name or field_name.lstrip("-") == "?":
+                continue
+            reverse = field_name.startswith("-")
+            try:
+                attname = self.model._meta.get_field(field_name.lstrip("-")).attname
+            except FieldDoesNotExist:
+                attname = field_name.lstrip("-")
+            objs.sort(key=lambda obj: (getattr(obj, attname) is not None, getattr(obj, attname)), reverse=reverse)
+        return objs
 
 
 class SimpleCacheManager(models.Manager):
-    def get_query_set(self):
-        return SimpleCacheQuerySet(self.model)
+    def get_queryset(self):
+        return SimpleCacheQuerySet(self.model, using=self._db)
 
 
 def lfs_get_object(klass, *args, **kwargs):
@@ -54,7 +244,7 @@ def lfs_get_object(klass, *args, **kwargs):
     )
 
     cache_key = hashlib.md5(cache_key.encode("utf-8")).hexdigest()
-    object = cache.get(cache_key)
+    object = cache_get(cache_key)
     if object is not None:
         return object
 
@@ -65,7 +255,7 @@ def lfs_get_object(klass, *args, **kwargs):
     except queryset.model.DoesNotExist:
         return None
     else:
-        cache.set(cache_key, object)
+        cache_set(cache_key, object)
         return object
 
 
@@ -87,7 +277,7 @@ def lfs_get_object_or_404(klass, *args, **kwargs):
     )
 
     cache_key = hashlib.md5(cache_key.encode("utf-8")).hexdigest()
-    object = cache.get(cache_key)
+    object = cache_get(cache_key)
 
     if object is not None:
         return object
@@ -98,12 +288,16 @@ def lfs_get_object_or_404(klass, *args, **kwargs):
     except queryset.model.DoesNotExist:
         raise Http404("No %s matches the given query." % queryset.model._meta.object_name)
     else:
-        cache.set(cache_key, object)
+        cache_set(cache_key, object)
         return object
 
 
 def clear_cache():
     """Clears the complete cache."""
+    request_cache = _request_cache.get()
+    if request_cache is not None:
+        request_cache.values.clear()
+
     # memcached
     try:
         cache._cache.flush_all()
@@ -128,8 +322,7 @@ def clear_cache():
 
 
 def delete_cache(cache_key):
-    cache.delete(cache_key)
-    cache.delete(hashlib.md5(cache_key.encode("utf-8")).hexdigest())
+    cache_delete(cache_key, hashlib.md5(cache_key.encode("utf-8")).hexdigest())
 
 
 def get_cache_group_id(group_code):
@@ -137,10 +330,10 @@ def get_cache_group_id(group_code):
     from specific group.
     """
     cache_group_key = "%s-%s-GROUP" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, group_code)
-    group_id = cache.get(cache_group_key, 0)
+    group_id = cache_get(cache_group_key, 0)
     if group_id == 0:
         group_id = 1
-        cache.set(cache_group_key, group_id, cache.default_timeout * 2)
+        cache_set(cache_group_key, group_id, cache.default_timeout * 2)
     return group_id
 
 
@@ -151,3 +344,73 @@ def invalidate_cache_group_id(group_code):
         cache.incr(cache_group_key)
     except ValueError:
         pass
+
+    request_cache = _request_cache.get()
+    if request_cache is not None:
+        request_cache.values.pop(cache_group_key, None)
+
+
+def _get_tag_key(tag):
+    return "%s-%s-TAG" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, tag)
+
+
+def get_tag_versions(tags):
+    """Returns a dictionary of tag to the current version of the tag. Tags
+    without a version (never used, invalidated or evicted) get a new one.
+    """
+    keys = dict((_get_tag_key(tag), tag) for tag in tags)
+    versions = cache_get_many(list(keys.keys()))
+    for key in keys:
+        if key not in versions:
+            version = time.time_ns()
+            cache.add(key, version, None)
+            versions[key] = cache_get(key, version)
+    return dict((keys[key], version) for (key, version) in versions.items())
+
+
+def get_tagged(cache_key, default=None):
+    """Returns the value stored with set_tagged under given cache key. Returns
+    default if there is no value or if one of the tags of the value has been
+    invalidated in the meantime.
+    """
+    entry = cache_get(cache_key)
+    if entry is None:
+        return default
+
+    versions, value = entry
+    if get_tag_versions(versions.keys()) != versions:
+        return default
+    return value
+
+
+def get_many_tagged(cache_keys):
+    """Returns a dictionary of cache key to value for all given cache keys
+    which have a valid value stored with set_tagged. The versions of all
+    involved tags are fetched at once.
+    """
+    entries = cache_get_many(cache_keys)
+    tags = set()
+    for versions, value in entries.values():
+        tags.update(versions.keys())
+
+    current_versions = get_tag_versions(tags)
+    result = {}
+    for cache_key, (versions, value) in entries.items():
+        if all(current_versions[tag] == version for (tag, version) in versions.items()):
+            result[cache_key] = value
+    return result
+
+
+def set_tagged(cache_key, value, tags, timeout=None):
+    """Stores given value under given cache key together with the current
+    versions of the tags the value depends on, e.g. "shop", "product:1" or
+    "category:2". See invalidate_tags.
+    """
+    cache_set(cache_key, (get_tag_versions(tags), value), timeout)
+
+
+def invalidate_tags(*tags):
+    """Invalidates all values which have been stored with one of given tags.
+    Other cached values are left alone.
+    """
+    cache_delete(*[_get_tag_key(tag) for tag in tags])
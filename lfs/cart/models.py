@@ -158,9 +158,12 @@ class Cart(models.Model):
         """
         import lfs.shipping.utils
 
+        products = [item.product for item in self.get_items()]
+        delivery_times = lfs.shipping.utils.get_product_delivery_times(request, products, for_cart=True)
+
         max_delivery_time = None
-        for item in self.get_items():
-            delivery_time = lfs.shipping.utils.get_product_delivery_time(request, item.product, for_cart=True)
+        for product in products:
+            delivery_time = delivery_times[product.id]
             if (max_delivery_time is None) or (delivery_time.as_hours() > max_delivery_time.as_hours()):
                 max_delivery_time = delivery_time
         return max_delivery_time
@@ -169,30 +172,25 @@ class Cart(models.Model):
         """
         Returns the total gross price of all items.
         """
-        price = 0
-        for item in self.get_items():
-            price += item.get_price_gross(request)
-        return price
+        from lfs.cart.utils import get_cart_totals
+
+        return get_cart_totals(request, self).price_gross
 
     def get_price_net(self, request):
         """
         Returns the total net price of all items.
         """
-        price = 0
-        for item in self.get_items():
-            price += item.get_price_net(request)
+        from lfs.cart.utils import get_cart_totals
 
-        return price
+        return get_cart_totals(request, self).price_net
 
     def get_tax(self, request):
         """
         Returns the total tax of all items
         """
-        tax = 0
-        for item in self.get_items():
-            tax += item.get_tax(request)
+        from lfs.cart.utils import get_cart_totals
 
-        return tax
+        return get_cart_totals(request, self).tax
 
     def get_total_price_gross(self, request):
         """
@@ -202,73 +200,12 @@ class Cart(models.Model):
 
     def get_order_data(self, request):
         """
-        Returns all data needed to create an order.
+        Returns all data needed to create an order. See
+        lfs.cart.utils.get_order_data.
         """
-        # circular imports
-        from lfs.discounts.utils import get_discounts_data
-        from lfs.payment import utils as payment_utils
-        from lfs.shipping import utils as shipping_utils
-        from lfs.voucher.utils import get_voucher_data
-
-        shipping_method = shipping_utils.get_selected_shipping_method(request)
-        shipping_costs = shipping_utils.get_shipping_costs(request, shipping_method)
-
-        payment_method = payment_utils.get_selected_payment_method(request)
-        payment_costs = payment_utils.get_payment_costs(request, payment_method)
-
-        price = self.get_price_gross(request) + shipping_costs["price_gross"] + payment_costs["price_gross"]
-        tax = self.get_tax(request) + shipping_costs["tax"] + payment_costs["tax"]
-
-        # get voucher data (if voucher exists)
-        voucher_data = get_voucher_data(request, self)
+        from lfs.cart.utils import get_order_data
 
-        # get discounts data
-        discounts_data = get_discounts_data(request)
-
-        # calculate total value of discounts and voucher that sum up
-        summed_up_value = discounts_data["summed_up_value"]
-        if voucher_data["sums_up"]:
-            summed_up_value += voucher_data["voucher_value"]
-
-        # initialize discounts with summed up discounts
-        use_voucher = voucher_data["voucher"] is not None
-        discounts = discounts_data["summed_up_discounts"]
-        if voucher_data["voucher_value"] > summed_up_value or discounts_data["max_value"] > summed_up_value:
-            # use not summed up value
-            if voucher_data["voucher_value"] > discounts_data["max_value"]:
-                # use voucher only
-                discounts = []
-            else:
-                # use discount only
-                discounts = discounts_data["max_discounts"]
-                use_voucher = False
-
-        for discount in discounts:
-            price -= discount["price_gross"]
-            tax -= discount["tax"]
-
-        if use_voucher:
-            price -= voucher_data["voucher_value"]
-            tax -= voucher_data["voucher_tax"]
-
-        if price < 0:
-            price = 0
-
-        if tax < 0:
-            tax = 0
-
-        return (
-            price,
-            tax,
-            shipping_method,
-            shipping_costs,
-            payment_method,
-            payment_costs,
-            voucher_data,
-            discounts_data,
-            use_voucher,
-            discounts,
-        )
+        return get_order_data(request, self)
 
     def _update_product_amounts(self):
         items = CartItem.objects.select_related("product").filter(
@@ -344,24 +281,34 @@ class CartItem(models.Model):
         """
         return self.get_product_price_gross(request) * self.amount
 
-    def get_product_price_gross(self, request):
+    def get_product_price_gross(self, request, price_calculator=None):
         """
         Returns the product item price. Based on selected properties, etc.
+
+        **Parameters:**
+
+        price_calculator
+            The price calculator of the product, e.g. one which has been
+            created via PriceCalculator.bulk_calculators. If it is None the
+            calculator of the product is used.
         """
+        if price_calculator is None:
+            price_calculator = self.product.get_price_calculator(request)
+
         if not self.product.is_configurable_product():
-            price = self.product.get_price_gross(request, amount=self.amount)
+            price = price_calculator.get_price_gross(amount=self.amount)
         else:
             if self.product.active_price_calculation:
                 try:
                     price = self.get_calculated_price(request)
                 except:
-                    price = self.product.get_price_gross(request, amount=self.amount)
+                    price = price_calculator.get_price_gross(amount=self.amount)
             else:
-                price = self.product.get_price_gross(request, with_properties=False, amount=self.amount)
+                price = price_calculator.get_price_gross(with_properties=False, amount=self.amount)
                 for property in self.properties.all():
                     if property.property.is_select_field:
                         try:
-                            option = PropertyOption.objects.get(pk=int(float(property.value)))
+                            option = self._get_property_option(property.value)
                         except (PropertyOption.DoesNotExist, AttributeError, ValueError):
                             pass
                         else:
@@ -370,8 +317,9 @@ class CartItem(models.Model):
                             except (TypeError, ValueError):
                                 pass
                             else:
-                                if not self.product.price_includes_tax(request):
-                                    option_price = option_price * ((100 + self.product.get_tax_rate(request)) / 100)
+                                if not price_calculator.price_includes_tax():
+                                    tax_rate = price_calculator.get_customer_tax_rate()
+                                    option_price = option_price * ((100 + tax_rate) / 100)
                                 price += option_price
         return price
 
@@ -388,7 +336,7 @@ class CartItem(models.Model):
                 mo = re.match(r"property\((\d+)\)", token)
                 ppv = self.properties.filter(property__id=mo.groups()[0])[0]
                 if ppv.property.is_select_field:
-                    po = PropertyOption.objects.get(pk=ppv.value)
+                    po = self._get_property_option(ppv.value)
                     value = po.price
                 else:
                     value = float(ppv.value)
@@ -403,6 +351,22 @@ class CartItem(models.Model):
 
         return eval(pc)
 
+    def _get_property_option(self, value):
+        """
+        Returns the property option for passed property value. Uses the options
+        which have been loaded in bulk by lfs.cart.utils.CartTotals if there
+        are any.
+        """
+        pk = int(float(value))
+        options = getattr(self, "property_options", None)
+        if options is None:
+            return PropertyOption.objects.get(pk=pk)
+
+        try:
+            return options[pk]
+        except KeyError:
+            raise PropertyOption.DoesNotExist()
+
     def get_tax(self, request):
         """
         Returns the absolute tax of the item.
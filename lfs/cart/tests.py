@@ -245,6 +245,26 @@ class CartModelsTestCase(TestCase):
         items = self.cart.get_items()
         self.assertEqual(len(items), 2)
 
+    def test_get_cart_totals(self):
+        """ """
+        totals = lfs.cart.utils.get_cart_totals(self.request, self.cart)
+        self.assertEqual(totals.price_gross, 110.0)
+        self.assertEqual([i["price_gross"] for i in totals.items], [10.0, 100.0])
+
+        # The price calculators are created for all products at once
+        self.assertEqual(set(totals.calculators.keys()), set([i["product"].id for i in totals.items]))
+
+        # The totals are memoized per request ...
+        self.assertTrue(lfs.cart.utils.get_cart_totals(self.request, self.cart) is totals)
+
+        # ... until the cart is changed
+        item = CartItem.objects.get(cart=self.cart, product=self.p1)
+        item.amount = 2
+        item.save()
+
+        totals = lfs.cart.utils.get_cart_totals(self.request, self.cart)
+        self.assertEqual(totals.price_gross, 120.0)
+
 
 class CartItemTestCase(TestCase):
     """ """
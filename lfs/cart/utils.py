@@ -2,14 +2,17 @@
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.cache import cache
+from django.db.models import prefetch_related_objects
 from django.urls import reverse
 
 # lfs imports
+from lfs.caching.utils import get_tag_versions
 from lfs.cart.models import Cart
 
 # Load logger
 import logging
 from lfs.catalog.models import Category
+from lfs.catalog.models import PropertyOption
 from lfs.manufacturer.models import Manufacturer
 
 logger = logging.getLogger(__name__)
@@ -42,6 +45,190 @@ def cart_items_to_tracking_snapshot(request, cart_items) -> dict | None:
     }
 
 
+class CartTotals(object):
+    """
+    The prices of all items of a cart, which are calculated in one pass. Use
+    get_cart_totals to get the memoized totals of a cart.
+
+    **Attributes**
+
+    items
+        List of dictionaries with the cart item ("obj"), the "product", the
+        cleaned "quantity", the gross "product_price_gross" of one unit and
+        "price_gross", "price_net" and "tax" of the whole item.
+
+    calculators
+        Product id to the price calculator of the product. The calculators
+        are created for all products at once, see
+        lfs.plugins.PriceCalculator.bulk_calculators.
+
+    price_gross / price_net / tax
+        The sums of all items.
+    """
+
+    def __init__(self, request, cart):
+        from lfs.catalog.utils import get_price_calculators
+
+        self.items = []
+        self.price_gross = 0
+        self.price_net = 0
+        self.tax = 0
+
+        cart_items = list(cart.get_items())
+        self._prefetch(cart_items)
+        self.calculators = get_price_calculators(request, [cart_item.product for cart_item in cart_items])
+
+        for cart_item in cart_items:
+            product = cart_item.product
+            pc = self.calculators[product.id]
+            rate = pc.get_customer_tax_rate()
+
+            product_price_gross = cart_item.get_product_price_gross(request, pc)
+            price_gross = product_price_gross * cart_item.amount
+            tax = price_gross * (rate / (rate + 100))
+
+            self.items.append(
+                {
+                    "obj": cart_item,
+                    "product": product,
+                    "quantity": product.get_clean_quantity(cart_item.amount),
+                    "product_price_gross": product_price_gross,
+                    "price_gross": price_gross,
+                    "price_net": price_gross - tax,
+                    "tax": tax,
+                }
+            )
+
+            self.price_gross += price_gross
+            self.price_net += price_gross - tax
+            self.tax += tax
+
+    def _prefetch(self, cart_items):
+        """Loads the parents of variants and the selected properties and
+        options of configurable products of given cart items in bulk.
+        """
+        prefetch_related_objects(cart_items, "product__parent")
+
+        configurable_items = [i for i in cart_items if i.product.is_configurable_product()]
+        if not configurable_items:
+            return
+
+        prefetch_related_objects(configurable_items, "properties__property")
+        option_ids = set()
+        for cart_item in configurable_items:
+            for property_value in cart_item.properties.all():
+                if property_value.property.is_select_field:
+                    try:
+                        option_ids.add(int(float(property_value.value)))
+                    except ValueError:
+                        pass
+
+        options = PropertyOption.objects.in_bulk(option_ids)
+        for cart_item in configurable_items:
+            cart_item.property_options = options
+
+
+def get_cart_totals(request, cart):
+    """
+    Returns the CartTotals of passed cart. The totals are memoized on the
+    request until the cart is changed (see lfs.caching.listeners).
+    """
+    if request is None:
+        return CartTotals(request, cart)
+
+    tag = "cart:%s" % cart.id
+    version = get_tag_versions([tag])[tag]
+    try:
+        memo = request._cart_totals
+    except AttributeError:
+        memo = request._cart_totals = {}
+
+    totals = memo.get((cart.id, version))
+    if totals is None:
+        totals = memo[(cart.id, version)] = CartTotals(request, cart)
+    return totals
+
+
+def get_order_data(request, cart):
+    """
+    Returns all data needed to create an order: the total gross price and tax
+    (including shipping and payment costs, discounts and voucher), the
+    selected shipping and payment method with their costs, the voucher data,
+    the discounts data, whether the voucher is used and the used discounts.
+
+    The prices of the cart items are taken from the CartTotals of the cart.
+    """
+    # circular imports
+    from lfs.discounts.utils import get_discounts_data
+    from lfs.payment import utils as payment_utils
+    from lfs.shipping import utils as shipping_utils
+    from lfs.voucher.utils import get_voucher_data
+
+    shipping_method = shipping_utils.get_selected_shipping_method(request)
+    shipping_costs = shipping_utils.get_shipping_costs(request, shipping_method)
+
+    payment_method = payment_utils.get_selected_payment_method(request)
+    payment_costs = payment_utils.get_payment_costs(request, payment_method)
+
+    price = 0
+    tax = 0
+    if cart is not None:
+        totals = get_cart_totals(request, cart)
+        price = totals.price_gross + shipping_costs["price_gross"] + payment_costs["price_gross"]
+        tax = totals.tax + shipping_costs["tax"] + payment_costs["tax"]
+
+    # get voucher data (if voucher exists)
+    voucher_data = get_voucher_data(request, cart)
+
+    # get discounts data
+    discounts_data = get_discounts_data(request)
+
+    # calculate total value of discounts and voucher that sum up
+    summed_up_value = discounts_data["summed_up_value"]
+    if voucher_data["sums_up"]:
+        summed_up_value += voucher_data["voucher_value"]
+
+    # initialize discounts with summed up discounts
+    use_voucher = voucher_data["voucher"] is not None
+    discounts = discounts_data["summed_up_discounts"]
+    if voucher_data["voucher_value"] > summed_up_value or discounts_data["max_value"] > summed_up_value:
+        # use not summed up value
+        if voucher_data["voucher_value"] > discounts_data["max_value"]:
+            # use voucher only
+            discounts = []
+        else:
+            # use discount only
+            discounts = discounts_data["max_discounts"]
+            use_voucher = False
+
+    for discount in discounts:
+        price -= discount["price_gross"]
+        tax -= discount["tax"]
+
+    if use_voucher:
+        price -= voucher_data["voucher_value"]
+        tax -= voucher_data["voucher_tax"]
+
+    if price < 0:
+        price = 0
+
+    if tax < 0:
+        tax = 0
+
+    return (
+        price,
+        tax,
+        shipping_method,
+        shipping_costs,
+        payment_method,
+        payment_costs,
+        voucher_data,
+        discounts_data,
+        use_voucher,
+        discounts,
+    )
+
+
 def get_or_create_cart(request):
     """
     Returns the cart of the current user. If no cart exists yet it creates a
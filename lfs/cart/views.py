@@ -18,7 +18,6 @@ import lfs.cart.utils
 from lfs.payment.models import PaymentMethod
 from lfs.shipping.models import ShippingMethod
 import lfs.voucher.utils
-import lfs.discounts.utils
 from lfs.caching.utils import lfs_get_object_or_404
 from lfs.core.signals import cart_changed
 from lfs.core import utils as core_utils
@@ -73,69 +72,34 @@ def cart_inline(request, template_name="lfs/cart/cart_inline.html"):
     countries = shop.shipping_countries.all()
     selected_country = shipping_utils.get_selected_shipping_country(request)
 
-    # Get default shipping method, so that we have a one in any case.
-    selected_shipping_method = shipping_utils.get_selected_shipping_method(request)
-    selected_payment_method = payment_utils.get_selected_payment_method(request)
-
-    shipping_costs = shipping_utils.get_shipping_costs(request, selected_shipping_method)
-
-    # Payment
-    payment_costs = payment_utils.get_payment_costs(request, selected_payment_method)
-
-    # Cart costs
-    cart_price = cart.get_price_gross(request) + shipping_costs["price_gross"] + payment_costs["price_gross"]
-    cart_tax = cart.get_tax(request) + shipping_costs["tax"] + payment_costs["tax"]
-
-    # get voucher data (if voucher exists)
-    voucher_data = lfs.voucher.utils.get_voucher_data(request, cart)
-
-    # get discounts data
-    discounts_data = lfs.discounts.utils.get_discounts_data(request)
-
-    # calculate total value of discounts and voucher that sum up
-    summed_up_value = discounts_data["summed_up_value"]
-    if voucher_data["sums_up"]:
-        summed_up_value += voucher_data["voucher_value"]
-
-    # initialize discounts with summed up discounts
-    use_voucher = voucher_data["voucher"] is not None
-    discounts = discounts_data["summed_up_discounts"]
-    if voucher_data["voucher_value"] > summed_up_value or discounts_data["max_value"] > summed_up_value:
-        # use not summed up value
-        if voucher_data["voucher_value"] > discounts_data["max_value"]:
-            # use voucher only
-            discounts = []
-        else:
-            # use discount only
-            discounts = discounts_data["max_discounts"]
-            use_voucher = False
-
-    for discount in discounts:
-        cart_price -= discount["price_gross"]
-        cart_tax -= discount["tax"]
-
-    if use_voucher:
-        cart_price -= voucher_data["voucher_value"]
-        cart_tax -= voucher_data["voucher_tax"]
-
-    cart_price = max(0, cart_price)
-    cart_tax = max(0, cart_tax)
+    # Prices all cart items in one pass and adds shipping and payment costs,
+    # discounts and voucher.
+    (
+        cart_price,
+        cart_tax,
+        selected_shipping_method,
+        shipping_costs,
+        selected_payment_method,
+        payment_costs,
+        voucher_data,
+        discounts_data,
+        use_voucher,
+        discounts,
+    ) = cart_utils.get_order_data(request, cart)
 
     # Calc delivery time for cart (which is the maximum of all cart items)
     max_delivery_time = cart.get_delivery_time(request)
 
     cart_items = []
-    for cart_item in cart.get_items():
-        product = cart_item.product
-        quantity = product.get_clean_quantity(cart_item.amount)
+    for item in cart_utils.get_cart_totals(request, cart).items:
         cart_items.append(
             {
-                "obj": cart_item,
-                "quantity": quantity,
-                "product": product,
-                "product_price_net": cart_item.get_price_net(request),
-                "product_price_gross": cart_item.get_price_gross(request),
-                "product_tax": cart_item.get_tax(request),
+                "obj": item["obj"],
+                "quantity": item["quantity"],
+                "product": item["product"],
+                "product_price_net": item["price_net"],
+                "product_price_gross": item["price_gross"],
+                "product_tax": item["tax"],
             }
         )
 
@@ -96,14 +96,24 @@ class CategoryAdmin(admin.ModelAdmin):
 
     def make_navigation_visible(self, request, queryset):
         """Bulk action to make categories visible in navigation."""
-        updated = queryset.update(exclude_from_navigation=False)
+        # The categories are saved one by one, so that the caches are updated
+        updated = 0
+        for category in queryset.filter(exclude_from_navigation=True):
+            category.exclude_from_navigation = False
+            category.save()
+            updated += 1
         self.message_user(request, f"{updated} categories are now visible in navigation.")
 
     make_navigation_visible.short_description = "Make visible in navigation"
 
     def make_navigation_hidden(self, request, queryset):
         """Bulk action to hide categories from navigation."""
-        updated = queryset.update(exclude_from_navigation=True)
+        # The categories are saved one by one, so that the caches are updated
+        updated = 0
+        for category in queryset.filter(exclude_from_navigation=False):
+            category.exclude_from_navigation = True
+            category.save()
+            updated += 1
         self.message_user(request, f"{updated} categories are now hidden from navigation.")
 
     make_navigation_hidden.short_description = "Hide from navigation"
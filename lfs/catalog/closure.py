@@ -0,0 +1,85 @@
+from django.apps import apps as global_apps
+
+from lfs.catalog.models import CategoryClosure
+
+
+def update_category_closure(category):
+    """Updates the closure rows of given category and all its sub categories
+    after the category has been created or moved to another parent. Does
+    nothing if the parent of the category hasn't been changed.
+    """
+    parents = dict(
+        CategoryClosure.objects.filter(descendant=category, depth__lte=1).values_list("depth", "ancestor_id")
+    )
+    if 0 in parents and parents.get(1) == category.parent_id:
+        return
+
+    subtree = list(CategoryClosure.objects.filter(ancestor=category).values_list("descendant_id", "depth"))
+    if not subtree:
+        # The category is new. Fixtures might have loaded its sub categories
+        # already, which are attached to it then.
+        subtree = [(category.id, 0)]
+        subtree.extend(
+            (descendant_id, depth + 1)
+            for (descendant_id, depth) in CategoryClosure.objects.filter(ancestor__parent=category).values_list(
+                "descendant_id", "depth"
+            )
+        )
+    subtree_ids = [descendant_id for (descendant_id, depth) in subtree]
+
+    # Detach the sub tree from its former parents
+    CategoryClosure.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+
+    links = []
+    if 0 not in parents:
+        for descendant_id, depth in subtree:
+            links.append(CategoryClosure(ancestor_id=category.id, descendant_id=descendant_id, depth=depth))
+
+    if category.parent_id is not None:
+        ancestors = CategoryClosure.objects.filter(descendant_id=category.parent_id).values_list("ancestor_id", "depth")
+        for ancestor_id, ancestor_depth in ancestors:
+            if ancestor_id in subtree_ids:
+                # The category has been moved below itself
+                continue
+            for descendant_id, descendant_depth in subtree:
+                links.append(
+                    CategoryClosure(
+                        ancestor_id=ancestor_id,
+                        descendant_id=descendant_id,
+                        depth=ancestor_depth + descendant_depth + 1,
+                    )
+                )
+
+    CategoryClosure.objects.bulk_create(links, ignore_conflicts=True)
+
+
+def remove_category_closure(category):
+    """Detaches the sub categories of given category from the category and
+    its parents. This is called before the category is deleted, as the
+    sub categories become top level categories then.
+    """
+    subtree_ids = list(CategoryClosure.objects.filter(ancestor=category).values_list("descendant_id", flat=True))
+    ancestor_ids = list(CategoryClosure.objects.filter(descendant=category).values_list("ancestor_id", flat=True))
+    CategoryClosure.objects.filter(descendant_id__in=subtree_ids, ancestor_id__in=ancestor_ids).delete()
+
+
+def rebuild_category_closure(apps=global_apps):
+    """Rebuilds the whole closure table from the parents of all categories.
+    ``apps`` might be the registry of a migration.
+    """
+    Category = apps.get_model("catalog", "Category")
+    CategoryClosure = apps.get_model("catalog", "CategoryClosure")
+
+    parents = dict(Category.objects.values_list("id", "parent_id"))
+
+    links = []
+    for category_id in parents:
+        ancestor_id = category_id
+        depth = 0
+        while ancestor_id is not None and depth <= len(parents):
+            links.append(CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth))
+            ancestor_id = parents.get(ancestor_id)
+            depth += 1
+
+    CategoryClosure.objects.all().delete()
+    CategoryClosure.objects.bulk_create(links)
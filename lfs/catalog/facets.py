@@ -0,0 +1,299 @@
+from bisect import bisect_left
+from bisect import bisect_right
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+import lfs.catalog.models
+from lfs.caching.utils import get_cache_group_id
+from lfs.caching.utils import invalidate_cache_group_id
+from lfs.catalog.settings import PROPERTY_VALUE_TYPE_FILTER
+
+
+class FacetIndex(object):
+    """Precomputed filter values of all products of a category.
+
+    Every product (and variant) of the category gets a bit position. For every
+    filter property the index stores a bitmap (a Python int) per value, hence
+    all filter counts for a filter state can be calculated by intersecting
+    bitmaps instead of querying the database.
+
+    **Attributes:**
+
+    category_id
+        The id of the category the index has been built for.
+
+    positions
+        Product id to bit position.
+
+    parents
+        Bit position to the bit position of the parent product. For products
+        which are no variants this is the position itself.
+
+    products
+        Bitmap of the products which are displayed within the category.
+
+    variants
+        Bitmap of the variants of these products.
+
+    values
+        Property key ("<property_group_id>_<property_id>") to a dictionary of
+        value to bitmap.
+
+    numbers
+        Property key to a sorted list of (value_as_float, position).
+
+    prices
+        Sorted list of (effective_price, position) of the products.
+
+    manufacturers
+        Manufacturer id to bitmap of the products.
+    """
+
+    def __init__(self, category_id):
+        self.category_id = category_id
+        self.positions = {}
+        self.parents = []
+        self.products = 0
+        self.variants = 0
+        self.values = {}
+        self.numbers = {}
+        self.prices = []
+        self.manufacturers = {}
+
+    @classmethod
+    def build(cls, category):
+        """Returns a new index for given category."""
+        from lfs.catalog.models import Product
+
+        index = cls(category.id)
+
+        if category.show_all_products:
+            products = category.get_all_products()
+        else:
+            products = category.get_products()
+
+        product_ids = products.values("id")
+        products = Product.objects.filter(pk__in=product_ids).values_list("id", "effective_price", "manufacturer_id")
+        for product_id, price, manufacturer_id in products:
+            index._add_product(product_id, price, manufacturer_id)
+
+        variants = Product.objects.filter(parent__in=product_ids, active=True).values_list("id", "parent_id")
+        for variant_id, parent_id in variants:
+            index._add_variant(variant_id, parent_id)
+
+        index._add_values(lfs.catalog.models.ProductPropertyValue.objects.filter(parent_id__in=product_ids))
+
+        return index
+
+    def get_matching(self, filters, price_filter=None, manufacturers_filter=None):
+        """Returns the bitmap of products which match given filters.
+
+        Variants which match the filters are rolled up to their parents.
+        """
+        rows = self.products | self.variants
+        if filters:
+            for filter_dict in filters.get("select-filter", {}).values():
+                rows &= self._select_bitmap(filter_dict)
+            rows &= self._number_bitmap(filters)
+        return self._roll_up(rows) & self._price_bitmap(price_filter) & self._manufacturer_bitmap(manufacturers_filter)
+
+    def get_counts(self, filters, price_filter=None):
+        """Returns the amount of matching products per select/text value.
+
+        The count for a value is calculated as if the value would be the only
+        selected value of its property, whereas the filters of all other
+        properties are kept. Returns a dictionary of property key to a
+        dictionary of value to quantity.
+        """
+        filters = filters or {}
+        select_filters = {}
+        for filter_dict in filters.get("select-filter", {}).values():
+            select_filters[self._get_key(filter_dict)] = self._select_bitmap(filter_dict)
+
+        rows = self.products | self.variants
+        rows &= self._number_bitmap(filters)
+        price_bitmap = self._price_bitmap(price_filter)
+
+        counts = {}
+        for key, values in self.values.items():
+            base = rows
+            for filter_key, bitmap in select_filters.items():
+                if filter_key != key:
+                    base &= bitmap
+
+            counts[key] = {}
+            for value, bitmap in values.items():
+                counts[key][value] = (self._roll_up(base & bitmap) & price_bitmap).bit_count()
+
+        return counts
+
+    def get_ids(self, bitmap):
+        """Returns the product ids of given bitmap."""
+        product_ids = dict((position, product_id) for (product_id, position) in self.positions.items())
+        return [product_ids[position] for position in _iter_bits(bitmap)]
+
+    def get_ids_by_price(self, bitmap, reverse=False):
+        """Returns the product ids of given bitmap ordered by effective price."""
+        product_ids = dict((position, product_id) for (product_id, position) in self.positions.items())
+        prices = reversed(self.prices) if reverse else self.prices
+        return [product_ids[position] for (price, position) in prices if (bitmap >> position) & 1]
+
+    def get_price_range(self, bitmap):
+        """Returns the min and max effective price of the products of given
+        bitmap. Returns (None, None) if there are no prices.
+        """
+        prices = [price for (price, position) in self.prices if (bitmap >> position) & 1]
+        if not prices:
+            return None, None
+        return prices[0], prices[-1]
+
+    def _get_key(self, filter_dict):
+        return "{0}_{1}".format(filter_dict["property_group_id"], filter_dict["property_id"])
+
+    def _select_bitmap(self, filter_dict):
+        values = self.values.get(self._get_key(filter_dict), {})
+        bitmap = 0
+        for value in filter_dict["value"].split("|"):
+            bitmap |= values.get(value, 0)
+        return bitmap
+
+    def _number_bitmap(self, filters):
+        bitmap = self.products | self.variants
+        for filter_dict in filters.get("number-filter", {}).values():
+            bitmap &= self._range_bitmap(self.numbers.get(self._get_key(filter_dict), []), *filter_dict["value"][0:2])
+        return bitmap
+
+    def _price_bitmap(self, price_filter):
+        if not price_filter:
+            return self.products
+        return self._range_bitmap(self.prices, price_filter["min"], price_filter["max"])
+
+    def _manufacturer_bitmap(self, manufacturers_filter):
+        if not manufacturers_filter:
+            return self.products
+        bitmap = 0
+        for manufacturer_id in manufacturers_filter:
+            bitmap |= self.manufacturers.get(int(manufacturer_id), 0)
+        return bitmap
+
+    def _range_bitmap(self, entries, pmin, pmax):
+        bitmap = 0
+        start = bisect_left(entries, (float(pmin),))
+        end = bisect_right(entries, (float(pmax), len(self.parents)))
+        for value, position in entries[start:end]:
+            bitmap |= 1 << position
+        return bitmap
+
+    def _roll_up(self, rows):
+        result = rows & self.products
+        for position in _iter_bits(rows & self.variants):
+            result |= 1 << self.parents[position]
+        return result
+
+    def _get_position(self, product_id):
+        position = self.positions.get(product_id)
+        if position is None:
+            position = self.positions[product_id] = len(self.parents)
+            self.parents.append(position)
+        return position
+
+    def _add_product(self, product_id, price, manufacturer_id=None):
+        position = self._get_position(product_id)
+        self.parents[position] = position
+        self.products |= 1 << position
+        if price is not None:
+            self.prices.insert(bisect_left(self.prices, (price, position)), (price, position))
+        if manufacturer_id is not None:
+            self.manufacturers[manufacturer_id] = self.manufacturers.get(manufacturer_id, 0) | 1 << position
+
+    def _add_variant(self, variant_id, parent_id):
+        position = self._get_position(variant_id)
+        self.parents[position] = self.positions[parent_id]
+        self.variants |= 1 << position
+
+    def _add_values(self, property_values):
+        property_values = property_values.filter(type=PROPERTY_VALUE_TYPE_FILTER).values_list(
+            "product_id", "property_group_id", "property_id", "value", "value_as_float"
+        )
+        for product_id, property_group_id, property_id, value, value_as_float in property_values:
+            position = self.positions.get(product_id)
+            if position is None:
+                continue
+
+            key = "{0}_{1}".format(property_group_id, property_id)
+            values = self.values.setdefault(key, {})
+            values[value] = values.get(value, 0) | 1 << position
+
+            numbers = self.numbers.setdefault(key, [])
+            if value_as_float is not None:
+                numbers.insert(bisect_left(numbers, (value_as_float, position)), (value_as_float, position))
+
+
+def _iter_bits(bitmap):
+    """Yields the positions of all set bits of given bitmap."""
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length() - 1
+        bitmap ^= low
+
+
+def _get_cache_key(category_id):
+    return "%s-%s-%s-facet-index-%s" % (
+        settings.CACHE_MIDDLEWARE_KEY_PREFIX,
+        get_cache_group_id("facet-index"),
+        get_cache_group_id("facet-index-%s" % category_id),
+        category_id,
+    )
+
+
+def get_facet_index(category):
+    """Returns the facet index of given category. Builds and caches the index
+    if it doesn't exist yet.
+    """
+    cache_key = _get_cache_key(category.id)
+    index = cache.get(cache_key)
+    if index is None:
+        index = FacetIndex.build(category)
+        cache.set(cache_key, index)
+    return index
+
+
+def delete_product_facet_indexes(product):
+    """Invalidates the cached facet indexes of all categories which display
+    given product. They are rebuilt on next access.
+    """
+    if product.is_variant():
+        product = product.parent
+
+    for category in product.get_categories(with_parents=True):
+        _invalidate_facet_index(category.id)
+
+
+def delete_facet_index(category):
+    """Invalidates the cached facet index of given category and all its
+    parents (which might display the products of the category, too).
+    """
+    _invalidate_facet_index(category.id)
+    for parent in category.get_parents():
+        _invalidate_facet_index(parent.id)
+
+
+def invalidate_facet_indexes():
+    """Invalidates all cached facet indexes, e.g. after a property has been
+    changed.
+    """
+    invalidate_cache_group_id("facet-index")
+
+
+def _invalidate_facet_index(category_id):
+    """Invalidates the facet index of the category with given id by
+    incrementing its version, hence an index which is built concurrently from
+    the old data is stored under the outdated key. This is done once more
+    after the transaction has been committed, as an index which is built in
+    between would still read the old data.
+    """
+    group_code = "facet-index-%s" % category_id
+    invalidate_cache_group_id(group_code)
+    transaction.on_commit(lambda: invalidate_cache_group_id(group_code))
@@ -1,11 +1,25 @@
 import os
 
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import m2m_changed
 from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import post_migrate
 from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_save
 from django.dispatch import receiver
 
+from lfs.catalog.closure import rebuild_category_closure
+from lfs.catalog.closure import remove_category_closure
+from lfs.catalog.closure import update_category_closure
+from lfs.catalog.facets import delete_facet_index
+from lfs.catalog.facets import delete_product_facet_indexes
+from lfs.catalog.facets import invalidate_facet_indexes
+from lfs.catalog.navigation import delete_navigation_indexes
+from lfs.catalog.navigation import delete_product_navigation_indexes
+from lfs.catalog.models import Category
 from lfs.catalog.models import File, Property
 from lfs.catalog.models import Image
+from lfs.catalog.models import Product
 from lfs.catalog.models import ProductAttachment
 from lfs.catalog.models import PropertyGroup
 from lfs.catalog.models import ProductPropertyValue
@@ -14,6 +28,9 @@ from lfs.catalog.models import GroupsPropertiesRelation
 from lfs.catalog.settings import DELETE_FILES, PROPERTY_VALUE_TYPE_FILTER
 from lfs.catalog.settings import DELETE_IMAGES
 from lfs.catalog.settings import THUMBNAIL_SIZES
+from lfs.core.signals import category_changed
+from lfs.core.signals import manufacturer_changed
+from lfs.core.signals import product_changed
 from lfs.core.signals import property_type_changed
 from lfs.core.signals import product_removed_property_group
 
@@ -27,6 +44,7 @@ def property_option_deleted_listener(sender, instance, **kwargs):
     instance) selected which is about to be deleted.
     """
     prop = instance.property
+    invalidate_facet_indexes()
     ProductPropertyValue.objects.filter(property=prop, value=str(instance.id)).delete()
 
 
@@ -38,6 +56,7 @@ def property_group_deleted_listener(sender, instance, **kwargs):
     Deletes all ProductPropertyValue which are assigned to products and
     properties of the PropertyGroup which is about to be deleted.
     """
+    invalidate_facet_indexes()
     ProductPropertyValue.objects.filter(property_group=instance).delete()
 
 
@@ -50,6 +69,7 @@ def property_removed_from_property_group_listener(sender, instance, **kwargs):
     Deletes all ProductPropertyValue which are assigned to the property and
     the property group from which the property is about to be removed.
     """
+    invalidate_facet_indexes()
     ProductPropertyValue.objects.filter(property_group=instance.group, property=instance.property).delete()
 
 
@@ -75,6 +95,7 @@ def property_changed_to_not_filterable_listener(sender, instance, created, **kwa
     Deletes all ProductPropertyValue for this property
     """
     if not instance.filterable:
+        invalidate_facet_indexes()
         ProductPropertyValue.objects.filter(property=instance, type=PROPERTY_VALUE_TYPE_FILTER).delete()
 
 
@@ -85,9 +106,210 @@ def property_type_changed_listener(sender, **kwargs):
 
     Deletes all ProductPropertyValue which are assigned to the property.
     """
+    invalidate_facet_indexes()
     ProductPropertyValue.objects.filter(property=sender).delete()
 
 
+@receiver(post_save, sender=ProductPropertyValue)
+@receiver(post_delete, sender=ProductPropertyValue)
+def product_property_value_facet_index_listener(sender, instance, **kwargs):
+    """
+    This is called after a filter value of a product has been saved or deleted.
+
+    Deletes the facet indexes of all categories which display the product.
+    """
+    if instance.type == PROPERTY_VALUE_TYPE_FILTER:
+        try:
+            delete_product_facet_indexes(instance.product)
+        except ObjectDoesNotExist:
+            # The product has been deleted
+            pass
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleted_facet_index_listener(sender, instance, **kwargs):
+    """
+    This is called before a product is deleted.
+
+    Deletes the facet indexes of all categories of the product.
+    """
+    for category in instance.get_categories():
+        delete_facet_index(category)
+
+
+@receiver(product_changed)
+def product_changed_facet_index_listener(sender, **kwargs):
+    """
+    This is called after a product has been changed.
+
+    Deletes the facet indexes of all categories which display the product.
+    """
+    delete_product_facet_indexes(sender)
+
+
+@receiver(category_changed)
+def category_changed_facet_index_listener(sender, **kwargs):
+    """
+    This is called after a category has been changed.
+
+    Deletes the facet index of the category and its parents.
+    """
+    delete_facet_index(sender)
+
+
+@receiver(m2m_changed, sender=Category.products.through)
+def category_products_changed_facet_index_listener(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    This is called after products have been added to or removed from a
+    category.
+
+    Deletes the facet indexes of the affected categories.
+    """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if reverse:
+        # instance is a product
+        categories = Category.objects.filter(pk__in=pk_set) if pk_set else instance.categories.all()
+        for category in categories:
+            delete_facet_index(category)
+    else:
+        # instance is a category
+        delete_facet_index(instance)
+
+
+@receiver(post_save, sender=Category)
+def category_saved_closure_listener(sender, instance, **kwargs):
+    """
+    This is called after a category has been saved.
+
+    Updates the closure table if the category is new or has been moved.
+    Fixtures might load categories before their parents, which is taken care
+    of by update_category_closure.
+    """
+    update_category_closure(instance)
+
+
+@receiver(post_migrate)
+def catalog_migrated_closure_listener(sender, **kwargs):
+    """
+    This is called after the migrations of an app have been applied.
+
+    Rebuilds the closure table once after the catalog has been migrated, as
+    data migrations might have changed categories without sending signals.
+    """
+    if sender.name != "lfs.catalog":
+        return
+    apps = kwargs["apps"]
+    try:
+        apps.get_model("catalog", "CategoryClosure")
+    except LookupError:
+        # The catalog has been migrated back to before the closure table
+        return
+    rebuild_category_closure(apps)
+
+
+@receiver(category_changed)
+def category_changed_closure_listener(sender, **kwargs):
+    """
+    This is called after a category has been changed.
+
+    Updates the closure table if the category has been moved.
+    """
+    update_category_closure(sender)
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleted_closure_listener(sender, instance, **kwargs):
+    """
+    This is called before a category is deleted.
+
+    Detaches the sub categories, which become top level categories, from the
+    category and its parents.
+    """
+    remove_category_closure(instance)
+
+
+@receiver(pre_save, sender=Product)
+def product_manufacturer_changed_navigation_index_listener(sender, instance, **kwargs):
+    """
+    This is called before a product is saved.
+
+    Deletes the navigation indexes of the former manufacturer of the product if
+    the manufacturer has been changed.
+    """
+    if instance.pk is None or instance.is_variant():
+        return
+
+    manufacturer_ids = Product.objects.filter(pk=instance.pk).values_list("manufacturer_id", flat=True)
+    for manufacturer_id in manufacturer_ids:
+        if manufacturer_id and manufacturer_id != instance.manufacturer_id:
+            delete_navigation_indexes(manufacturer_id=manufacturer_id)
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleted_navigation_index_listener(sender, instance, **kwargs):
+    """
+    This is called before a product is deleted.
+
+    Deletes the navigation indexes of its categories and its manufacturer.
+    """
+    delete_product_navigation_indexes(instance)
+
+
+@receiver(product_changed)
+def product_changed_navigation_index_listener(sender, **kwargs):
+    """
+    This is called after a product has been changed.
+
+    Deletes the navigation indexes of its categories and its manufacturer.
+    """
+    delete_product_navigation_indexes(sender)
+
+
+@receiver(category_changed)
+def category_changed_navigation_index_listener(sender, **kwargs):
+    """
+    This is called after a category has been changed.
+
+    Deletes the navigation indexes of the category and its parents.
+    """
+    delete_navigation_indexes(category=sender)
+
+
+@receiver(manufacturer_changed)
+def manufacturer_changed_navigation_index_listener(sender, **kwargs):
+    """
+    This is called after a manufacturer has been changed.
+
+    Deletes the navigation indexes of the manufacturer.
+    """
+    delete_navigation_indexes(manufacturer_id=sender.id)
+
+
+@receiver(m2m_changed, sender=Category.products.through)
+def category_products_changed_navigation_index_listener(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    This is called after products have been added to or removed from a
+    category.
+
+    Deletes the navigation indexes of the affected categories.
+    """
+    if action == "pre_clear":
+        if reverse:
+            for category in instance.categories.all():
+                delete_navigation_indexes(category=category)
+        else:
+            delete_navigation_indexes(category=instance)
+    elif action in ("post_add", "post_remove"):
+        if reverse:
+            # instance is a product
+            delete_product_navigation_indexes(instance, Category.objects.filter(pk__in=pk_set))
+        else:
+            # instance is a category
+            delete_navigation_indexes(category=instance)
+
+
 @receiver(post_delete, sender=Image)
 def delete_image_files(sender, **kwargs):
     """
@@ -0,0 +1,48 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_category_closure(apps, schema_editor):
+    """
+    Creates the closure rows of all existing categories.
+    """
+    from lfs.catalog.closure import rebuild_category_closure
+
+    rebuild_category_closure(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0015_alter_product_active_packing_unit"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryClosure",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("depth", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="descendant_links",
+                        to="catalog.category",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ancestor_links",
+                        to="catalog.category",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("ancestor", "descendant")},
+            },
+        ),
+        migrations.RunPython(create_category_closure, migrations.RunPython.noop),
+    ]
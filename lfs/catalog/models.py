@@ -7,9 +7,9 @@ from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.fields import GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.cache import cache
 from django.urls import reverse
 from django.db.models import F
+from django.db.models import prefetch_related_objects
 from django.db import models
 from django.template.defaultfilters import striptags
 from django.utils import formats
@@ -17,6 +17,11 @@ from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
 import lfs.catalog.utils
+from lfs.caching.utils import cache_get
+from lfs.caching.utils import cache_set
+from lfs.caching.utils import get_tagged
+from lfs.caching.utils import set_tagged
+from lfs.caching.utils import SimpleCacheManager
 from lfs.core.fields.thumbs import ImageWithThumbsField
 from lfs.core import utils as core_utils
 from lfs.core.managers import ActiveManager
@@ -216,6 +221,8 @@ class Category(models.Model):
     level = models.PositiveSmallIntegerField(default=1)
     uid = models.CharField(max_length=50, editable=False, unique=True, default=get_unique_id_str)
 
+    objects = SimpleCacheManager()
+
     class Meta:
         ordering = ("position",)
         verbose_name = _("Category")
@@ -240,25 +247,29 @@ class Category(models.Model):
 
     def get_all_children(self):
         """
-        Returns all child categories of the category.
+        Returns all child categories of the category (depth-first, ordered by
+        position).
         """
-
-        def _get_all_children(category, children):
-            for category in Category.objects.filter(parent=category.id):
-                children.append(category)
-                _get_all_children(category, children)
-
         cache_key = "%s-category-all-children-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.id)
-        children = cache.get(cache_key)
+        children = cache_get(cache_key)
         if children is not None:
             return children
 
+        # All descendants are loaded with one query via the closure table and
+        # sorted into the tree order afterwards.
+        categories_by_parent = {}
+        for category in Category.objects.filter(ancestor_links__ancestor=self, ancestor_links__depth__gt=0):
+            categories_by_parent.setdefault(category.parent_id, []).append(category)
+
+        def _get_all_children(category_id, children):
+            for category in categories_by_parent.get(category_id, []):
+                children.append(category)
+                _get_all_children(category.id, children)
+
         children = []
-        for category in Category.objects.filter(parent=self.id):
-            children.append(category)
-            _get_all_children(category, children)
+        _get_all_children(self.id, children)
 
-        cache.set(cache_key, children)
+        cache_set(cache_key, children)
         return children
 
     def get_children(self):
@@ -267,12 +278,12 @@ class Category(models.Model):
         """
         cache_key = "%s-category-children-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.id)
 
-        categories = cache.get(cache_key)
+        categories = cache_get(cache_key)
         if categories is not None:
             return categories
 
         categories = Category.objects.filter(parent=self.id)
-        cache.set(cache_key, categories)
+        cache_set(cache_key, categories)
 
         return categories
 
@@ -351,17 +362,17 @@ class Category(models.Model):
         Returns all parent categories.
         """
         cache_key = "%s-category-parents-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.id)
-        parents = cache.get(cache_key)
+        parents = cache_get(cache_key)
         if parents is not None:
             return parents
 
-        parents = []
-        category = self.parent
-        while category is not None:
-            parents.append(category)
-            category = category.parent
+        parents = list(
+            Category.objects.filter(descendant_links__descendant=self, descendant_links__depth__gt=0).order_by(
+                "descendant_links__depth"
+            )
+        )
 
-        cache.set(cache_key, parents)
+        cache_set(cache_key, parents)
         return parents
 
     def get_products(self):
@@ -369,12 +380,12 @@ class Category(models.Model):
         Returns the direct products of the category.
         """
         cache_key = "%s-category-products-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.id)
-        products = cache.get(cache_key)
+        products = cache_get(cache_key)
         if products is not None:
             return products
 
         products = self.products.filter(active=True).exclude(sub_type=VARIANT)
-        cache.set(cache_key, products)
+        cache_set(cache_key, products)
 
         return products
 
@@ -390,12 +401,12 @@ class Category(models.Model):
             properties_version,
             self.id,
         )
-        pgs = cache.get(cache_key)
+        pgs = cache_get(cache_key)
         if pgs is not None:
             return pgs
         products = self.get_products()
         pgs = lfs.catalog.models.PropertyGroup.objects.filter(products__in=products).distinct()
-        cache.set(cache_key, pgs)
+        cache_set(cache_key, pgs)
 
         return pgs
 
@@ -404,21 +415,17 @@ class Category(models.Model):
         Returns the direct products and all products of the sub categories
         """
         cache_key = "%s-category-all-products-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.id)
-        products = cache.get(cache_key)
+        products = cache_get(cache_key)
         if products is not None:
             return products
 
-        categories = [self]
-        categories.extend(self.get_all_children())
-
         products = (
-            lfs.catalog.models.Product.objects.distinct()
-            .filter(active=True, categories__in=categories)
+            lfs.catalog.models.Product.objects.filter(active=True, categories__ancestor_links__ancestor=self)
             .exclude(sub_type=VARIANT)
             .distinct()
         )
 
-        cache.set(cache_key, products)
+        cache_set(cache_key, products)
         return products
 
     def get_filtered_products(self, filters, price_filter, sorting):
@@ -433,12 +440,12 @@ class Category(models.Model):
         Returns the static block of the category.
         """
         cache_key = "%s-static-block-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.id)
-        blocks = cache.get(cache_key)
+        blocks = cache_get(cache_key)
         if blocks is not None:
             return blocks
 
         block = self.static_block
-        cache.set(cache_key, blocks)
+        cache_set(cache_key, blocks)
 
         return block
 
@@ -473,6 +480,44 @@ class Category(models.Model):
         return CONTENT_PRODUCTS
 
 
+class CategoryClosure(models.Model):
+    """
+    The closure of the category tree: one row per category and each of its
+    ancestors (including the category itself).
+
+    This allows to query all sub categories, all parent categories or all
+    products of a category tree with one query, e.g.::
+
+        Product.objects.filter(categories__ancestor_links__ancestor=category)
+
+    The rows are maintained by the listeners of lfs.catalog, see
+    lfs.catalog.closure.
+
+    **Attributes:**
+
+    ancestor
+        The ancestor category.
+
+    descendant
+        The descendant category.
+
+    depth
+        The distance between ancestor and descendant, 0 means both are the
+        same category.
+    """
+
+    ancestor = models.ForeignKey(Category, models.CASCADE, related_name="descendant_links")
+    descendant = models.ForeignKey(Category, models.CASCADE, related_name="ancestor_links")
+    depth = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("ancestor", "descendant")
+        app_label = "catalog"
+
+    def __str__(self):
+        return "%s -> %s (%s)" % (self.ancestor_id, self.descendant_id, self.depth)
+
+
 class Product(models.Model):
     """
     A product is sold within a shop.
@@ -904,7 +949,7 @@ class Product(models.Model):
         Returns the categories of the product.
         """
         cache_key = "%s-product-categories-%s-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.id, with_parents)
-        categories = cache.get(cache_key)
+        categories = cache_get(cache_key)
 
         if categories is not None:
             return categories
@@ -921,7 +966,7 @@ class Product(models.Model):
         else:
             categories = object.categories.all()
 
-        cache.set(cache_key, categories)
+        cache_set(cache_key, categories)
         return categories
 
     def get_category(self):
@@ -1094,7 +1139,7 @@ class Product(models.Model):
         Returns all images of the product, including the main image.
         """
         cache_key = "%s-product-images-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.id)
-        images = cache.get(cache_key)
+        images = cache_get(cache_key)
 
         if images is None:
             if self.is_variant() and not self.active_images:
@@ -1103,7 +1148,7 @@ class Product(models.Model):
                 obj = self
 
             images = obj.images.all()
-            cache.set(cache_key, images)
+            cache_set(cache_key, images)
 
         return images
 
@@ -1187,12 +1232,12 @@ class Product(models.Model):
         properties_version = get_cache_group_id("global-properties-version")
         group_id = "%s-%s" % (properties_version, get_cache_group_id("properties-%s" % pid))
         cache_key = "%s-%s-productpropertyvalue%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, group_id, self.id)
-        options = cache.get(cache_key)
+        options = cache_get(cache_key)
         if options is None:
             options = {}
             for pvo in self.property_values.all():
                 options[pvo.property_id] = pvo.value
-            cache.set(cache_key, options)
+            cache_set(cache_key, options)
         try:
             return options[property_id]
         except KeyError:
@@ -1208,7 +1253,7 @@ class Product(models.Model):
         properties_version = get_cache_group_id("global-properties-version")
         group_id = "%s-%s" % (properties_version, get_cache_group_id("properties-%s" % pid))
         cache_key = "%s-%s-displayed-properties-%s" % (group_id, settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.id)
-        properties = cache.get(cache_key)
+        properties = cache_get(cache_key)
         if properties:
             return properties
 
@@ -1239,7 +1284,7 @@ class Product(models.Model):
                     "property_group_id": ppv.property_group_id if ppv.property_group else 0,
                 }
             )
-        cache.set(cache_key, properties)
+        cache_set(cache_key, properties)
         return properties
 
     def get_variant_properties(self):
@@ -1254,7 +1299,7 @@ class Product(models.Model):
         group_id = "%s-%s" % (properties_version, get_cache_group_id("properties-%s" % pid))
         cache_key = "%s-variant-properties-%s-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, group_id, self.id)
 
-        properties = cache.get(cache_key)
+        properties = cache_get(cache_key)
         if properties is not None:
             return properties
 
@@ -1283,7 +1328,7 @@ class Product(models.Model):
                 }
             )
 
-        cache.set(cache_key, properties)
+        cache_set(cache_key, properties)
 
         return properties
 
@@ -1299,48 +1344,38 @@ class Product(models.Model):
         """
         if not self.is_product_with_variants():
             return []
+
+        matrix = self.get_variant_options_matrix()
+        selected_values = matrix["values"].get(variant.id, {}) if variant else {}
+
         properties = []
         if self.variants_display_type == SELECT:
             # Get all properties (sorted). We need to traverse through all
             # property/options to select the options of the current variant.
-            for prop_dict in self.get_variants_properties():
+            for prop_dict in matrix["properties"]:
                 options = []
                 selected_option_value = ""
                 prop = prop_dict["property"]
                 property_group = prop_dict["property_group"]
-                for property_option in prop.options.all():
+                key = (property_group.id if property_group else None, prop.id)
+                for option_id, option_name in prop_dict["options"]:
                     # check if option exists in any variant
-                    option_used = ProductPropertyValue.objects.filter(
-                        parent_id=self.pk,
-                        product__active=True,
-                        property=prop,
-                        property_group=property_group,
-                        type=PROPERTY_VALUE_TYPE_VARIANT,
-                        value=property_option.pk,
-                    ).exists()
-                    if option_used:
-                        if variant and variant.has_option(property_group, prop, property_option):
+                    if key + (str(option_id),) in matrix["used"]:
+                        if selected_values.get(key) == str(option_id):
                             selected = True
-                            selected_option_value = property_option.pk
+                            selected_option_value = option_id
                         else:
                             selected = False
                         options.append(
                             {
-                                "id": property_option.id,
-                                "name": property_option.name,
+                                "id": option_id,
+                                "name": option_name,
                                 "selected": selected,
                             }
                         )
 
                 # check for variants that do not have such property and if such variants exists add empty option
-                ppv_count = ProductPropertyValue.objects.filter(
-                    parent_id=self.pk,
-                    product__active=True,
-                    type=PROPERTY_VALUE_TYPE_VARIANT,
-                    property=prop,
-                    property_group=property_group,
-                ).count()
-                if ppv_count != self.get_variants().count():
+                if matrix["counts"].get(key, 0) != matrix["variants"]:
                     selected = False
                     if variant and selected_option_value == "":
                         selected = True
@@ -1358,23 +1393,17 @@ class Product(models.Model):
                         }
                     )
         else:
-            for prop_dict in self.get_variants_properties():
+            for prop_dict in matrix["properties"]:
                 selected_option_name = ""
                 selected_option_value = ""
                 prop = prop_dict["property"]
                 property_group = prop_dict["property_group"]
-                if variant:
-                    try:
-                        ppv = ProductPropertyValue.objects.get(
-                            product=variant,
-                            type=PROPERTY_VALUE_TYPE_VARIANT,
-                            property=prop,
-                            property_group=property_group,
-                        )
-                        selected_option_value = ppv.value
-                        selected_option_name = prop.options.get(pk=ppv.value).name
-                    except (ProductPropertyValue.DoesNotExist, PropertyOption.DoesNotExist):
-                        pass
+                value = selected_values.get((property_group.id if property_group else None, prop.id))
+                if value is not None:
+                    selected_option_value = value
+                    selected_option_name = dict(
+                        (str(option_id), option_name) for (option_id, option_name) in prop_dict["options"]
+                    ).get(value, "")
                 properties.append(
                     {
                         "id": prop.id,
@@ -1389,6 +1418,79 @@ class Product(models.Model):
                 )
         return properties
 
+    def get_variant_options_matrix(self):
+        """
+        Returns which options of the variant properties are used by the
+        variants of the product, see get_all_properties. All variant property
+        values are loaded at once. The result is a dictionary with:
+
+        properties
+            The variant properties (see get_variants_properties) with their
+            options as list of (id, name).
+
+        used
+            The (property group id, property id, option id) which are used by
+            at least one active variant. The property group id is None for
+            local properties.
+
+        counts
+            The amount of values of the active variants per (property group
+            id, property id).
+
+        values
+            The selected option ids of all variants as dictionary of variant
+            id to (property group id, property id) to option id.
+
+        variants
+            The amount of active variants.
+
+        The matrix is cached until the properties of the product or the
+        properties in general are changed.
+        """
+        from lfs.caching.utils import get_cache_group_id
+
+        properties_version = get_cache_group_id("global-properties-version")
+        group_id = "%s-%s" % (properties_version, get_cache_group_id("properties-%s" % self.pk))
+        cache_key = "%s-variant-options-matrix-%s-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, group_id, self.pk)
+
+        matrix = cache_get(cache_key)
+        if matrix is not None:
+            return matrix
+
+        properties = self.get_variants_properties()
+        prefetch_related_objects([prop_dict["property"] for prop_dict in properties], "options")
+
+        used = set()
+        counts = {}
+        values = {}
+        property_values = ProductPropertyValue.objects.filter(parent_id=self.pk, type=PROPERTY_VALUE_TYPE_VARIANT)
+        for variant_id, active, property_group_id, property_id, value in property_values.values_list(
+            "product_id", "product__active", "property_group_id", "property_id", "value"
+        ):
+            key = (property_group_id, property_id)
+            values.setdefault(variant_id, {})[key] = value
+            if active:
+                used.add(key + (value,))
+                counts[key] = counts.get(key, 0) + 1
+
+        matrix = {
+            "properties": [
+                {
+                    "property": prop_dict["property"],
+                    "property_group": prop_dict["property_group"],
+                    "options": [(option.id, option.name) for option in prop_dict["property"].options.all()],
+                }
+                for prop_dict in properties
+            ],
+            "used": used,
+            "counts": counts,
+            "values": values,
+            "variants": self.get_variants().count(),
+        }
+
+        cache_set(cache_key, matrix)
+        return matrix
+
     def get_variant_properties_for_parent(self):
         """
         Returns the property value of a variant in the correct ordering of the
@@ -1401,12 +1503,12 @@ class Product(models.Model):
         group_id = "%s-%s" % (properties_version, get_cache_group_id("properties-%s" % pid))
         cache_key = "%s-variant-properties-for-parent-%s-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, group_id, self.id)
 
-        properties = cache.get(cache_key)
+        properties = cache_get(cache_key)
         if properties:
             return properties
 
         properties = self.parent.get_all_properties(variant=self)
-        cache.set(cache_key, properties)
+        cache_set(cache_key, properties)
 
         return properties
 
@@ -1419,12 +1521,12 @@ class Product(models.Model):
         pid = self.get_parent().pk
         properties_version = get_cache_group_id("global-properties-version")
         group_id = "%s-%s" % (properties_version, get_cache_group_id("properties-%s" % pid))
-        options = cache.get("%s-%s-productpropertyvalue%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, group_id, self.id))
+        options = cache_get("%s-%s-productpropertyvalue%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, group_id, self.id))
         if options is None:
             options = {}
             for pvo in self.property_values.filter(property_group=property_group):
                 options[pvo.property_id] = pvo.value
-            cache.set(
+            cache_set(
                 "%s-%s-productpropertyvalue%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, group_id, self.id), options
             )
 
@@ -1726,7 +1828,7 @@ class Product(models.Model):
         Returns the related products of the product.
         """
         cache_key = "%s-related-products-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.id)
-        related_products = cache.get(cache_key)
+        related_products = cache_get(cache_key)
 
         if related_products is None:
             if self.is_variant() and not self.active_related_products:
@@ -1734,7 +1836,7 @@ class Product(models.Model):
             else:
                 related_products = self.related_products.filter(active=True)
 
-            cache.set(cache_key, related_products)
+            cache_set(cache_key, related_products)
 
         return related_products
 
@@ -1747,7 +1849,7 @@ class Product(models.Model):
         product has no variants it is None.
         """
         cache_key = "%s-default-variant-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.id)
-        default_variant = cache.get(cache_key)
+        default_variant = cache_get(cache_key)
 
         if default_variant is not None:
             return default_variant
@@ -1760,7 +1862,7 @@ class Product(models.Model):
             except IndexError:
                 return None
 
-        cache.set(cache_key, default_variant)
+        cache_set(cache_key, default_variant)
         return default_variant
 
     def get_variant_for_category(self, request):
@@ -1791,114 +1893,106 @@ class Product(models.Model):
         """
         Returns the cheapest variant by gross price.
         """
-        cheapest_variant = None
-        min_price = None
-        for variant in Product.objects.filter(parent=self, active=True):
-            price = variant.get_price_gross(request)
-            if price == 0:
-                continue
-            if (min_price is None) or (price < min_price):
-                cheapest_variant = variant
-                min_price = price
-
-        return cheapest_variant
+        variant_id = self.get_cheapest_prices(request)["variant_id"]
+        return Product.objects.filter(pk=variant_id).first() if variant_id else None
 
     def get_cheapest_variant_by_base_price(self, request):
         """
         Returns the cheapest variant by base gross price.
         """
-        cheapest_variant = None
-        min_price = None
-        for variant in Product.objects.filter(parent=self, active=True):
-            price = variant.get_base_price_gross(request, amount=sys.maxsize)
-            if price == 0:
-                continue
-            if (min_price is None) or (price < min_price):
-                cheapest_variant = variant
-                min_price = price
+        variant_id = self.get_cheapest_prices(request)["base_price_variant_id"]
+        return Product.objects.filter(pk=variant_id).first() if variant_id else None
 
-        return cheapest_variant
+    def get_cheapest_prices(self, request):
+        """
+        Returns the minimal prices of the active variants of the product, see
+        lfs.catalog.utils.get_cheapest_prices.
+        """
+        return lfs.catalog.utils.get_cheapest_prices(request, [self])[self.id]
 
-    def get_cheapest_for_sale_price_gross(self, request):
+    def get_cheapest_for_sale_price(self, request):
         """
-        Returns the min price and min base price as dict.
+        Returns the min for sale price and whether the variants have different
+        for sale prices as dict.
         """
-        product = self.get_parent()
+        return self.get_parent().get_cheapest_prices(request)["for_sale_price"]
 
-        prices = []
-        for variant in Product.objects.filter(parent=product, active=True):
-            price = variant.get_for_sale_price_gross(request, amount=sys.maxsize)
-            if price not in prices:
-                prices.append(price)
+    def get_cheapest_for_sale_price_net(self, request):
+        """
+        Returns the min net for sale price and whether the variants have different
+        net for sale prices as dict.
+        """
+        return self.get_parent().get_cheapest_prices(request)["for_sale_price_net"]
 
-        try:
-            price = min(prices)
-        except ValueError:
-            price = 0
+    def get_cheapest_for_sale_price_gross(self, request):
+        """
+        Returns the min gross for sale price and whether the variants have different
+        gross for sale prices as dict.
+        """
+        return self.get_parent().get_cheapest_prices(request)["for_sale_price_gross"]
 
-        return {
-            "price": price,
-            "starting_from": len(prices) > 1,
-        }
+    def get_cheapest_standard_price(self, request):
+        """
+        Returns the min standard price and whether the variants have different
+        standard prices as dict.
+        """
+        return self.get_cheapest_prices(request)["standard_price"]
+
+    def get_cheapest_standard_price_net(self, request):
+        """
+        Returns the min net standard price and whether the variants have different
+        net standard prices as dict.
+        """
+        return self.get_cheapest_prices(request)["standard_price_net"]
 
     def get_cheapest_standard_price_gross(self, request):
         """
-        Returns the min price and min base price as dict.
+        Returns the min gross standard price and whether the variants have different
+        gross standard prices as dict.
         """
-        prices = []
-        for variant in Product.objects.filter(parent=self, active=True):
-            price = variant.get_standard_price_gross(request, amount=sys.maxsize)
-            if price not in prices:
-                prices.append(price)
+        return self.get_cheapest_prices(request)["standard_price_gross"]
 
-        try:
-            price = min(prices)
-        except ValueError:
-            price = 0
+    def get_cheapest_price(self, request):
+        """
+        Returns the min price and whether the variants have different
+        prices as dict.
+        """
+        return self.get_cheapest_prices(request)["price"]
 
-        return {
-            "price": price,
-            "starting_from": len(prices) > 1,
-        }
+    def get_cheapest_price_net(self, request):
+        """
+        Returns the min net price and whether the variants have different
+        net prices as dict.
+        """
+        return self.get_cheapest_prices(request)["price_net"]
 
     def get_cheapest_price_gross(self, request):
         """
-        Returns the min price and min base price as dict.
+        Returns the min gross price and whether the variants have different
+        gross prices as dict.
         """
-        prices = []
-        for variant in Product.objects.filter(parent=self, active=True):
-            price = variant.get_price_gross(request, amount=sys.maxsize)
-            if price not in prices:
-                prices.append(price)
+        return self.get_cheapest_prices(request)["price_gross"]
 
-        try:
-            price = min(prices)
-        except ValueError:
-            price = 0
+    def get_cheapest_base_price(self, request):
+        """
+        Returns the min base price and whether the variants have different
+        base prices as dict.
+        """
+        return self.get_cheapest_prices(request)["base_price"]
 
-        return {
-            "price": price,
-            "starting_from": len(prices) > 1,
-        }
+    def get_cheapest_base_price_net(self, request):
+        """
+        Returns the min net base price and whether the variants have different
+        net base prices as dict.
+        """
+        return self.get_cheapest_prices(request)["base_price_net"]
 
     def get_cheapest_base_price_gross(self, request):
         """
-        Returns the min price and min base price as dict.
+        Returns the min gross base price and whether the variants have different
+        gross base prices as dict.
         """
-        prices = []
-        for variant in Product.objects.filter(parent=self, active=True):
-            price = float("%.2f" % variant.get_base_price_gross(request, amount=sys.maxsize))
-            if price not in prices:
-                prices.append(price)
-        try:
-            price = min(prices)
-        except ValueError:
-            price = 0
-
-        return {
-            "price": price,
-            "starting_from": len(prices) > 1,
-        }
+        return self.get_cheapest_prices(request)["base_price_gross"]
 
     def get_static_block(self):
         """
@@ -1906,7 +2000,7 @@ class Product(models.Model):
         is a variant and meta description are active or not.
         """
         cache_key = "%s-product-static-block-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.id)
-        block = cache.get(cache_key)
+        block = cache_get(cache_key)
         if block is not None:
             return block
 
@@ -1915,7 +2009,7 @@ class Product(models.Model):
         else:
             block = self.static_block
 
-        cache.set(cache_key, block)
+        cache_set(cache_key, block)
 
         return block
 
@@ -1954,22 +2048,47 @@ class Product(models.Model):
             parsed_options.append(option)
         options = "".join(parsed_options)
 
-        variants = self.variants.all()
+        variant_ids = self.get_variant_signatures().get(options)
+        if not variant_ids:
+            return None
+
+        variants = self.variants.filter(pk__in=variant_ids)
         if only_active:
             variants = variants.filter(active=True)
 
-        for variant in variants:
-            temp = variant.property_values.filter(type=PROPERTY_VALUE_TYPE_VARIANT)
-            temp = [
-                "%s|%s|%s" % (x.property_group_id if x.property_group_id else 0, x.property_id, x.value) for x in temp
-            ]
-            temp.sort()
-            temp = "".join(temp)
+        return variants.first()
 
-            if temp == options:
-                return variant
+    def get_variant_signatures(self):
+        """
+        Returns a dictionary of option signature to the ids of the variants
+        with these options, see get_variant.
 
-        return None
+        The signature of a variant are its sorted variant property values
+        joined as "group.id|property.id|value". The dictionary is built with
+        one query and cached until the product or one of its variants is
+        changed (see lfs.caching.listeners).
+        """
+        cache_key = "%s-variant-signatures-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.id)
+        signatures = get_tagged(cache_key)
+        if signatures is not None:
+            return signatures
+
+        options = {}
+        property_values = ProductPropertyValue.objects.filter(
+            product__parent=self, type=PROPERTY_VALUE_TYPE_VARIANT
+        ).values_list("product_id", "property_group_id", "property_id", "value")
+        for variant_id, property_group_id, property_id, value in property_values:
+            options.setdefault(variant_id, []).append(
+                "%s|%s|%s" % (property_group_id if property_group_id else 0, property_id, value)
+            )
+
+        signatures = {}
+        for variant_id in self.variants.values_list("id", flat=True):
+            signature = "".join(sorted(options.get(variant_id, [])))
+            signatures.setdefault(signature, []).append(variant_id)
+
+        set_tagged(cache_key, signatures, ["product:%s" % self.id])
+        return signatures
 
     def has_variant(self, options, only_active=True):
         """
@@ -2389,6 +2508,8 @@ class Property(models.Model):
 
     uid = models.CharField(max_length=50, editable=False, unique=True, default=get_unique_id_str)
 
+    objects = SimpleCacheManager()
+
     class Meta:
         verbose_name_plural = _("Properties")
         ordering = ["position"]
@@ -2549,6 +2670,8 @@ class PropertyOption(models.Model):
 
     uid = models.CharField(max_length=50, editable=False, unique=True, default=get_unique_id_str)
 
+    objects = SimpleCacheManager()
+
     class Meta:
         ordering = ["position"]
         app_label = "catalog"
@@ -0,0 +1,206 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from lfs.caching.utils import get_cache_group_id
+from lfs.caching.utils import invalidate_cache_group_id
+from lfs.catalog.settings import SORTING_MAP
+from lfs.catalog.settings import VARIANT
+
+CATEGORY = "category"
+MANUFACTURER = "manufacturer"
+
+
+class NavigationIndex(object):
+    """Precomputed positions of the products of a category or manufacturer
+    for one sorting, see lfs.core.templatetags.lfs_tags.product_navigation.
+
+    Previous and next product as well as the position of a product are looked
+    up without querying the database. The index is rebuilt after the listed
+    products have been changed, see delete_product_navigation_indexes.
+
+    **Attributes:**
+
+    scope
+        Either CATEGORY or MANUFACTURER.
+
+    scope_id
+        The id of the category or manufacturer.
+
+    category_ids
+        The ids of the categories whose products are listed, i.e. the category
+        and, if it displays all products, its children. Only for CATEGORY.
+
+    sorting
+        The order_by argument the products are sorted by, e.g. "-name".
+
+    active_only
+        If True only active products are listed.
+
+    products
+        Ordered list of (id, slug) of the listed products.
+
+    positions
+        Slug to the position within products.
+    """
+
+    def __init__(self, scope, scope_id, sorting, active_only, category_ids=None):
+        self.scope = scope
+        self.scope_id = scope_id
+        self.category_ids = category_ids or []
+        self.sorting = sorting
+        self.active_only = active_only
+        self.products = []
+        self.positions = {}
+
+    @classmethod
+    def build(cls, scope, scope_id, sorting, active_only, category_ids=None):
+        """Returns a new index for given scope and sorting."""
+        index = cls(scope, scope_id, sorting, active_only, category_ids)
+        index._load()
+        return index
+
+    def get(self, slug):
+        """Returns the navigation of the product with given slug (see
+        product_navigation) or None if the product isn't listed.
+        """
+        position = self.positions.get(slug)
+        if position is None:
+            return None
+
+        if position > 0:
+            previous = self.products[position - 1][1]
+        else:
+            previous = None
+
+        total = len(self.products)
+        if position < total - 1:
+            next_product = self.products[position + 1][1]
+        else:
+            next_product = None
+
+        return {
+            "display": True,
+            "previous": previous,
+            "next": next_product,
+            "current": position + 1,
+            "total": total,
+        }
+
+    def _get_products(self):
+        from lfs.catalog.models import Product
+
+        if self.scope == MANUFACTURER:
+            products = Product.objects.filter(manufacturer_id=self.scope_id)
+        else:
+            products = Product.objects.filter(categories__in=self.category_ids)
+
+        # Non active products are displayed to superusers, hence there is an
+        # index for them, too.
+        if self.active_only:
+            products = products.filter(active=True)
+
+        # To calculate the position we take only STANDARD_PRODUCT into account.
+        return products.exclude(sub_type=VARIANT).distinct()
+
+    def _load(self):
+        products = self._get_products().order_by(self.sorting, "id")
+        self.products = list(products.values_list("id", "slug"))
+        self._reindex()
+
+    def _reindex(self):
+        self.positions = dict((slug, position) for (position, (id, slug)) in enumerate(self.products))
+
+
+def get_sortings():
+    """Returns the sortings for which navigation indexes are cached."""
+    sortings = set(sorting["default"] for sorting in SORTING_MAP)
+    sortings.add(getattr(settings, "LFS_PRODUCTS_SORTING", "effective_price"))
+    return sortings
+
+
+def _get_cache_key(scope, scope_id, sorting, active_only):
+    return "%s-%s-%s-navigation-index-%s-%s-%s-%s" % (
+        settings.CACHE_MIDDLEWARE_KEY_PREFIX,
+        get_cache_group_id("navigation-index"),
+        get_cache_group_id("navigation-index-%s-%s" % (scope, scope_id)),
+        scope,
+        scope_id,
+        sorting,
+        active_only,
+    )
+
+
+def _get_navigation_index(scope, scope_id, sorting, active_only, category_ids=None):
+    # Indexes for unknown sortings aren't cached, as they couldn't be updated.
+    if sorting not in get_sortings():
+        return NavigationIndex.build(scope, scope_id, sorting, active_only, category_ids)
+
+    cache_key = _get_cache_key(scope, scope_id, sorting, active_only)
+    index = cache.get(cache_key)
+    if index is None:
+        index = NavigationIndex.build(scope, scope_id, sorting, active_only, category_ids)
+        cache.set(cache_key, index)
+    return index
+
+
+def get_category_navigation_index(category, sorting, active_only=True):
+    """Returns the navigation index of given category. Builds and caches the
+    index if it doesn't exist yet.
+    """
+    category_ids = [category.id]
+    if category.show_all_products:
+        category_ids.extend([child.id for child in category.get_all_children()])
+    return _get_navigation_index(CATEGORY, category.id, sorting, active_only, category_ids)
+
+
+def get_manufacturer_navigation_index(manufacturer_id, sorting, active_only=True):
+    """Returns the navigation index of the manufacturer with given id. Builds
+    and caches the index if it doesn't exist yet.
+    """
+    return _get_navigation_index(MANUFACTURER, manufacturer_id, sorting, active_only)
+
+
+def delete_product_navigation_indexes(product, categories=None):
+    """Invalidates the cached navigation indexes of the categories (and their
+    parents) and the manufacturer of given product. They are rebuilt on next
+    access.
+
+    **Parameters:**
+
+    categories
+        The categories whose indexes are invalidated, e.g. after the product
+        has been removed from them. Defaults to the categories of the product.
+    """
+    if product.is_variant():
+        product = product.parent
+
+    if categories is None:
+        categories = product.get_categories(with_parents=True)
+    else:
+        categories = [parent for category in categories for parent in [category] + category.get_parents()]
+
+    for category_id in set(category.id for category in categories):
+        _invalidate_navigation_index(CATEGORY, category_id)
+    if product.manufacturer_id:
+        _invalidate_navigation_index(MANUFACTURER, product.manufacturer_id)
+
+
+def delete_navigation_indexes(category=None, manufacturer_id=None):
+    """Invalidates the cached navigation indexes of given category and its
+    parents or of the manufacturer with given id.
+    """
+    if category is not None:
+        for category in [category] + category.get_parents():
+            _invalidate_navigation_index(CATEGORY, category.id)
+    if manufacturer_id is not None:
+        _invalidate_navigation_index(MANUFACTURER, manufacturer_id)
+
+
+def _invalidate_navigation_index(scope, scope_id):
+    """Invalidates the navigation indexes of given scope by incrementing their
+    version, like lfs.catalog.facets._invalidate_facet_index.
+    """
+    group_code = "navigation-index-%s-%s" % (scope, scope_id)
+    invalidate_cache_group_id(group_code)
+    transaction.on_commit(lambda: invalidate_cache_group_id(group_code))
@@ -2,16 +2,22 @@
 
 import locale
 import os
+import sys
+from unittest.mock import patch
 
 from django.contrib.sessions.backends.file import SessionStore
 from django.contrib.auth.models import AnonymousUser
 from django.urls import reverse
 from django.test import TestCase
 from django.contrib.auth.models import User
+from django.core import serializers
 from django.core.files.base import ContentFile
 
 from django.utils.encoding import force_str
 import lfs.catalog.utils
+from lfs.catalog.facets import get_facet_index
+from lfs.catalog.navigation import get_category_navigation_index
+from lfs.catalog.navigation import get_manufacturer_navigation_index
 from lfs.core.signals import property_type_changed
 from lfs.catalog.settings import CHOICES_YES
 from lfs.catalog.settings import CHOICES_STANDARD
@@ -23,6 +29,7 @@ from lfs.catalog.settings import DELIVERY_TIME_UNIT_DAYS
 from lfs.catalog.settings import DELIVERY_TIME_UNIT_MONTHS
 from lfs.catalog.settings import PROPERTY_NUMBER_FIELD
 from lfs.catalog.settings import PROPERTY_SELECT_FIELD
+from lfs.catalog.settings import PROPERTY_STEP_TYPE_FIXED_STEP
 from lfs.catalog.settings import PROPERTY_TEXT_FIELD
 from lfs.catalog.settings import PROPERTY_VALUE_TYPE_DISPLAY
 from lfs.catalog.settings import PROPERTY_VALUE_TYPE_FILTER
@@ -33,7 +40,9 @@ from lfs.catalog.settings import QUANTITY_FIELD_DECIMAL_2
 from lfs.catalog.settings import STANDARD_PRODUCT
 from lfs.catalog.settings import THUMBNAIL_SIZES
 from lfs.catalog.settings import LIST
+from lfs.catalog.settings import SELECT
 from lfs.catalog.models import Category
+from lfs.catalog.models import CategoryClosure
 from lfs.catalog.models import DeliveryTime
 from lfs.catalog.models import File
 from lfs.catalog.models import GroupsPropertiesRelation
@@ -49,6 +58,7 @@ from lfs.catalog.models import StaticBlock
 from lfs.catalog.models import ProductAttachment
 from lfs.core.signals import product_changed
 from lfs.core.signals import product_removed_property_group
+from lfs.core.templatetags.lfs_tags import product_navigation
 from lfs.manufacturer.models import Manufacturer
 from lfs.tax.models import Tax
 from lfs.tests.utils import RequestFactory
@@ -720,6 +730,383 @@ class PropertiesTestCaseWithoutProperties(TestCase):
         self.assertEqual(f, {"select_fields": [], "number_fields": []})
 
 
+class FacetIndexTestCase(TestCase):
+    """Tests the facet index of lfs.catalog.facets."""
+
+    fixtures = ["lfs_shop.xml", "lfs_user.xml"]
+
+    def setUp(self):
+        """ """
+        self.p1 = Product.objects.create(name="Product 1", slug="product-1", price=5, active=True)
+        self.p2 = Product.objects.create(name="Product 2", slug="product-2", price=3, active=True)
+        self.p3 = Product.objects.create(
+            name="Product 3", slug="product-3", price=1, active=True, sub_type=PRODUCT_WITH_VARIANTS
+        )
+        self.v1 = Product.objects.create(
+            name="Variant 1", slug="variant-1", price=1, active=True, sub_type=VARIANT, parent=self.p3
+        )
+
+        self.c1 = Category.objects.create(name="Category 1", slug="category-1")
+        self.c1.products.set([self.p1, self.p2, self.p3])
+        self.c1.save()
+
+        self.pg = PropertyGroup.objects.create(name="T-Shirts")
+        self.pg.products.set([self.p1, self.p2, self.p3])
+
+        self.color = Property.objects.create(name="Color", type=PROPERTY_SELECT_FIELD, filterable=True)
+        self.red = PropertyOption.objects.create(property=self.color, name="Red", position=1)
+        self.blue = PropertyOption.objects.create(property=self.color, name="Blue", position=2)
+        GroupsPropertiesRelation.objects.create(group=self.pg, property=self.color)
+
+        self.length = Property.objects.create(name="Length", type=PROPERTY_NUMBER_FIELD, filterable=True)
+        GroupsPropertiesRelation.objects.create(group=self.pg, property=self.length)
+
+        for product, color, length in ((self.p1, self.red, 10), (self.p2, self.blue, 20), (self.v1, self.red, 30)):
+            ProductPropertyValue.objects.create(
+                product=product,
+                property=self.color,
+                property_group=self.pg,
+                value=str(color.id),
+                type=PROPERTY_VALUE_TYPE_FILTER,
+            )
+            ProductPropertyValue.objects.create(
+                product=product,
+                property=self.length,
+                property_group=self.pg,
+                value=length,
+                type=PROPERTY_VALUE_TYPE_FILTER,
+            )
+
+        self.color_key = "{0}_{1}".format(self.pg.id, self.color.id)
+        self.length_key = "{0}_{1}".format(self.pg.id, self.length.id)
+
+    def _color_filter(self, *options):
+        return {
+            self.color_key: {
+                "property_group_id": self.pg.id,
+                "property_id": self.color.id,
+                "value": "|".join([str(o.id) for o in options]),
+            }
+        }
+
+    def _length_filter(self, pmin, pmax):
+        return {
+            self.length_key: {"property_group_id": self.pg.id, "property_id": self.length.id, "value": (pmin, pmax)}
+        }
+
+    def test_get_matching(self):
+        index = get_facet_index(self.c1)
+
+        matching = index.get_matching({})
+        self.assertEqual(set(index.get_ids(matching)), set([self.p1.id, self.p2.id, self.p3.id]))
+
+        # The variant is rolled up to its parent
+        matching = index.get_matching({"select-filter": self._color_filter(self.red)})
+        self.assertEqual(set(index.get_ids(matching)), set([self.p1.id, self.p3.id]))
+
+        matching = index.get_matching({"select-filter": self._color_filter(self.red, self.blue)})
+        self.assertEqual(set(index.get_ids(matching)), set([self.p1.id, self.p2.id, self.p3.id]))
+
+        matching = index.get_matching({"number-filter": self._length_filter(15, 30)})
+        self.assertEqual(set(index.get_ids(matching)), set([self.p2.id, self.p3.id]))
+
+        matching = index.get_matching(
+            {"select-filter": self._color_filter(self.red), "number-filter": self._length_filter(15, 30)}
+        )
+        self.assertEqual(index.get_ids(matching), [self.p3.id])
+
+        matching = index.get_matching({}, {"min": 2, "max": 5})
+        self.assertEqual(set(index.get_ids(matching)), set([self.p1.id, self.p2.id]))
+
+    def test_get_counts(self):
+        index = get_facet_index(self.c1)
+
+        counts = index.get_counts({})
+        self.assertEqual(counts[self.color_key], {str(self.red.id): 2, str(self.blue.id): 1})
+
+        # The selected color itself doesn't restrict the counts of the colors
+        counts = index.get_counts({"select-filter": self._color_filter(self.blue)})
+        self.assertEqual(counts[self.color_key], {str(self.red.id): 2, str(self.blue.id): 1})
+
+        counts = index.get_counts({"number-filter": self._length_filter(15, 30)})
+        self.assertEqual(counts[self.color_key], {str(self.red.id): 1, str(self.blue.id): 1})
+
+        counts = index.get_counts({}, {"min": 2, "max": 5})
+        self.assertEqual(counts[self.color_key], {str(self.red.id): 1, str(self.blue.id): 1})
+
+    def test_get_product_filters(self):
+        f = lfs.catalog.utils.get_product_filters(self.c1, {}, None, None, None)
+
+        items = f["select_fields"][0]["properties"][0]["items"]
+        self.assertEqual([(i["name"], i["quantity"]) for i in items], [("Red", 2), ("Blue", 1)])
+
+        items = f["number_fields"][0]["items"][0]["items"]
+        self.assertEqual(items, {"min": "10.00", "max": "30.00"})
+
+    def test_get_filtered_product_ids_for_category(self):
+        ids = lfs.catalog.utils.get_filtered_product_ids_for_category(self.c1, {}, None, "effective_price")
+        self.assertEqual(ids, [self.p3.id, self.p2.id, self.p1.id])
+
+        ids = lfs.catalog.utils.get_filtered_product_ids_for_category(self.c1, {}, None, "-effective_price")
+        self.assertEqual(ids, [self.p1.id, self.p2.id, self.p3.id])
+
+        ids = lfs.catalog.utils.get_filtered_product_ids_for_category(
+            self.c1, {"select-filter": self._color_filter(self.red)}, {"min": 0, "max": 3}, "effective_price"
+        )
+        self.assertEqual(ids, [self.p3.id])
+
+        ids = lfs.catalog.utils.get_filtered_product_ids_for_category(self.c1, {}, None, "name")
+        self.assertEqual(ids, [self.p1.id, self.p2.id, self.p3.id])
+
+        # The sort values are loaded in chunks
+        with patch("lfs.catalog.utils.PK_CHUNK_SIZE", 2):
+            with self.assertNumQueries(2):
+                ids = lfs.catalog.utils.get_filtered_product_ids_for_category(self.c1, {}, None, "-name")
+        self.assertEqual(ids, [self.p3.id, self.p2.id, self.p1.id])
+
+    def test_calculate_steps(self):
+        self.length.step_type = PROPERTY_STEP_TYPE_FIXED_STEP
+        self.length.step = 5
+        self.length.save()
+
+        product_ids = [self.p1.id, self.p2.id, self.v1.id]
+        with self.assertNumQueries(1):
+            steps = lfs.catalog.utils._calculate_steps(product_ids, self.length, 10, 30)
+
+        # Empty steps are collapsed into the next one
+        self.assertEqual(
+            [(s["min"], s["max"], s["quantity"]) for s in steps],
+            [(1, 10, 1), (11, 20, 1), (21, 30, 1)],
+        )
+
+        # A step of 0 is treated as 1
+        self.length.step = 0
+        steps = lfs.catalog.utils._calculate_steps(product_ids, self.length, 10, 30)
+        self.assertEqual([(s["min"], s["max"]) for s in steps], [(1, 10), (11, 20), (21, 30)])
+
+    def test_update_product(self):
+        index = get_facet_index(self.c1)
+        matching = index.get_matching({"select-filter": self._color_filter(self.blue)})
+        self.assertEqual(index.get_ids(matching), [self.p2.id])
+
+        # Changing a filter value updates the cached index
+        ppv = ProductPropertyValue.objects.get(product=self.v1, property=self.color)
+        ppv.value = str(self.blue.id)
+        ppv.save()
+
+        index = get_facet_index(self.c1)
+        matching = index.get_matching({"select-filter": self._color_filter(self.blue)})
+        self.assertEqual(set(index.get_ids(matching)), set([self.p2.id, self.p3.id]))
+
+        # Inactive products are removed from the index
+        self.p2.active = False
+        self.p2.save()
+        product_changed.send(self.p2)
+
+        index = get_facet_index(self.c1)
+        matching = index.get_matching({"select-filter": self._color_filter(self.blue)})
+        self.assertEqual(index.get_ids(matching), [self.p3.id])
+
+    def test_inactive_variants(self):
+        Product.objects.filter(pk=self.v1.pk).update(active=False)
+        product_changed.send(self.v1)
+
+        index = get_facet_index(self.c1)
+        matching = index.get_matching({"select-filter": self._color_filter(self.red)})
+        self.assertEqual(index.get_ids(matching), [self.p1.id])
+
+    def test_category_products_changed(self):
+        get_facet_index(self.c1)
+        self.c1.products.remove(self.p1)
+
+        index = get_facet_index(self.c1)
+        self.assertEqual(set(index.get_ids(index.get_matching({}))), set([self.p2.id, self.p3.id]))
+
+
+class CategoryClosureTestCase(TestCase):
+    """Tests the closure table of the category tree."""
+
+    fixtures = ["lfs_shop.xml"]
+
+    def setUp(self):
+        """ """
+        self.c1 = Category.objects.create(name="Category 1", slug="category-1")
+        self.c11 = Category.objects.create(name="Category 11", slug="category-11", parent=self.c1, position=2)
+        self.c12 = Category.objects.create(name="Category 12", slug="category-12", parent=self.c1, position=1)
+        self.c111 = Category.objects.create(name="Category 111", slug="category-111", parent=self.c11)
+        self.c2 = Category.objects.create(name="Category 2", slug="category-2")
+
+    def _links(self):
+        return set(CategoryClosure.objects.values_list("ancestor__slug", "descendant__slug", "depth"))
+
+    def test_tree(self):
+        self.assertEqual(self.c1.get_all_children(), [self.c12, self.c11, self.c111])
+        self.assertEqual(self.c111.get_parents(), [self.c11, self.c1])
+        self.assertEqual(self.c2.get_all_children(), [])
+        self.assertEqual(self.c2.get_parents(), [])
+
+    def test_move(self):
+        self.c11.parent = self.c2
+        self.c11.save()
+
+        self.assertEqual(
+            self._links(),
+            set(
+                [
+                    ("category-1", "category-1", 0),
+                    ("category-1", "category-12", 1),
+                    ("category-12", "category-12", 0),
+                    ("category-2", "category-2", 0),
+                    ("category-2", "category-11", 1),
+                    ("category-2", "category-111", 2),
+                    ("category-11", "category-11", 0),
+                    ("category-11", "category-111", 1),
+                    ("category-111", "category-111", 0),
+                ]
+            ),
+        )
+
+    def test_delete(self):
+        self.c11.delete()
+
+        # The sub categories become top level categories
+        self.assertEqual(
+            self._links(),
+            set(
+                [
+                    ("category-1", "category-1", 0),
+                    ("category-1", "category-12", 1),
+                    ("category-12", "category-12", 0),
+                    ("category-111", "category-111", 0),
+                    ("category-2", "category-2", 0),
+                ]
+            ),
+        )
+
+    def test_fixtures(self):
+        # Fixtures might contain sub categories before their parents
+        data = serializers.serialize("json", [self.c111, self.c1, self.c11])
+        CategoryClosure.objects.all().delete()
+        for obj in serializers.deserialize("json", data):
+            obj.save()
+
+        self.assertEqual(
+            self._links(),
+            set(
+                [
+                    ("category-1", "category-1", 0),
+                    ("category-1", "category-11", 1),
+                    ("category-1", "category-111", 2),
+                    ("category-11", "category-11", 0),
+                    ("category-11", "category-111", 1),
+                    ("category-111", "category-111", 0),
+                ]
+            ),
+        )
+
+    def test_get_all_products(self):
+        p1 = Product.objects.create(name="Product 1", slug="product-1", active=True)
+        p2 = Product.objects.create(name="Product 2", slug="product-2", active=True)
+        self.c1.products.add(p1)
+        self.c111.products.add(p2)
+        self.c2.products.add(p1)
+
+        with self.assertNumQueries(1):
+            products = list(self.c1.get_all_products())
+        self.assertEqual(set(products), set([p1, p2]))
+
+
+class NavigationIndexTestCase(TestCase):
+    """Tests the navigation index of lfs.catalog.navigation."""
+
+    fixtures = ["lfs_shop.xml", "lfs_user.xml"]
+
+    def setUp(self):
+        """ """
+        self.manufacturer = Manufacturer.objects.create(name="Manufacturer", slug="manufacturer")
+        self.p1 = Product.objects.create(name="Product 1", slug="product-1", price=5, active=True)
+        self.p2 = Product.objects.create(
+            name="Product 2", slug="product-2", price=3, active=True, manufacturer=self.manufacturer
+        )
+        self.p3 = Product.objects.create(
+            name="Product 3", slug="product-3", price=1, active=True, manufacturer=self.manufacturer
+        )
+        self.p4 = Product.objects.create(name="Product 4", slug="product-4", price=2, active=False)
+
+        self.c1 = Category.objects.create(name="Category 1", slug="category-1")
+        self.c1.products.set([self.p1, self.p2, self.p3, self.p4])
+
+    def test_get(self):
+        index = get_category_navigation_index(self.c1, "name")
+        self.assertEqual(
+            index.get("product-2"),
+            {"display": True, "previous": "product-1", "next": "product-3", "current": 2, "total": 3},
+        )
+        self.assertEqual(index.get("product-1")["previous"], None)
+        self.assertEqual(index.get("product-3")["next"], None)
+
+        # Inactive products are listed for superusers only
+        self.assertEqual(index.get("product-4"), None)
+        index = get_category_navigation_index(self.c1, "-effective_price", active_only=False)
+        self.assertEqual([slug for (id, slug) in index.products], ["product-1", "product-2", "product-4", "product-3"])
+
+        index = get_manufacturer_navigation_index(self.manufacturer.id, "effective_price")
+        self.assertEqual(index.get("product-2")["previous"], "product-3")
+
+    def test_cached(self):
+        get_category_navigation_index(self.c1, "name")
+        with self.assertNumQueries(0):
+            get_category_navigation_index(self.c1, "name")
+
+    def test_product_changed(self):
+        get_category_navigation_index(self.c1, "name")
+
+        # The index is rebuilt after the transaction has been committed, too,
+        # as an index built in between would contain the old data.
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Product.objects.filter(pk=self.p1.pk).update(name="Product 9")
+            product_changed.send(self.p1)
+            get_category_navigation_index(self.c1, "name")
+        self.assertTrue(callbacks)
+
+        index = get_category_navigation_index(self.c1, "name")
+        self.assertEqual([slug for (id, slug) in index.products], ["product-2", "product-3", "product-1"])
+
+        Product.objects.filter(pk=self.p3.pk).update(active=False)
+        product_changed.send(self.p3)
+
+        index = get_category_navigation_index(self.c1, "name")
+        self.assertEqual([slug for (id, slug) in index.products], ["product-2", "product-1"])
+
+    def test_category_products_changed(self):
+        get_category_navigation_index(self.c1, "name")
+
+        self.c1.products.remove(self.p2)
+        index = get_category_navigation_index(self.c1, "name")
+        self.assertEqual([slug for (id, slug) in index.products], ["product-1", "product-3"])
+
+        self.p2.categories.add(self.c1)
+        index = get_category_navigation_index(self.c1, "name")
+        self.assertEqual([slug for (id, slug) in index.products], ["product-1", "product-2", "product-3"])
+
+    def test_product_navigation(self):
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        request.session["sorting"] = "-name"
+        request.user = AnonymousUser()
+
+        result = product_navigation({"request": request}, self.p2)
+        self.assertEqual(result["previous"], "product-3")
+        self.assertEqual(result["next"], "product-1")
+
+        # Visited from the manufacturer view
+        request.session["last_manufacturer"] = self.manufacturer.id
+        result = product_navigation({"request": request}, self.p2)
+        self.assertEqual(result["previous"], "product-3")
+        self.assertEqual(result["next"], None)
+        self.assertEqual(result["total"], 2)
+
+
 class CategoryTestCase(TestCase):
     """Tests the Category of the lfs.catalog."""
 
@@ -2744,6 +3131,107 @@ class ProductTestCase(TestCase):
         variant = self.p1.get_variant(options)
         self.assertFalse(variant is not None)
 
+    def test_get_variant_signatures(self):
+        """Tests the cached signatures are used to resolve variants and are
+        invalidated when a variant option is changed.
+        """
+        options = [
+            "0|%s|%s" % (self.size.id, self.m.id),
+            "0|%s|%s" % (self.color.id, self.red.id),
+        ]
+
+        signatures = self.p1.get_variant_signatures()
+        self.assertEqual(signatures["".join(sorted(options))], [self.v1.id])
+
+        # Only the variant itself is loaded
+        with self.assertNumQueries(1):
+            self.assertEqual(self.p1.get_variant(options), self.v1)
+
+        # Changing an option invalidates the signatures
+        self.ppv_color_red.value = self.green.id
+        self.ppv_color_red.save()
+
+        self.assertEqual(self.p1.get_variant(options), None)
+        options = [
+            "0|%s|%s" % (self.size.id, self.m.id),
+            "0|%s|%s" % (self.color.id, self.green.id),
+        ]
+        self.assertEqual(self.p1.get_variant(options), self.v1)
+
+        # Inactive variants are only found if requested
+        Product.objects.filter(pk=self.v1.pk).update(active=False)
+        self.assertEqual(self.p1.get_variant(options), None)
+        self.assertEqual(self.p1.get_variant(options, only_active=False), self.v1)
+
+    def test_get_all_properties(self):
+        """Tests the variant selector of select display type parents is built
+        from one matrix for all variants.
+        """
+        self.p1.variants_display_type = SELECT
+        self.p1.save()
+
+        properties = self.p1.get_all_properties(variant=self.v1)
+        self.assertEqual([prop["id"] for prop in properties], [self.color.id, self.size.id])
+        self.assertEqual(
+            properties[0]["options"],
+            [
+                {"id": self.red.id, "name": "Red", "selected": True},
+                {"id": self.green.id, "name": "Green", "selected": False},
+            ],
+        )
+
+        # The matrix is cached, other variants don't need any query
+        with self.assertNumQueries(0):
+            properties = self.p1.get_all_properties(variant=self.v2)
+        self.assertEqual(
+            properties[1]["options"],
+            [
+                {"id": self.l.id, "name": "L", "selected": True},
+                {"id": self.m.id, "name": "M", "selected": False},
+            ],
+        )
+
+        # A variant without size adds an empty size option
+        v3 = Product.objects.create(name="Variant 3", slug="variant-3", sub_type=VARIANT, parent=self.p1, active=True)
+        ProductPropertyValue.objects.create(
+            product=v3, property=self.color, value=self.red.id, type=PROPERTY_VALUE_TYPE_VARIANT
+        )
+        properties = self.p1.get_all_properties(variant=v3)
+        self.assertEqual(properties[1]["options"][0], {"id": "", "name": "", "selected": True})
+
+        # List display type
+        self.p1.variants_display_type = LIST
+        self.p1.save()
+        properties = self.p1.get_all_properties(variant=self.v1)
+        self.assertEqual(properties[0]["selected_option_name"], "Red")
+        self.assertEqual(properties[1]["selected_option_value"], str(self.m.id))
+
+    def test_get_cheapest_prices(self):
+        """Tests the minimal prices of the variants are calculated at once,
+        cached and recalculated when a variant is changed.
+        """
+        # Both variants have the price of the parent
+        self.assertEqual(self.p1.get_cheapest_price_gross(self.request), {"price": 1.0, "starting_from": False})
+        self.assertEqual(self.p1.get_cheapest_variant(self.request), self.v1)
+
+        # The prices are cached
+        with patch("lfs.catalog.utils._calculate_cheapest_prices") as calculate:
+            self.assertEqual(self.p1.get_cheapest_variant(self.request), self.v1)
+        calculate.assert_not_called()
+
+        Product.objects.filter(pk=self.v1.pk).update(active_price=True)
+        product_changed.send(self.p1)
+
+        self.assertEqual(self.p1.get_cheapest_price_gross(self.request), {"price": 1.0, "starting_from": True})
+        self.assertEqual(self.p1.get_cheapest_variant(self.request), self.v2)
+
+        # The prices equal the prices of the single variants
+        for name in ("price", "price_net", "standard_price_gross", "for_sale_price_gross"):
+            prices = [
+                getattr(variant, "get_%s" % name)(self.request, amount=sys.maxsize) for variant in (self.v1, self.v2)
+            ]
+            self.assertEqual(getattr(self.p1, "get_cheapest_%s" % name)(self.request)["price"], min(prices))
+
     def test_get_default_variant(self):
         """Tests the default default_variant (which is the first one) and
         explicitly assigned variants
@@ -141,8 +141,9 @@ class ItemListViewTrackingTestCase(TestCase):
             active=True,
             sku="SKU-SRCH",
         )
+        # The search paginates the ids of the found products
         current_page = MagicMock()
-        current_page.object_list = [product]
+        current_page.object_list = [product.id]
         paginator = MagicMock()
         paginator.page.return_value = current_page
         paginator.num_pages = 1
@@ -1,20 +1,25 @@
 import logging
+import sys
+from bisect import bisect_left
+from bisect import bisect_right
 from decimal import Decimal
 
-from django.db import connection
+from django.conf import settings
 from django.core.exceptions import FieldError
-from django.db.models import Q, Count, Min, Max
+from django.db.models import Q, Count
 from django.utils import formats
 
 import lfs.catalog.models
-from lfs.catalog.settings import CONFIGURABLE_PRODUCT
-from lfs.catalog.settings import PRODUCT_WITH_VARIANTS
-from lfs.catalog.settings import PROPERTY_VALUE_TYPE_FILTER
-from lfs.catalog.settings import STANDARD_PRODUCT
+from lfs.caching.utils import get_many_tagged
+from lfs.caching.utils import set_tagged
+from lfs.catalog.facets import get_facet_index
 from lfs.manufacturer.models import Manufacturer
 
 logger = logging.getLogger(__name__)
 
+# The maximum amount of ids which are passed to the database within one query
+PK_CHUNK_SIZE = 500
+
 
 def get_display_product(request, product):
     """
@@ -70,6 +75,161 @@ def resolve_product_for_category_list(request, product):
     return product
 
 
+def get_product_prices(request, products, with_properties=True):
+    """
+    Returns the prices of the passed products as dictionary of product id to
+    prices, see lfs.plugins.PriceCalculator.bulk_prices. The products are
+    calculated in bulk per price calculator.
+
+    Variants whose parent displays the cheapest prices of its variants
+    (CATEGORY_VARIANT_CHEAPEST_PRICES) get these instead of their own
+    standard price, price and base price, plus whether they are "starting
+    from" prices (e.g. ``price_starting_from_gross``), see
+    get_cheapest_prices.
+    """
+    from lfs.catalog.settings import CATEGORY_VARIANT_CHEAPEST_PRICES
+
+    groups = {}
+    for product in products:
+        price_calculator_class = type(product.get_price_calculator(request))
+        groups.setdefault(price_calculator_class, []).append(product)
+
+    prices = {}
+    for price_calculator_class, group in groups.items():
+        prices.update(price_calculator_class.bulk_prices(request, group, with_properties))
+
+    parents = {}
+    for product in products:
+        parent = product.parent if product.is_variant() else product
+        if parent.category_variant == CATEGORY_VARIANT_CHEAPEST_PRICES:
+            parents[product.id] = parent
+
+    unique_parents = dict((parent.id, parent) for parent in parents.values())
+    cheapest_prices = get_cheapest_prices(request, list(unique_parents.values()))
+    for product_id, parent in parents.items():
+        cheapest = cheapest_prices[parent.id]
+        for name in ("standard_price", "price", "base_price"):
+            for suffix in ("", "_net", "_gross"):
+                prices[product_id][name + suffix] = cheapest[name + suffix]["price"]
+                prices[product_id][name + "_starting_from" + suffix] = cheapest[name + suffix]["starting_from"]
+
+    return prices
+
+
+def get_price_calculators(request, products):
+    """
+    Returns the price calculators of the passed products as dictionary of
+    product id to calculator. The data the prices depend on is loaded in bulk
+    per price calculator, see lfs.plugins.PriceCalculator.bulk_calculators.
+    """
+    groups = {}
+    for product in products:
+        price_calculator_class = type(product.get_price_calculator(request))
+        groups.setdefault(price_calculator_class, []).append(product)
+
+    calculators = {}
+    for price_calculator_class, group in groups.items():
+        calculators.update(price_calculator_class.bulk_calculators(request, group))
+    return calculators
+
+
+CHEAPEST_PRICES = ("for_sale_price", "standard_price", "price", "base_price")
+
+
+def get_cheapest_prices(request, products):
+    """
+    Returns the minimal prices of the active variants of the passed products
+    with variants as dictionary of product id to a dictionary with:
+
+    variant_id
+        The id of the variant with the cheapest gross price (variants without
+        a price are ignored) or None.
+
+    base_price_variant_id
+        The id of the variant with the cheapest base gross price or None.
+
+    for_sale_price, standard_price, price and base_price plus their ``_net``
+    and ``_gross`` variants
+        A dictionary with the minimal ``price`` and ``starting_from``, which
+        is True if the variants have different prices.
+
+    The prices are calculated for all products at once and cached per
+    product and customer tax context (see
+    lfs.customer_tax.utils.get_customer_tax_context) until the product, one
+    of its variants, the shop or a tax is changed.
+    """
+    from lfs.customer_tax.utils import get_customer_tax_context
+
+    if not products:
+        return {}
+
+    tax_context = get_customer_tax_context(request)
+    cache_keys = dict(
+        (product.id, "%s-cheapest-prices-%s-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, product.id, tax_context))
+        for product in products
+    )
+    cached = get_many_tagged(list(cache_keys.values()))
+
+    prices = {}
+    missing = {}
+    for product in products:
+        if cache_keys[product.id] in cached:
+            prices[product.id] = cached[cache_keys[product.id]]
+        else:
+            missing[product.id] = product
+    if not missing:
+        return prices
+
+    variants = {}
+    for variant in lfs.catalog.models.Product.objects.filter(parent_id__in=missing.keys(), active=True):
+        variant.parent = missing[variant.parent_id]
+        variants.setdefault(variant.parent_id, []).append(variant)
+
+    calculators = get_price_calculators(request, [variant for group in variants.values() for variant in group])
+
+    for product_id, product in missing.items():
+        prices[product_id] = _calculate_cheapest_prices(variants.get(product_id, []), calculators)
+        set_tagged(cache_keys[product_id], prices[product_id], ["shop", "prices", "product:%s" % product_id])
+
+    return prices
+
+
+def _calculate_cheapest_prices(variants, calculators):
+    values = {}
+    for name in CHEAPEST_PRICES:
+        for suffix in ("", "_net", "_gross"):
+            values[name + suffix] = []
+
+    cheapest = {"variant_id": None, "base_price_variant_id": None}
+    min_price = min_base_price = None
+    for variant in variants:
+        pc = calculators[variant.id]
+
+        price = pc.get_price_gross(True)
+        if price != 0 and (min_price is None or price < min_price):
+            cheapest["variant_id"] = variant.id
+            min_price = price
+
+        price = pc.get_base_price_gross(True, sys.maxsize)
+        if price != 0 and (min_base_price is None or price < min_base_price):
+            cheapest["base_price_variant_id"] = variant.id
+            min_base_price = price
+
+        for name in values:
+            price = getattr(pc, "get_%s" % name)(True, sys.maxsize)
+            if name.startswith("base_price"):
+                price = float("%.2f" % price)
+            if price not in values[name]:
+                values[name].append(price)
+
+    for name, prices in values.items():
+        cheapest[name] = {
+            "price": min(prices) if prices else 0,
+            "starting_from": len(prices) > 1,
+        }
+    return cheapest
+
+
 def resolve_product_for_search_list(request, product):
     """
     Return the product as tracked for search results (default variant when applicable).
@@ -146,15 +306,12 @@ def get_price_filters(category, product_filter, price_filter, manufacturer_filte
         }
 
     # Base are the filtered products
-    products = get_filtered_products_for_category(category, product_filter, price_filter, None, manufacturer_filter)
+    index = get_facet_index(category)
+    products = index.get_matching(product_filter, price_filter, manufacturer_filter)
     if not products:
         return []
 
-    all_products = lfs.catalog.models.Product.objects.filter(pk__in=products, active=True)
-
-    res = all_products.aggregate(min_price=Min("effective_price"), max_price=Max("effective_price"))
-
-    pmin, pmax = res["min_price"], res["max_price"]
+    pmin, pmax = index.get_price_range(products)
 
     disabled = (pmin and pmax) is None
 
@@ -209,75 +366,65 @@ def get_manufacturer_filters(category, product_filter, price_filter, manufacture
 def get_product_filters(category, product_filter, price_filter, manufacturer_filter, sorting):
     """Returns the next product filters based on products which are in the given
     category and within the result set of the current filters.
+
+    All values and quantities are taken from the facet index of the category,
+    see lfs.catalog.facets for more.
     """
     mapping_manager = MappingCache()
 
     properties_mapping = get_property_mapping()
     options_mapping = get_option_mapping()
-    property_ids = _get_property_ids()
-    product_ids = _get_product_ids(category)
+    index = get_facet_index(category)
     set_filters = dict(product_filter)
 
     # Number Fields
     number_fields_dict = {}
-    if property_ids and product_ids:
-        cursor = connection.cursor()
-        cursor.execute(
-            """SELECT property_group_id, property_id, min(value_as_float), max(value_as_float)
-                            FROM catalog_productpropertyvalue
-                           WHERE type=%s
-                             AND product_id IN (%s)
-                             AND property_id IN (%s)
-                        GROUP BY property_group_id, property_id"""
-            % (PROPERTY_VALUE_TYPE_FILTER, product_ids, property_ids)
-        )
-        for row in cursor.fetchall():
-            property_group_id = row[0]
-            property_id = row[1]
-
-            prop = properties_mapping[property_id]
+    for key, numbers in index.numbers.items():
+        property_group_id, property_id = _split_key(key)
+        if property_group_id is None:
+            continue
 
-            if prop.is_select_field or prop.is_text_field or not prop.filterable:
-                continue
+        prop = properties_mapping.get(property_id)
+        if prop is None or prop.is_select_field or prop.is_text_field or not prop.filterable:
+            continue
 
-            # cache property groups for later use
-            property_group = mapping_manager.get(lfs.catalog.models.PropertyGroup, property_group_id)
+        # cache property groups for later use
+        property_group = mapping_manager.get(lfs.catalog.models.PropertyGroup, property_group_id)
 
-            key = "{0}_{1}".format(property_group_id, property_id)
-            if key in product_filter.get("number-filter", {}):
-                pmin, pmax = product_filter.get("number-filter").get(key)["value"][0:2]
-                show_reset = True
-            else:
-                pmin, pmax = row[2:4]
-                show_reset = False
+        if key in product_filter.get("number-filter", {}):
+            pmin, pmax = product_filter.get("number-filter").get(key)["value"][0:2]
+            show_reset = True
+        else:
+            pmin, pmax = (numbers[0][0], numbers[-1][0]) if numbers else (None, None)
+            show_reset = False
 
-            try:
-                pmin = formats.number_format(pmin, decimal_pos=2)
-            except TypeError:
-                pmin = 0.0
-            try:
-                pmax = formats.number_format(pmax, decimal_pos=2)
-            except TypeError:
-                pmax = 0.0
+        try:
+            pmin = formats.number_format(pmin, decimal_pos=2)
+        except TypeError:
+            pmin = 0.0
+        try:
+            pmax = formats.number_format(pmax, decimal_pos=2)
+        except TypeError:
+            pmax = 0.0
 
-            property_group_dict = number_fields_dict.setdefault(
-                property_group_id, {"property_group": property_group, "items": []}
-            )
+        property_group_dict = number_fields_dict.setdefault(
+            property_group_id, {"property_group": property_group, "items": []}
+        )
 
-            property_group_dict["items"].append(
-                {
-                    "id": property_id,
-                    "property_group_id": property_group_id,
-                    "position": prop.position,
-                    "object": prop,
-                    "name": prop.name,
-                    "title": prop.title,
-                    "unit": prop.unit,
-                    "show_reset": show_reset,
-                    "show_quantity": True,
-                    "items": {"min": pmin, "max": pmax},
-                }
-            )
+        property_group_dict["items"].append(
+            {
+                "id": property_id,
+                "property_group_id": property_group_id,
+                "position": prop.position,
+                "object": prop,
+                "name": prop.name,
+                "title": prop.title,
+                "unit": prop.unit,
+                "show_reset": show_reset,
+                "show_quantity": True,
+                "items": {"min": pmin, "max": pmax},
+            }
+        )
 
     # convert to list ordered by property group name
     number_fields = number_fields_dict.values()
@@ -285,41 +432,38 @@ def get_product_filters(category, product_filter, price_filter, manufacturer_fil
     for pg in number_fields:
         pg["items"] = sorted(pg["items"], key=lambda a: a["name"])
 
+    # Calculates the amount of existing products per property option with one
+    # lookup, which is used within the filter portlet
+    counts = index.get_counts(product_filter, price_filter)
+
     # Select Fields & Text Fields
     select_fields_dict = {}
-    if property_ids and product_ids:
-        cursor = connection.cursor()
-        cursor.execute(
-            """SELECT property_group_id, property_id, value
-                          FROM catalog_productpropertyvalue
-                          WHERE type=%s
-                          AND product_id IN (%s)
-                          AND property_id IN (%s)
-                          GROUP BY property_group_id, property_id, value"""
-            % (PROPERTY_VALUE_TYPE_FILTER, product_ids, property_ids)
-        )
-
-        for row in cursor.fetchall():
-            property_group_id = row[0]
-            property_id = row[1]
-            value = row[2]
-
-            prop = properties_mapping[property_id]
+    for key, values in index.values.items():
+        property_group_id, property_id = _split_key(key)
+        if property_group_id is None:
+            continue
 
-            if prop.is_number_field or not prop.filterable:
-                continue
+        prop = properties_mapping.get(property_id)
+        if prop is None or prop.is_number_field or not prop.filterable:
+            continue
 
-            # use property group cache
-            property_group = mapping_manager.get(lfs.catalog.models.PropertyGroup, property_group_id)
-            property_group_dict = select_fields_dict.setdefault(
-                property_group_id, {"property_group": property_group, "properties": {}}
-            )
+        # use property group cache
+        property_group = mapping_manager.get(lfs.catalog.models.PropertyGroup, property_group_id)
+        property_group_dict = select_fields_dict.setdefault(
+            property_group_id, {"property_group": property_group, "properties": {}}
+        )
 
-            properties = property_group_dict["properties"]
+        properties = property_group_dict["properties"]
+        checked_values = product_filter.get("select-filter", {}).get(key, {}).get("value", "").split("|")
 
+        for value in sorted(values.keys()):
             if prop.is_select_field:
-                name = options_mapping[value].name
-                position = options_mapping[value].position
+                try:
+                    option = options_mapping[value]
+                except KeyError:
+                    continue
+                name = option.name
+                position = option.position
             else:
                 name = value
                 position = 10
@@ -337,49 +481,23 @@ def get_product_filters(category, product_filter, price_filter, manufacturer_fil
             else:
                 name_is_number = True
 
-            properties[property_id].append(
-                {
-                    "id": property_id,
-                    "property_group_id": property_group_id,
-                    "value": value,
-                    "name": name,
-                    "name_is_number": name_is_number,
-                    "title": prop.title,
-                    "position": position,
-                    "show_quantity": True,
-                }
-            )
-
-    # Creates the filters to count the existing products per property option,
-    # which is used within the filter portlet
-    new_product_filter = {}
-    if product_filter.get("number-filter"):
-        new_product_filter["number-filter"] = product_filter["number-filter"]
-
-    for property_group_id, property_group_dict in select_fields_dict.items():
-        properties = property_group_dict["properties"]
-
-        for property_id, options in properties.items():
-            key = "{0}_{1}".format(property_group_id, property_id)
-            for option in options:
-                # The option in question is used at any rate
-                new_product_filter["select-filter"] = {
-                    key: {"property_id": property_id, "property_group_id": property_group_id, "value": option["value"]}
-                }
-
-                # All checked options of all other properties is also used
-                for f0, f1 in product_filter.get("select-filter", {}).items():
-                    print(f0, f1, key)
-                    if f0 != key:
-                        new_product_filter["select-filter"][f0] = f1
+            option_dict = {
+                "id": property_id,
+                "property_group_id": property_group_id,
+                "value": value,
+                "name": name,
+                "name_is_number": name_is_number,
+                "title": prop.title,
+                "position": position,
+                "show_quantity": True,
+                "quantity": counts[key][value],
+            }
 
-                    # Tests if the option is checked
-                    if (f0 == key) and (option["value"] in f1["value"].split("|")):
-                        option["checked"] = True
+            # Tests if the option is checked
+            if value in checked_values:
+                option_dict["checked"] = True
 
-                option["quantity"] = len(
-                    get_filtered_products_for_category(category, new_product_filter, price_filter, None)
-                )
+            properties[property_id].append(option_dict)
 
     # Transform the property groups and properties inside into lists to be able to iterate over these in template
     property_groups_list = select_fields_dict.values()
@@ -423,22 +541,73 @@ def get_product_filters(category, product_filter, price_filter, manufacturer_fil
     }
 
 
-def _get_property_ids():
-    property_ids = lfs.catalog.models.ProductPropertyValue.objects.distinct().values_list("property_id", flat=True)
-    return ", ".join(map(str, property_ids))
+def _split_key(key):
+    """Returns property group id and property id of given facet key."""
+    property_group_id, property_id = key.split("_")
+    if property_group_id == "None":
+        property_group_id = None
+    else:
+        property_group_id = int(property_group_id)
+    return property_group_id, int(property_id)
 
 
-def _get_product_ids(category):
-    products = category.get_all_products() if category.show_all_products else category.get_products()
-    if not products:
-        return ""
+def get_filtered_product_ids_for_category(category, filters, price_filter, sorting, manufacturers_filter=None):
+    """Returns the ids of the products for given category and current filters
+    sorted by current sorting.
+
+    The filters are resolved by the facet index of the category (see
+    lfs.catalog.facets), variants which match the filters are rolled up to
+    their parents.
+    """
+    index = get_facet_index(category)
+    matching = index.get_matching(filters, price_filter, manufacturers_filter)
+
+    # The index knows the effective prices, hence the default sorting doesn't
+    # need the database at all.
+    if sorting in ("effective_price", "-effective_price"):
+        return index.get_ids_by_price(matching, reverse=sorting.startswith("-"))
+
+    product_ids = index.get_ids(matching)
+    if sorting:
+        product_ids = sort_product_ids(product_ids, sorting)
+
+    return product_ids
 
-    all_products = lfs.catalog.models.Product.objects.filter(
-        Q(pk__in=products) | (Q(parent__in=products) & Q(active=True))
-    )
-    product_ids = all_products.values_list("id", flat=True)
 
-    return ", ".join(map(str, product_ids))
+def sort_product_ids(product_ids, sorting):
+    """Returns passed product ids sorted by passed sorting, e.g. "-name".
+
+    The sort values are loaded in chunks of PK_CHUNK_SIZE ids, hence the
+    queries stay bounded for any amount of products. The ids are returned
+    unsorted for an invalid sorting.
+    """
+    from lfs.catalog.models import Product
+
+    field = sorting.lstrip("-")
+    values = {}
+    try:
+        for i in range(0, len(product_ids), PK_CHUNK_SIZE):
+            chunk = product_ids[i : i + PK_CHUNK_SIZE]
+            values.update(Product.objects.filter(pk__in=chunk).values_list("id", field))
+    except FieldError:
+        # ignore invalid sort order which may be stored in the session
+        return list(product_ids)
+
+    product_ids = sorted(product_ids, key=lambda product_id: _get_sort_key(values.get(product_id)))
+    if sorting.startswith("-"):
+        product_ids.reverse()
+    return product_ids
+
+
+def _get_sort_key(value):
+    """Returns the key to sort values as the database does, whereas None is
+    sorted first.
+    """
+    if value is None:
+        return (0, 0)
+    if isinstance(value, str):
+        return (1, value.lower())
+    return (1, value)
 
 
 # TODO: Implement this as a method of Category
@@ -446,119 +615,20 @@ def get_filtered_products_for_category(category, filters, price_filter, sorting,
     """Returns products for given categories and current filters sorted by
     current sorting.
     """
-    from lfs.catalog.models import Product, ProductPropertyValue
+    from lfs.catalog.models import Product
 
-    if filters:
+    index = get_facet_index(category)
+    matching = index.get_matching(filters, price_filter, manufacturers_filter)
+    if matching == index.products:
+        # Nothing is filtered out, hence the category is queried directly
+        # instead of passing all ids to the database.
         if category.show_all_products:
             products = category.get_all_products()
         else:
             products = category.get_products()
-
-        # All variants of category products
-        all_variants = Product.objects.filter(parent__in=products)
-
-        # Generate filter
-        filters_query = Q()
-        for filter_dict in filters.get("select-filter", {}).values():
-            property_group_id = filter_dict["property_group_id"]
-            property_id = filter_dict["property_id"]
-            value = filter_dict["value"]
-
-            q_options = Q()
-            for option in value.split("|"):
-                q_options |= Q(value=option)
-            q = Q(property_group_id=property_group_id, property_id=property_id) & q_options
-            filters_query |= q
-
-        for key, values_dict in filters.get("number-filter", {}).items():
-            values = values_dict["value"]
-            property_id = values_dict["property_id"]
-            property_group_id = values_dict["property_group_id"]
-            q = Q(
-                property_group_id=property_group_id,
-                property_id=property_id,
-                value_as_float__range=(values[0], values[1]),
-            )
-            filters_query |= q
-
-        # The idea behind SQL query generated below is: If for every filter (property=value) for a product id exists
-        # a "product property value" the product matches.
-        #
-        # Example ValuesListQuerySet built by statements below is:
-        #
-        # ProductPropertyValue.objects.filter(Q(property_id=1, value='1') | Q(property_id=2, value='1'),
-        #                                     product__in=products,
-        #                                     type=PROPERTY_VALUE_TYPE_FILTER) \
-        #                             .values('product_id') \
-        #                             .annotate(cnt=Count('id')).filter(cnt=2).values_list('product_id', flat=True)
-        #
-        # it evaluates to:
-        #
-        # SELECT "catalog_productpropertyvalue"."product_id"
-        #   FROM "catalog_productpropertyvalue"
-        #  WHERE ((
-        #          ("catalog_productpropertyvalue"."value" = 1  AND "catalog_productpropertyvalue"."property_id" = 1 )
-        #          OR
-        #          ("catalog_productpropertyvalue"."value" = 1  AND "catalog_productpropertyvalue"."property_id" = 2 )
-        #        )
-        #    AND "catalog_productpropertyvalue"."type" = 0
-        #    AND "catalog_productpropertyvalue"."product_id" IN (SELECT U0."id"
-        #                                                          FROM "catalog_product" U0
-        #                                                         WHERE U0."name" LIKE %da% ESCAPE '\' ))
-        #  GROUP BY "catalog_productpropertyvalue"."product_id"
-        # HAVING COUNT("catalog_productpropertyvalue"."id") = 2
-
-        length = len(filters.get("select-filter", {}).items()) + len(filters.get("number-filter", {}).items())
-
-        # PRODUCTS - get all products with matching filters.
-        matching_product_ids = ProductPropertyValue.objects.filter(
-            product__in=products, type=PROPERTY_VALUE_TYPE_FILTER
-        )
-        if filters_query is not None:
-            matching_product_ids = matching_product_ids.filter(filters_query)
-        matching_product_ids = (
-            matching_product_ids.values("product_id")
-            .annotate(cnt=Count("id"))
-            .filter(cnt=length)
-            .values_list("product_id", flat=True)
-        )
-
-        # VARIANTS - get matching variants and then their parents as we're interested in products with variants,
-        # not variants itself
-        matching_variant_ids = ProductPropertyValue.objects.filter(
-            product__in=all_variants, type=PROPERTY_VALUE_TYPE_FILTER
-        )
-        if filters_query is not None:
-            matching_variant_ids = matching_variant_ids.filter(filters_query)
-        matching_variant_ids = (
-            matching_variant_ids.values("product_id")
-            .annotate(cnt=Count("id"))
-            .filter(cnt=length)
-            .values_list("product_id", flat=True)
-        )
-        variant_products = Product.objects.filter(pk__in=matching_variant_ids)
-
-        # Merge results
-        products = Product.objects.filter(
-            Q(pk__in=matching_product_ids) | Q(pk__in=variant_products.values_list("parent_id", flat=True))
-        ).distinct()
+        products = Product.objects.filter(pk__in=products.values("id"))
     else:
-        categories = [category]
-        if category.show_all_products:
-            categories.extend(category.get_all_children())
-        products = lfs.catalog.models.Product.objects.filter(
-            active=True,
-            categories__in=categories,
-            sub_type__in=[STANDARD_PRODUCT, PRODUCT_WITH_VARIANTS, CONFIGURABLE_PRODUCT],
-        ).distinct()
-
-    # TODO: It might be more effective to move price filters directly into if/else clause above
-    if price_filter:
-        # Filter the products
-        products = products.filter(effective_price__range=[price_filter["min"], price_filter["max"]], active=True)
-
-    if manufacturers_filter:
-        products = products.filter(manufacturer__in=manufacturers_filter)
+        products = Product.objects.filter(pk__in=index.get_ids(matching))
 
     if sorting:
         try:
@@ -590,6 +660,10 @@ def get_property_mapping():
 def _calculate_steps(product_ids, property, min, max):
     """Calculates filter steps.
 
+    All quantities are calculated from the sorted values of the property,
+    which are loaded with one query (see _get_step_values and
+    _calculate_histogram).
+
     **Parameters**
 
     product_ids
@@ -618,7 +692,7 @@ def _calculate_steps(product_ids, property, min, max):
                 min += 1.0
             max = filter_steps[i + 1].start
 
-            result.append({"min": min, "max": max, "quantity": _calculate_quantity(product_ids, property.id, min, max)})
+            result.append({"min": min, "max": max})
     else:
         if property.is_automatic_step_type:
             if max == min:
@@ -648,69 +722,79 @@ def _calculate_steps(product_ids, property, min, max):
         else:
             step = property.step
 
+        # A step below 1 would never reach max
+        step = int(step or 0)
+        if step < 1:
+            step = 1
+
         for n, i in enumerate(range(0, int(max), step)):
             if i > max:
                 break
             min = i + 1
             max = i + step
 
-            result.append(
-                {
-                    "min": min,
-                    "max": max,
-                    "quantity": _calculate_quantity(product_ids, property.id, min, max),
-                }
-            )
+            result.append({"min": min, "max": max})
 
-    if property.display_no_results:
-        return result
-    else:
-        # Remove entries with zero products
-        new_result = []
-        for n, f in enumerate(result):
-            if f["quantity"] == 0:
-                try:
-                    result[n + 1]["min"] = f["min"]
-                except IndexError:
-                    pass
-                continue
-            new_result.append(f)
-
-        return new_result
-
-
-def _calculate_quantity(product_ids, property_id, min, max):
-    """Calculate the amount of products for given parameters."""
-    # Count entries for current filter
-    cursor = connection.cursor()
-    cursor.execute(
-        """SELECT property_id, value, parent_id
-                      FROM catalog_productpropertyvalue
-                      WHERE product_id IN (%s)
-                      AND property_id = %s
-                      AND value_as_float BETWEEN %s AND %s"""
-        % (product_ids, property_id, min, max)
-    )
+    values = _get_step_values(product_ids, property.id)
+    quantities = _calculate_histogram(values, [(f["min"], f["max"]) for f in result])
+    for f, quantity in zip(result, quantities):
+        f["quantity"] = quantity
 
-    already_count = {}
-    amount = 0
-    for row in cursor.fetchall():
-        # We count a property/value pair just one time per *product*. For
-        # "products with variants" this could be stored several times within the
-        # catalog_productpropertyvalue. Imagine a variant with two properties
-        # color and size:
-        #   v1 = color:red / size: s
-        #   v2 = color:red / size: l
-        # But we want to count color:red just one time. As the product with
-        # variants is displayed at not the variants.
-
-        if "%s%s%s" % (row[2], row[0], row[1]) in already_count:
-            continue
-        already_count["%s%s%s" % (row[2], row[0], row[1])] = 1
+    return _collapse_steps(result)
 
-        amount += 1
 
-    return amount
+def _get_step_values(product_ids, property_id):
+    """Returns the sorted float values of given property for given products.
+
+    A property/value pair is counted just one time per *product*. For
+    "products with variants" this could be stored several times within the
+    catalog_productpropertyvalue. Imagine a variant with two properties
+    color and size:
+      v1 = color:red / size: s
+      v2 = color:red / size: l
+    But we want to count color:red just one time. As the product with
+    variants is displayed at not the variants.
+    """
+    rows = lfs.catalog.models.ProductPropertyValue.objects.filter(
+        product_id__in=product_ids, property_id=property_id, value_as_float__isnull=False
+    ).values_list("parent_id", "value", "value_as_float")
+
+    values = {}
+    for parent_id, value, value_as_float in rows:
+        values[(parent_id, value)] = value_as_float
+
+    return sorted(values.values())
+
+
+def _calculate_histogram(values, steps):
+    """Returns the amount of values within every step.
+
+    **Parameters**
+
+    values
+        Sorted list of floats, see _get_step_values.
+
+    steps
+        List of (min, max) tuples. Both limits are inclusive.
+    """
+    return [bisect_right(values, float(max)) - bisect_left(values, float(min)) for (min, max) in steps]
+
+
+def _collapse_steps(steps):
+    """Removes steps without products. The min of a removed step is passed to
+    the next step, so that the remaining steps still cover the whole range.
+    """
+    result = []
+    for n, f in enumerate(steps):
+        if f["quantity"] == 0:
+            try:
+                steps[n + 1]["min"] = f["min"]
+            except IndexError:
+                pass
+            continue
+        result.append(f)
+
+    return result
 
 
 class MappingCache(object):
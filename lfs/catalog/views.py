@@ -2,7 +2,6 @@ import math
 import json
 
 from django.conf import settings
-from django.core.cache import cache
 from django.core.paginator import Paginator, EmptyPage, InvalidPage
 from django.urls import reverse
 from django.http import Http404
@@ -18,7 +17,7 @@ import lfs.core.utils
 import lfs.utils.misc
 
 from lfs.cart.views import add_to_cart
-from lfs.caching.utils import lfs_get_object_or_404, get_cache_group_id
+from lfs.caching.utils import lfs_get_object_or_404, get_cache_group_id, get_tagged, set_tagged, prefetch_cache
 from lfs.catalog.models import Category
 from lfs.catalog.models import File
 from lfs.catalog.models import Product
@@ -433,7 +432,7 @@ def category_categories(request, slug, start=0, template_name="lfs/catalog/categ
     """
     cache_key = "%s-category-categories-2-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, slug)
 
-    result = cache.get(cache_key)
+    result = get_tagged(cache_key)
     if result is not None:
         return result
 
@@ -468,7 +467,7 @@ def category_categories(request, slug, start=0, template_name="lfs/catalog/categ
 
     result = {"pagination_data": {"current_page": 1, "total_pages": 1, "getparam": "start"}, "html": result_html}
 
-    cache.set(cache_key, result)
+    set_tagged(cache_key, result, ["shop", "category:%s" % category.id])
     return result
 
 
@@ -516,7 +515,7 @@ def category_products(request, slug, start=1, template_name="lfs/catalog/categor
     if manufacturer_filter:
         sub_cache_key += "-%s" % ",".join(map(str, manufacturer_filter))
 
-    temp = cache.get(cache_key)
+    temp = get_tagged(cache_key)
     if temp is not None:
         try:
             return temp[sub_cache_key]
@@ -538,24 +537,29 @@ def category_products(request, slug, start=1, template_name="lfs/catalog/categor
     amount_of_cols = format_info["product_cols"]
     amount = amount_of_rows * amount_of_cols
 
-    all_products = lfs.catalog.utils.get_filtered_products_for_category(
+    product_ids = lfs.catalog.utils.get_filtered_product_ids_for_category(
         category, product_filter, price_filter, sorting, manufacturer_filter
     )
-    all_products = all_products.select_related("parent")
 
     # prepare paginator
-    paginator = Paginator(all_products, amount)
+    paginator = Paginator(product_ids, amount)
 
     try:
         current_page = paginator.page(start)
     except (EmptyPage, InvalidPage):
         current_page = paginator.page(paginator.num_pages)
 
+    # Load just the products of the current page
+    page_products = Product.objects.select_related("parent").in_bulk(current_page.object_list)
+
     # Calculate products
     row = []
     products = []
     tracking_products = []
-    for i, product in enumerate(current_page.object_list):
+    for i, product_id in enumerate(current_page.object_list):
+        product = page_products.get(product_id)
+        if product is None:
+            continue
         display_product = lfs.catalog.utils.resolve_product_for_category_list(request, product)
         tracking_products.append(display_product)
         product = display_product
@@ -581,7 +585,11 @@ def category_products(request, slug, start=1, template_name="lfs/catalog/categor
     if len(row) > 0:
         products.append(row)
 
-    amount_of_products = all_products.count()
+    # Calculate the prices of all displayed products at once, see
+    # category_product_prices_gross/_net.
+    product_prices = lfs.catalog.utils.get_product_prices(request, tracking_products)
+
+    amount_of_products = paginator.count
 
     # Calculate urls
     pagination_data = lfs_pagination(request, current_page, url=category.get_absolute_url())
@@ -597,6 +605,7 @@ def category_products(request, slug, start=1, template_name="lfs/catalog/categor
     template_data = {
         "category": category,
         "products": products,
+        "product_prices": product_prices,
         "amount_of_products": amount_of_products,
         "pagination": pagination_data,
     }
@@ -615,7 +624,7 @@ def category_products(request, slug, start=1, template_name="lfs/catalog/categor
     }
 
     temp[sub_cache_key] = result
-    cache.set(cache_key, temp)
+    set_tagged(cache_key, temp, ["shop", "category:%s" % category.id])
 
     return result
 
@@ -627,6 +636,21 @@ def product_view(request, slug, template_name="lfs/catalog/product_base.html"):
     if (request.user.is_superuser or product.is_active()) is False:
         raise Http404()
 
+    # Fetches the cached data which is used by the product page with one round
+    # trip (only if the RequestCacheMiddleware is active).
+    pid = product.get_parent().pk
+    prefetch_cache(
+        [
+            "%s-product-categories-%s-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, pid, False),
+            "%s-product-categories-%s-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, pid, True),
+            "%s-product-images-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, product.id),
+            "%s-related-products-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, product.id),
+            "%s-default-variant-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, pid),
+            "%s-global-properties-version-GROUP" % settings.CACHE_MIDDLEWARE_KEY_PREFIX,
+            "%s-properties-%s-GROUP" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, pid),
+        ]
+    )
+
     # Store recent products for later use
     recent = request.session.get("RECENT_PRODUCTS", [])
     if slug in recent:
@@ -673,7 +697,7 @@ def product_inline(request, product, template_name="lfs/catalog/products/product
         request.user.is_superuser,
         product.id,
     )
-    result = cache.get(cache_key)
+    result = get_tagged(cache_key)
     if result is not None:
         return result
 
@@ -773,7 +797,7 @@ def product_inline(request, product, template_name="lfs/catalog/products/product
         },
     )
 
-    cache.set(cache_key, result)
+    set_tagged(cache_key, result, ["shop", "product:%s" % pid])
     return result
 
 
@@ -11,7 +11,6 @@ from django.template.loader import render_to_string
 from django.utils.translation import gettext_lazy as _
 
 import lfs.core.utils
-import lfs.discounts.utils
 import lfs.order.utils
 import lfs.payment.settings
 import lfs.payment.utils
@@ -150,71 +149,32 @@ def cart_inline(request, template_name="lfs/checkout/checkout_cart_inline.html")
     """
     cart = cart_utils.get_cart(request)
 
-    # Shipping
-    selected_shipping_method = lfs.shipping.utils.get_selected_shipping_method(request)
-    shipping_costs = lfs.shipping.utils.get_shipping_costs(request, selected_shipping_method)
-
-    # Payment
-    selected_payment_method = lfs.payment.utils.get_selected_payment_method(request)
-    payment_costs = lfs.payment.utils.get_payment_costs(request, selected_payment_method)
-
-    # Cart costs
-    cart_price = 0
-    cart_tax = 0
-    if cart is not None:
-        cart_price = cart.get_price_gross(request) + shipping_costs["price_gross"] + payment_costs["price_gross"]
-        cart_tax = cart.get_tax(request) + shipping_costs["tax"] + payment_costs["tax"]
-
-    # get voucher data (if voucher exists)
-    voucher_data = lfs.voucher.utils.get_voucher_data(request, cart)
-
-    # get discounts data
-    discounts_data = lfs.discounts.utils.get_discounts_data(request)
-
-    # calculate total value of discounts and voucher that sum up
-    summed_up_value = discounts_data["summed_up_value"]
-    if voucher_data["sums_up"]:
-        summed_up_value += voucher_data["voucher_value"]
-
-    # initialize discounts with summed up discounts
-    use_voucher = voucher_data["voucher"] is not None
-    discounts = discounts_data["summed_up_discounts"]
-    if voucher_data["voucher_value"] > summed_up_value or discounts_data["max_value"] > summed_up_value:
-        # use not summed up value
-        if voucher_data["voucher_value"] > discounts_data["max_value"]:
-            # use voucher only
-            discounts = []
-        else:
-            # use discount only
-            discounts = discounts_data["max_discounts"]
-            use_voucher = False
-
-    for discount in discounts:
-        cart_price -= discount["price_gross"]
-        cart_tax -= discount["tax"]
-
-    if use_voucher:
-        cart_price -= voucher_data["voucher_value"]
-        cart_tax -= voucher_data["voucher_tax"]
-
-    if cart_price < 0:
-        cart_price = 0
-    if cart_tax < 0:
-        cart_tax = 0
+    # Prices all cart items in one pass and adds shipping and payment costs,
+    # discounts and voucher.
+    (
+        cart_price,
+        cart_tax,
+        selected_shipping_method,
+        shipping_costs,
+        selected_payment_method,
+        payment_costs,
+        voucher_data,
+        discounts_data,
+        use_voucher,
+        discounts,
+    ) = cart_utils.get_order_data(request, cart)
 
     cart_items = []
     if cart:
-        for cart_item in cart.get_items():
-            product = cart_item.product
-            quantity = product.get_clean_quantity(cart_item.amount)
+        for item in cart_utils.get_cart_totals(request, cart).items:
             cart_items.append(
                 {
-                    "obj": cart_item,
-                    "quantity": quantity,
-                    "product": product,
-                    "product_price_net": cart_item.get_price_net(request),
-                    "product_price_gross": cart_item.get_price_gross(request),
-                    "product_tax": cart_item.get_tax(request),
+                    "obj": item["obj"],
+                    "quantity": item["quantity"],
+                    "product": item["product"],
+                    "product_price_net": item["price_net"],
+                    "product_price_gross": item["price_gross"],
+                    "product_tax": item["tax"],
                 }
             )
 
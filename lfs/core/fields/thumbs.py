@@ -2,7 +2,9 @@
 # Based on django-thumbs by Antonio Melé
 
 # python imports
+import hashlib
 import io
+import time
 
 try:
     import Image
@@ -10,6 +12,8 @@ except ImportError:
     from PIL import Image
 
 # django imports
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.db.models import ImageField
 from django.db.models.fields.files import ImageFieldFile
@@ -31,23 +35,97 @@ def generate_thumb(img, thumb_size, format):
     format      format of the original image ('jpeg','gif','png',...)
                 (this format will be used for the generated thumbnail, too)
     """
+    return generate_thumbs(img, [thumb_size], format)[tuple(thumb_size)]
+
+
+def generate_thumbs(img, thumb_sizes, format):
+    """
+    Generates thumbnail images of several sizes and returns a dictionary of
+    size to a ContentFile object with the thumbnail. The original image is
+    opened and decoded just once for all sizes.
+
+    Parameters:
+    ===========
+    img         File object
+
+    thumb_sizes desired thumbnail sizes, ie: ((200,120), (60,60))
+
+    format      format of the original image ('jpeg','gif','png',...)
+                (this format will be used for the generated thumbnails, too)
+    """
     img.seek(0)
     image = Image.open(img)
 
+    # JPEGs can be decoded in a reduced size right away, as long as they are
+    # still bigger than the biggest thumbnail.
+    max_width = max([width for (width, height) in thumb_sizes])
+    max_height = max([height for (width, height) in thumb_sizes])
+    image.draft(None, (max_width, max_height))
+
     # Convert to RGB if necessary
     if image.mode not in ("L", "RGB", "RGBA"):
         image = image.convert("RGB")
 
-    new_image = scale_to_max_size(image, *thumb_size)
-
-    data = io.BytesIO()
-
     # PNG and GIF are the same, JPG is JPEG
     if format.upper() == "JPG":
         format = "JPEG"
 
-    new_image.save(data, format)
-    return ContentFile(data.getvalue())
+    thumbs = {}
+    for thumb_size in thumb_sizes:
+        new_image = scale_to_max_size(image, *thumb_size)
+        data = io.BytesIO()
+        new_image.save(data, format)
+        thumbs[tuple(thumb_size)] = ContentFile(data.getvalue())
+
+    return thumbs
+
+
+def get_thumb_name(name, thumb_size):
+    """
+    Returns the name of the thumbnail of given size for the image with given
+    name, ie: photo.jpg -> photo.125x125.jpg
+    """
+    split = name.rsplit(".", 1)
+    return "%s.%sx%s.%s" % (split[0], thumb_size[0], thumb_size[1], split[1])
+
+
+def generate_missing_thumb(storage, name, thumb_size, lock_timeout=60):
+    """
+    Generates the thumbnail of given size for the image with given name if it
+    doesn't exist yet and returns the name of the thumbnail. This is used if
+    thumbnails are generated on first request (LFS_LAZY_THUMBNAILS).
+
+    Concurrent requests for the same thumbnail wait for the request which
+    generates it, but not longer than lock_timeout seconds. After that the
+    thumbnail is generated anyway, e.g. because the generating process has
+    died.
+    """
+    thumb_name = get_thumb_name(name, thumb_size)
+    lock_key = "%s-thumb-lock-%s" % (
+        settings.CACHE_MIDDLEWARE_KEY_PREFIX,
+        hashlib.md5(thumb_name.encode("utf-8")).hexdigest(),
+    )
+
+    deadline = time.monotonic() + lock_timeout
+    locked = cache.add(lock_key, 1, lock_timeout)
+    while not locked and time.monotonic() < deadline:
+        if storage.exists(thumb_name):
+            return thumb_name
+        time.sleep(0.05)
+        locked = cache.add(lock_key, 1, lock_timeout)
+
+    try:
+        if not storage.exists(thumb_name):
+            with storage.open(name, "rb") as img_file:
+                thumbs = generate_thumbs(img_file, [thumb_size], name.rsplit(".", 1)[1])
+            if storage.exists(thumb_name):
+                storage.delete(thumb_name)
+            storage.save(thumb_name, thumbs[tuple(thumb_size)])
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+    return thumb_name
 
 
 class ImageWithThumbsFieldFile(ImageFieldFile):
@@ -75,16 +153,18 @@ class ImageWithThumbsFieldFile(ImageFieldFile):
 
     def save(self, name, content, save=True):
         super(ImageWithThumbsFieldFile, self).save(name, content, save)
-        if self.sizes:
-            for size in self.sizes:
-                (w, h) = size
-                split = self.name.rsplit(".", 1)
-                thumb_name = "%s.%sx%s.%s" % (split[0], w, h, split[1])
 
-                # you can use another thumbnailing function if you like
-                thumb_content = generate_thumb(self.file, size, split[1])
+        # The thumbnails are generated on first request, see
+        # lfs.core.views.thumbnail
+        if getattr(settings, "LFS_LAZY_THUMBNAILS", False):
+            return
 
-                thumb_name_ = self.storage.save(thumb_name, thumb_content)
+        if self.sizes:
+            # you can use another thumbnailing function if you like
+            thumbs = generate_thumbs(self.file, self.sizes, self.name.rsplit(".", 1)[1])
+            for size in self.sizes:
+                thumb_name = get_thumb_name(self.name, size)
+                thumb_name_ = self.storage.save(thumb_name, thumbs[tuple(size)])
 
                 if not thumb_name == thumb_name_:
                     raise ValueError("There is already a file named %s" % thumb_name)
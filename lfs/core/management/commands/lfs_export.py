@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+
+class Command(BaseCommand):
+    help = "Writes the product export with the given slug to a file, e.g. for cron jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("slug", help="Slug of the export")
+        parser.add_argument("path", help="File the export is written to")
+
+    def handle(self, *args, **options):
+        import lfs.core.utils
+        from lfs.export.models import Export
+
+        try:
+            export = Export.objects.get(slug=options["slug"])
+        except Export.DoesNotExist:
+            raise CommandError("Export '%s' does not exist" % options["slug"])
+
+        if export.script is None:
+            raise CommandError("Export '%s' has no script" % options["slug"])
+
+        # There is no request outside of a view, hence the script gets None.
+        module = lfs.core.utils.import_module(export.script.module)
+        response = getattr(module, export.script.method)(None, export)
+
+        if response.streaming:
+            content = response.streaming_content
+        else:
+            content = [response.content]
+
+        with open(options["path"], "wb") as f:
+            for chunk in content:
+                f.write(chunk)
+
+        self.stdout.write("Written export '%s' to %s" % (export.slug, options["path"]))
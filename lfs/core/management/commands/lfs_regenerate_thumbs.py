@@ -1,31 +1,157 @@
+import multiprocessing
 import os
+import time
+
 from django.core.management.base import BaseCommand
 
 
 class Command(BaseCommand):
     help = "Regenerate thumbnails for Shop, Category and Image models if they are missing."
 
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument(
+            "--only-missing",
+            action="store_true",
+            help="Only create thumbnails which don't exist yet (default)",
+        )
+        group.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate all thumbnails, even existing ones",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Amount of worker processes (default: amount of CPUs)",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="File which records the processed images. Images recorded in there are skipped, so an "
+            "interrupted run can be resumed with the same file. With --force the file is started anew.",
+        )
+
     def handle(self, *args, **options):
-        from django.conf import settings
-        from lfs.core.models import Shop
-        from lfs.core.fields import thumbs
-        from lfs.catalog.settings import THUMBNAIL_SIZES
-        from lfs.catalog.models import Category
-        from lfs.catalog.models import Image
-
-        for m in [Shop, Category, Image]:
-            for o in m.objects.all():
-                img_file = getattr(o, "image")
-                if img_file.name:
-                    self.stdout.write("Converting %s" % img_file.name)
-                    for size in THUMBNAIL_SIZES:
-                        (w, h) = size
-                        split = img_file.name.rsplit(".", 1)
-                        thumb_name = "%s.%sx%s.%s" % (split[0], w, h, split[1])
-                        if os.path.isfile("%s/%s" % (settings.MEDIA_ROOT, thumb_name)):
-                            self.stdout.write("\tSize %sx%s already exists" % (w, h))
-                            continue
-
-                        thumb_content = thumbs.generate_thumb(img_file, size, split[1])
-                        img_file.storage.save(thumb_name, thumb_content)
-                        self.stdout.write("\tSize %sx%s created" % (w, h))
+        from django.db import connections
+
+        done = set()
+        checkpoint = None
+        if options["checkpoint"]:
+            # A forced run regenerates the images recorded by former runs, too
+            if options["force"]:
+                checkpoint = open(options["checkpoint"], "w")
+            else:
+                if os.path.exists(options["checkpoint"]):
+                    with open(options["checkpoint"]) as f:
+                        done = set(line.strip() for line in f)
+                    self.stdout.write("Resuming, skipping %s processed images" % len(done))
+                checkpoint = open(options["checkpoint"], "a")
+
+        # The tasks are loaded upfront, as the pool consumes them within
+        # another thread.
+        tasks = [task for task in _get_tasks(options["force"]) if task[0] not in done]
+        self.stdout.write("Converting %s images" % len(tasks))
+
+        images = thumbs = errors = 0
+        start = time.perf_counter()
+        pool = None
+        try:
+            if options["processes"] > 1:
+                # The workers don't use the database; the forked connections
+                # must not be shared with them.
+                connections.close_all()
+                pool = multiprocessing.Pool(options["processes"], initializer=_init_worker)
+                results = pool.imap_unordered(_regenerate, tasks, chunksize=16)
+            else:
+                results = (_regenerate(task) for task in tasks)
+
+            for key, name, created, error in results:
+                images += 1
+                if error:
+                    errors += 1
+                    self.stderr.write("Error converting %s: %s" % (name, error))
+                    continue
+
+                thumbs += created
+                if options["verbosity"] > 1:
+                    self.stdout.write("Converted %s: %s thumbnails created" % (name, created))
+                if checkpoint is not None:
+                    checkpoint.write("%s\n" % key)
+                    checkpoint.flush()
+                if images % 1000 == 0:
+                    self._report(images, thumbs, errors, start)
+
+            if pool is not None:
+                pool.close()
+                pool.join()
+        finally:
+            # Stops the workers if the run has been interrupted
+            if pool is not None:
+                pool.terminate()
+            if checkpoint is not None:
+                checkpoint.close()
+
+        self._report(images, thumbs, errors, start)
+
+    def _report(self, images, thumbs, errors, start):
+        duration = time.perf_counter() - start
+        self.stdout.write(
+            "%s images, %s thumbnails created, %s errors in %.1fs (%.1f images/s)"
+            % (images, thumbs, errors, duration, images / duration if duration else 0)
+        )
+
+
+def _get_tasks(force):
+    """Yields a (key, storage, name, sizes, force) tuple per image of Shop,
+    Category and Image.
+    """
+    from lfs.core.models import Shop
+    from lfs.catalog.settings import THUMBNAIL_SIZES
+    from lfs.catalog.models import Category
+    from lfs.catalog.models import Image
+
+    for m in [Shop, Category, Image]:
+        storage = m._meta.get_field("image").storage
+        for pk, name in m.objects.exclude(image="").values_list("pk", "image").iterator():
+            if name:
+                key = "%s.%s:%s" % (m._meta.app_label, m._meta.model_name, pk)
+                yield (key, storage, name, THUMBNAIL_SIZES, force)
+
+
+def _init_worker():
+    import django
+
+    # Workers which are spawned instead of forked have to load Django again.
+    django.setup()
+
+
+def _regenerate(task):
+    """Creates the thumbnails of one image. The source image is decoded once
+    for all missing sizes. Returns (key, name, amount of created thumbnails,
+    error).
+    """
+    from lfs.core.fields.thumbs import generate_thumbs
+    from lfs.core.fields.thumbs import get_thumb_name
+
+    key, storage, name, sizes, force = task
+    try:
+        if force:
+            missing = list(sizes)
+        else:
+            missing = [size for size in sizes if not storage.exists(get_thumb_name(name, size))]
+        if not missing:
+            return (key, name, 0, None)
+
+        with storage.open(name, "rb") as img_file:
+            thumbs = generate_thumbs(img_file, missing, name.rsplit(".", 1)[1])
+
+        for size in missing:
+            thumb_name = get_thumb_name(name, size)
+            if force and storage.exists(thumb_name):
+                storage.delete(thumb_name)
+            storage.save(thumb_name, thumbs[tuple(size)])
+    except Exception as e:
+        return (key, name, 0, str(e))
+
+    return (key, name, len(missing), None)
@@ -1,10 +1,12 @@
 # django imports
 from django.conf import settings
-from django.core.cache import cache
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 # lfs imports
+from lfs.caching.utils import get_tagged
+from lfs.caching.utils import SimpleCacheManager
+from lfs.caching.utils import set_tagged
 from lfs.checkout.settings import CHECKOUT_TYPES
 from lfs.checkout.settings import CHECKOUT_TYPE_SELECT
 from lfs.core.fields.thumbs import ImageWithThumbsField
@@ -210,6 +212,8 @@ class Shop(models.Model):
     meta_keywords = models.TextField(_("Meta keywords"), blank=True)
     meta_description = models.TextField(_("Meta description"), blank=True)
 
+    objects = SimpleCacheManager()
+
     class Meta:
         permissions = (("manage_shop", "Manage shop"),)
         app_label = "core"
@@ -228,12 +232,12 @@ class Shop(models.Model):
     def get_default_country(self):
         """Returns the default country of the shop."""
         cache_key = "%s-default-country-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.id)
-        default_country = cache.get(cache_key)
+        default_country = get_tagged(cache_key)
         if default_country:
             return default_country
 
         default_country = self.default_country
-        cache.set(cache_key, default_country)
+        set_tagged(cache_key, default_country, ["shop"])
 
         return default_country
 
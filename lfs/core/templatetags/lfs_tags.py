@@ -16,9 +16,9 @@ from django.utils.translation import gettext_lazy as _
 
 import lfs.catalog.utils
 import lfs.core.utils
-from lfs.caching.utils import get_cache_group_id
 from lfs.catalog.models import Category
-from lfs.catalog.settings import VARIANT
+from lfs.catalog.navigation import get_category_navigation_index
+from lfs.catalog.navigation import get_manufacturer_navigation_index
 from lfs.catalog.settings import CATEGORY_VARIANT_CHEAPEST_PRICES
 from lfs.catalog.settings import SORTING_MAP
 from lfs.catalog.models import Product
@@ -257,83 +257,28 @@ def product_navigation(context, product):
         sorting = "effective_price"
         request.session["sorting"] = sorting
 
-    slug = product.slug
-
     # To calculate the position we take only STANDARD_PRODUCT into account.
     # That means if the current product is a VARIANT we switch to its parent
     # product.
     if product.is_variant():
         product = product.parent
-        slug = product.slug
 
-    # prepare cache key for product_navigation group
-    # used to invalidate cache for all product_navigations at once
-    pn_cache_key = get_cache_group_id("product_navigation")
+    # This is necessary as we display non active products to superusers.
+    # So we have to take care for the product navigation too.
+    active_only = not request.user.is_superuser
 
     # if there is last_manufacturer then product was visited from manufacturer view
     # as category view removes last_manufacturer from the session
     lm = request.session.get("last_manufacturer")
-    if lm and product.manufacturer == lm:
-        cache_key = "%s-%s-product-navigation-manufacturer-%s" % (
-            settings.CACHE_MIDDLEWARE_KEY_PREFIX,
-            pn_cache_key,
-            slug,
-        )
-        res = cache.get(cache_key)
-        if res and sorting in res:
-            return res[sorting]
-
-        products = Product.objects.filter(manufacturer=lm)
+    if lm and product.manufacturer_id == lm:
+        index = get_manufacturer_navigation_index(lm, sorting, active_only)
     else:
         category = product.get_current_category(request)
         if category is None:
             return {"display": False}
-        else:
-            cache_key = "%s-%s-product-navigation-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, pn_cache_key, slug)
-            res = cache.get(cache_key)
-            if res and sorting in res:
-                return res[sorting]
-
-            # First we collect all sub categories. This and using the in operator makes
-            # batching more easier
-            categories = [category]
-
-            if category.show_all_products:
-                categories.extend(category.get_all_children())
-
-            products = Product.objects.filter(categories__in=categories)
-
-    # This is necessary as we display non active products to superusers.
-    # So we have to take care for the product navigation too.
-    if not request.user.is_superuser:
-        products = products.filter(active=True)
-    products = products.exclude(sub_type=VARIANT).distinct().order_by(sorting)
-
-    product_slugs = list(products.values_list("slug", flat=True))
-    product_index = product_slugs.index(slug)
-
-    if product_index > 0:
-        previous = product_slugs[product_index - 1]
-    else:
-        previous = None
+        index = get_category_navigation_index(category, sorting, active_only)
 
-    total = len(product_slugs)
-    if product_index < total - 1:
-        next_product = product_slugs[product_index + 1]
-    else:
-        next_product = None
-
-    result = {
-        "display": True,
-        "previous": previous,
-        "next": next_product,
-        "current": product_index + 1,
-        "total": total,
-    }
-
-    cache.set(cache_key, {"sorting": result})
-
-    return result
+    return index.get(product.slug) or {"display": False}
 
 
 class ActionsNode(Node):
@@ -678,6 +623,25 @@ def packages(cart_item):
     return 0
 
 
+def _set_category_product_prices(context, prices, suffix):
+    """
+    Injects the passed prices (see lfs.plugins.PriceCalculator.bulk_prices)
+    into the context. Suffix is either "_gross", "_net" or "".
+    """
+    if prices["for_sale"]:
+        context["standard_price"] = prices["standard_price" + suffix]
+        if "standard_price_starting_from" + suffix in prices:
+            context["standard_price_starting_from"] = prices["standard_price_starting_from" + suffix]
+    context["price"] = prices["price" + suffix]
+    context["price_starting_from"] = prices.get("price_starting_from" + suffix, False)
+
+    context["base_price"] = prices["base_price" + suffix]
+    context["base_price_starting_from"] = prices.get("base_price_starting_from" + suffix, False)
+
+    if prices["base_packing_price" + suffix] is not None:
+        context["base_packing_price"] = prices["base_packing_price" + suffix]
+
+
 class CategoryProductPricesGrossNode(Node):
     def __init__(self, product_id):
         self.product_id = template.Variable(product_id)
@@ -686,6 +650,13 @@ class CategoryProductPricesGrossNode(Node):
         request = context.get("request")
 
         product_id = self.product_id.resolve(context)
+
+        # Prices which have been calculated in bulk by the view
+        prices = (context.get("product_prices") or {}).get(product_id)
+        if prices is not None:
+            _set_category_product_prices(context, prices, "_gross")
+            return ""
+
         product = Product.objects.get(pk=product_id)
 
         if product.is_variant():
@@ -741,6 +712,13 @@ class CategoryProductPricesNetNode(Node):
         request = context.get("request")
 
         product_id = self.product_id.resolve(context)
+
+        # Prices which have been calculated in bulk by the view
+        prices = (context.get("product_prices") or {}).get(product_id)
+        if prices is not None:
+            _set_category_product_prices(context, prices, "_net")
+            return ""
+
         product = Product.objects.get(pk=product_id)
 
         if product.is_variant():
@@ -1,13 +1,34 @@
+import io
+import os
+import shutil
 import sys
+import tempfile
+import threading
+from hashlib import md5
+from unittest.mock import patch
 
+from PIL import Image as PILImage
+
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.sessions.backends.file import SessionStore
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.http import Http404
 from django.template import Template
 from django.template import Context
 from django.test import TestCase
+from django.test.utils import override_settings
 
 import lfs.core.utils
+from lfs.catalog.models import Image
+from lfs.catalog.settings import THUMBNAIL_SIZES
+from lfs.core.fields.thumbs import generate_missing_thumb
+from lfs.core.fields.thumbs import generate_thumbs
+from lfs.core.fields.thumbs import get_thumb_name
 from lfs.core.models import Shop
+from lfs.core.views import thumbnail
 from lfs.core.templatetags.lfs_tags import currency
 from lfs.order.models import Order
 from lfs.tests.utils import RequestFactory
@@ -355,3 +376,138 @@ class SiteMapsTestCase(TestCase):
             self.assertEqual(ShopSitemap.priority, 0.4)
             self.assertEqual(ShopSitemap.changefreq, "shop-daily")
             self.assertEqual(ShopSitemap.protocol, "shop-https")
+
+
+class RegenerateThumbsTestCase(TestCase):
+    """Tests the lfs_regenerate_thumbs management command."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        with open(os.path.join(os.path.dirname(__file__), "..", "utils", "data", "image1.jpg"), "rb") as fh:
+            self.image = Image(title="Image 1")
+            self.image.image.save("Laminat01.jpg", ContentFile(fh.read()))
+            self.image.save()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def _thumb_path(self, size):
+        return self.image.image.storage.path(get_thumb_name(self.image.image.name, size))
+
+    def test_only_missing(self):
+        os.remove(self._thumb_path(THUMBNAIL_SIZES[0]))
+        mtime = os.path.getmtime(self._thumb_path(THUMBNAIL_SIZES[1]))
+
+        out = io.StringIO()
+        call_command("lfs_regenerate_thumbs", "--processes=1", stdout=out)
+        self.assertTrue(os.path.exists(self._thumb_path(THUMBNAIL_SIZES[0])))
+        self.assertEqual(os.path.getmtime(self._thumb_path(THUMBNAIL_SIZES[1])), mtime)
+        self.assertTrue("1 images, 1 thumbnails created, 0 errors" in out.getvalue())
+
+    def test_force(self):
+        out = io.StringIO()
+        call_command("lfs_regenerate_thumbs", "--processes=1", "--force", stdout=out)
+        self.assertTrue("1 images, %s thumbnails created" % len(THUMBNAIL_SIZES) in out.getvalue())
+
+        # Existing thumbnails are replaced, not saved under another name
+        self.assertEqual(len(os.listdir(os.path.dirname(self._thumb_path(THUMBNAIL_SIZES[0])))), len(THUMBNAIL_SIZES) + 1)
+
+    def test_checkpoint(self):
+        checkpoint = os.path.join(self.media_root, "checkpoint")
+        call_command("lfs_regenerate_thumbs", "--processes=1", "--checkpoint=%s" % checkpoint, stdout=io.StringIO())
+        with open(checkpoint) as f:
+            self.assertEqual(f.read(), "catalog.image:%s\n" % self.image.pk)
+
+        os.remove(self._thumb_path(THUMBNAIL_SIZES[0]))
+        out = io.StringIO()
+        call_command("lfs_regenerate_thumbs", "--processes=1", "--checkpoint=%s" % checkpoint, stdout=out)
+        self.assertFalse(os.path.exists(self._thumb_path(THUMBNAIL_SIZES[0])))
+        self.assertTrue("skipping 1 processed images" in out.getvalue())
+
+        # A forced run doesn't skip the recorded images
+        out = io.StringIO()
+        call_command("lfs_regenerate_thumbs", "--processes=1", "--force", "--checkpoint=%s" % checkpoint, stdout=out)
+        self.assertTrue(os.path.exists(self._thumb_path(THUMBNAIL_SIZES[0])))
+        self.assertFalse("skipping" in out.getvalue())
+        with open(checkpoint) as f:
+            self.assertEqual(f.read(), "catalog.image:%s\n" % self.image.pk)
+
+    def test_generate_thumbs(self):
+        with open(self.image.image.path, "rb") as fh:
+            thumbs = generate_thumbs(fh, [(60, 60), (200, 200)], "jpg")
+        self.assertEqual(max(PILImage.open(thumbs[(60, 60)]).size), 60)
+        self.assertEqual(max(PILImage.open(thumbs[(200, 200)]).size), 200)
+
+
+class LazyThumbnailsTestCase(TestCase):
+    """Tests the generation of thumbnails on first request."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, LFS_LAZY_THUMBNAILS=True)
+        self.settings_override.enable()
+
+        with open(os.path.join(os.path.dirname(__file__), "..", "utils", "data", "image1.jpg"), "rb") as fh:
+            self.image = Image(title="Image 1")
+            self.image.image.save("Laminat01.jpg", ContentFile(fh.read()))
+            self.image.save()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_upload(self):
+        storage = self.image.image.storage
+        self.assertTrue(storage.exists(self.image.image.name))
+        for size in THUMBNAIL_SIZES:
+            self.assertFalse(storage.exists(get_thumb_name(self.image.image.name, size)))
+
+    def test_thumbnail(self):
+        response = self.client.get(self.image.image.url_60x60)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(max(PILImage.open(io.BytesIO(b"".join(response.streaming_content))).size), 60)
+
+        storage = self.image.image.storage
+        self.assertTrue(storage.exists(get_thumb_name(self.image.image.name, (60, 60))))
+        self.assertFalse(storage.exists(get_thumb_name(self.image.image.name, (100, 100))))
+
+    def test_unknown_thumbnail(self):
+        request = RequestFactory().get("/")
+        self.assertRaises(Http404, thumbnail, request, self.image.image.name.replace(".jpg", ".61x61.jpg"))
+        self.assertRaises(Http404, thumbnail, request, "images/missing.60x60.jpg")
+
+    def _get_lock_key(self, thumb_name):
+        return "%s-thumb-lock-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, md5(thumb_name.encode("utf-8")).hexdigest())
+
+    def test_lock(self):
+        # Another process is generating the thumbnail; it is just awaited.
+        name = self.image.image.name
+        thumb_name = get_thumb_name(name, (60, 60))
+        cache.add(self._get_lock_key(thumb_name), 1)
+        timer = threading.Timer(0.2, self.image.image.storage.save, [thumb_name, ContentFile(b"thumb")])
+        timer.start()
+
+        try:
+            with patch("lfs.core.fields.thumbs.generate_thumbs") as generate_thumbs:
+                self.assertEqual(generate_missing_thumb(self.image.image.storage, name, (60, 60)), thumb_name)
+            generate_thumbs.assert_not_called()
+        finally:
+            timer.join()
+            cache.delete(self._get_lock_key(thumb_name))
+
+    def test_lock_timeout(self):
+        # The process which holds the lock has died; the thumbnail is
+        # generated after the timeout.
+        name = self.image.image.name
+        thumb_name = get_thumb_name(name, (60, 60))
+        cache.add(self._get_lock_key(thumb_name), 1)
+        try:
+            self.assertEqual(generate_missing_thumb(self.image.image.storage, name, (60, 60), lock_timeout=0.2), thumb_name)
+            self.assertTrue(self.image.image.storage.exists(thumb_name))
+        finally:
+            cache.delete(self._get_lock_key(thumb_name))
@@ -1,3 +1,5 @@
+import re
+
 from django.conf import settings
 from django.urls import include, re_path
 from django.contrib.auth import views as auth_views
@@ -34,6 +36,16 @@ urlpatterns = [
     re_path(r"^robots.txt$", views.TextTemplateView.as_view(template_name="lfs/shop/robots.txt")),
 ]
 
+# Thumbnails which are generated on first request, see LFS_LAZY_THUMBNAILS
+if settings.MEDIA_URL.startswith("/"):
+    urlpatterns += [
+        re_path(
+            r"^%s(?P<path>.+\.\d+x\d+\.\w+)$" % re.escape(settings.MEDIA_URL[1:]),
+            views.thumbnail,
+            name="lfs_thumbnail",
+        ),
+    ]
+
 # Sitemap urls
 try:
     product_sitemap = import_symbol(settings.LFS_SITEMAPS["product"]["sitemap"])
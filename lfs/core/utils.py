@@ -290,10 +290,17 @@ class CategoryTree(object):
         # the category tree always start with level 1 (even if we start with
         # category level 2) an the correct css is applied.
 
+        # All categories are loaded with one query, the tree is built from it.
+        all_categories = list(Category.objects.all())
+        categories_by_id = dict((category.id, category) for category in all_categories)
+        self.categories_by_parent = {}
+        for category in all_categories:
+            self.categories_by_parent.setdefault(category.parent_id, []).append(category)
+
         level = 0
         categories = []
-        for category in Category.objects.filter(level=self.start_level):
-            if category.exclude_from_navigation:
+        for category in all_categories:
+            if category.level != self.start_level or category.exclude_from_navigation:
                 continue
 
             if self.currents and category in self.currents:
@@ -307,7 +314,7 @@ class CategoryTree(object):
                 is_current = False
 
             if self.start_level > 1:
-                if category.parent in self.currents:
+                if categories_by_id.get(category.parent_id) in self.currents:
                     categories.append(
                         {
                             "category": category,
@@ -329,10 +336,8 @@ class CategoryTree(object):
         return categories
 
     def _get_sub_tree(self, category, level):
-        from lfs.catalog.models import Category
-
         categories = []
-        for category in Category.objects.filter(parent=category):
+        for category in self.categories_by_parent.get(category.id, []):
             if category.exclude_from_navigation:
                 continue
 
@@ -1,10 +1,15 @@
 # python imports
+import mimetypes
+import re
 import sys
 import traceback
 
 # django imports
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.core.mail import EmailMessage
+from django.http import FileResponse
+from django.http import Http404
 from django.http import HttpResponseServerError
 from django.shortcuts import render
 from django.template import loader
@@ -19,6 +24,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+THUMBNAIL_RE = re.compile(r"^(?P<base>.+)\.(?P<width>\d+)x(?P<height>\d+)\.(?P<extension>\w+)$")
+
 
 def shop_view(request, template_name="lfs/shop/shop.html"):
     """Displays the shop."""
@@ -34,6 +41,33 @@ def shop_view(request, template_name="lfs/shop/shop.html"):
     )
 
 
+def thumbnail(request, path):
+    """Generates the requested thumbnail if it doesn't exist yet and returns
+    it. The URL is the one of the thumbnail within MEDIA_URL, hence the web
+    server only passes requests for missing thumbnails to this view, see
+    LFS_LAZY_THUMBNAILS.
+    """
+    from lfs.catalog.settings import THUMBNAIL_SIZES
+    from lfs.core.fields.thumbs import generate_missing_thumb
+
+    match = THUMBNAIL_RE.match(path)
+    if match is None:
+        raise Http404
+
+    # Only the configured sizes are generated
+    thumb_size = (int(match.group("width")), int(match.group("height")))
+    if thumb_size not in [tuple(size) for size in THUMBNAIL_SIZES]:
+        raise Http404
+
+    name = "%s.%s" % (match.group("base"), match.group("extension"))
+    if not default_storage.exists(name):
+        raise Http404
+
+    thumb_name = generate_missing_thumb(default_storage, name, thumb_size)
+    content_type = mimetypes.guess_type(thumb_name)[0]
+    return FileResponse(default_storage.open(thumb_name, "rb"), content_type=content_type)
+
+
 def server_error(request):
     """Own view in order to send an error message."""
     exc_type, exc_info, tb = sys.exc_info()
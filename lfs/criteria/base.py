@@ -11,14 +11,24 @@ class Criteria(object):
     Base class for objects which have criteria.
     """
 
-    def is_valid(self, request, product=None):
+    def is_valid(self, request, product=None, facts=None):
         """
         Returns ``True`` if the object is valid, otherwise ``False``.
+
+        The criteria of the object (see ``get_criteria``) are checked via their
+        compiled rules (see lfs.criteria.rules) against the passed facts. If no
+        facts are passed they are calculated for the passed request and
+        product.
         """
+        from lfs.criteria.rules import Facts
+        from lfs.criteria.rules import get_rule_table
+
+        if facts is None:
+            facts = Facts(request, product)
+
+        rule_table = get_rule_table()
         for criterion in self.get_criteria():
-            criterion.request = request
-            criterion.product = product
-            if not criterion.is_valid():
+            if not rule_table.is_criterion_valid(criterion, facts):
                 return False
         return True
 
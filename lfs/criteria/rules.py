@@ -0,0 +1,313 @@
+import copy
+import operator
+
+from django.contrib.contenttypes.models import ContentType
+from django.utils.functional import cached_property
+
+import lfs.cart.utils
+from lfs.caching.utils import get_tag_versions
+from lfs.criteria.models import CartPriceCriterion
+from lfs.criteria.models import CombinedLengthAndGirthCriterion
+from lfs.criteria.models import CountryCriterion
+from lfs.criteria.models import Criterion
+from lfs.criteria.models import HeightCriterion
+from lfs.criteria.models import LengthCriterion
+from lfs.criteria.models import PaymentMethodCriterion
+from lfs.criteria.models import ShippingMethodCriterion
+from lfs.criteria.models import WeightCriterion
+from lfs.criteria.models import WidthCriterion
+
+# Criteria with a numeric value and the fact they are compared with.
+NUMBER_CRITERIA = (
+    (CartPriceCriterion, "price"),
+    (CombinedLengthAndGirthCriterion, "clag"),
+    (HeightCriterion, "height"),
+    (LengthCriterion, "length"),
+    (WeightCriterion, "weight"),
+    (WidthCriterion, "width"),
+)
+
+# Criteria with a selection of objects and the fact they are compared with.
+SELECTION_CRITERIA = (
+    (CountryCriterion, "country_id"),
+    (PaymentMethodCriterion, "payment_method_id"),
+    (ShippingMethodCriterion, "shipping_method_id"),
+)
+
+NUMBER_OPERATORS = {
+    Criterion.EQUAL: operator.eq,
+    Criterion.LESS_THAN: operator.lt,
+    Criterion.LESS_THAN_EQUAL: operator.le,
+    Criterion.GREATER_THAN: operator.gt,
+    Criterion.GREATER_THAN_EQUAL: operator.ge,
+}
+
+_rule_table = None
+
+
+class Facts(object):
+    """
+    Snapshot of the cart and customer facts criteria are checked against:
+    price, weight, dimensions, shipping country and the selected shipping and
+    payment method.
+
+    The facts are calculated lazily on first access and then kept, so that
+    all criteria of all objects which are checked with the same snapshot share
+    the calculation. If a product is given the facts are taken from the
+    product, otherwise from the cart of the current customer.
+
+    If ``shared`` facts are passed, the customer facts (shipping country and
+    the selected shipping and payment method) are taken from them. This is
+    used to check the criteria for several products within one request.
+    """
+
+    def __init__(self, request, product=None, shared=None):
+        self.request = request
+        self.product = product
+        self.shared = shared
+
+    @cached_property
+    def cart(self):
+        return lfs.cart.utils.get_cart(self.request)
+
+    @cached_property
+    def price(self):
+        if self.product:
+            return self.product.get_price(self.request)
+        elif self.cart:
+            return self.cart.get_price_gross(self.request)
+        return 0
+
+    @cached_property
+    def dimensions(self):
+        """
+        Returns weight, height, length, width and combined length and girth
+        (clag) as dictionary. For a cart these are calculated in one pass over
+        the cart items.
+        """
+        if self.product:
+            width = self.product.get_width()
+            height = self.product.get_height()
+            length = self.product.get_length()
+            return {
+                "weight": self.product.get_weight(),
+                "height": height,
+                "length": length,
+                "width": width,
+                "clag": (2 * width) + (2 * height) + length,
+            }
+
+        weight = height = max_length = max_width = total_height = 0
+        if self.cart:
+            for item in self.cart.get_items():
+                product = item.product
+                weight += product.get_weight() * item.amount
+                height += product.get_height() * item.amount
+                total_height += product.get_height()
+                max_length = max(max_length, product.get_length())
+                max_width = max(max_width, product.get_width())
+
+        return {
+            "weight": weight,
+            "height": height,
+            "length": max_length,
+            "width": max_width,
+            "clag": (2 * max_width) + (2 * total_height) + max_length,
+        }
+
+    @property
+    def weight(self):
+        return self.dimensions["weight"]
+
+    @property
+    def height(self):
+        return self.dimensions["height"]
+
+    @property
+    def length(self):
+        return self.dimensions["length"]
+
+    @property
+    def width(self):
+        return self.dimensions["width"]
+
+    @property
+    def clag(self):
+        return self.dimensions["clag"]
+
+    @cached_property
+    def country_id(self):
+        if self.shared is not None:
+            return self.shared.country_id
+
+        import lfs.shipping.utils
+
+        country = lfs.shipping.utils.get_selected_shipping_country(self.request)
+        return country.pk if country else None
+
+    @cached_property
+    def shipping_method_id(self):
+        if self.shared is not None:
+            return self.shared.shipping_method_id
+
+        import lfs.shipping.utils
+
+        shipping_method = lfs.shipping.utils.get_selected_shipping_method(self.request)
+        return shipping_method.pk if shipping_method else None
+
+    @cached_property
+    def payment_method_id(self):
+        if self.shared is not None:
+            return self.shared.payment_method_id
+
+        import lfs.payment.utils
+
+        payment_method = lfs.payment.utils.get_selected_payment_method(self.request)
+        return payment_method.pk if payment_method else None
+
+
+class RuleTable(object):
+    """
+    The criteria of all objects (shipping methods, payment methods, discounts,
+    prices, ...) compiled to plain rules, see ``load``.
+
+    The table is a compiled cache of the criteria: objects still get their
+    criteria via ``Criteria.get_criteria`` and check each of them via
+    ``is_criterion_valid``, which looks up the rule of the criterion by its id.
+
+    A rule is a tuple of (kind, operator, value, criterion):
+
+    ``number``
+        value is a (fact name, number) pair.
+
+    ``selection``
+        value is a (fact name, set of ids, content type id) triple, where the
+        content type is the one of the selected objects. See
+        ShippingMethodCriterion.is_valid for why the content type is needed.
+
+    ``object``
+        The criterion is not known to the table and is checked via its own
+        ``is_valid`` method.
+
+    Besides the rules per criterion id, the rules are kept per object, as
+    dictionary of (content type id, content id) to the list of rules of the
+    object sorted by position. These are needed to check whether the shipping
+    or payment methods a criterion refers to are valid.
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+        self.rules = {}
+        self.objects = {}
+
+    def load(self):
+        """
+        Loads the criteria of all objects from the database.
+        """
+        rules = []
+        known = []
+        for klass, fact in NUMBER_CRITERIA:
+            sub_type = klass.__name__.lower()
+            known.append(sub_type)
+            for criterion in klass.objects.filter(sub_type=sub_type):
+                rules.append((criterion, ("number", criterion.operator, (fact, criterion.value), None)))
+
+        for klass, fact in SELECTION_CRITERIA:
+            sub_type = klass.__name__.lower()
+            known.append(sub_type)
+            value_ctype = ContentType.objects.get_for_model(klass.value.field.related_model)
+            for criterion in klass.objects.filter(sub_type=sub_type).prefetch_related("value"):
+                ids = frozenset(obj.pk for obj in criterion.value.all())
+                rules.append((criterion, ("selection", criterion.operator, (fact, ids, value_ctype.id), None)))
+
+        for criterion in Criterion.objects.exclude(sub_type__in=known):
+            criterion = criterion.get_content_object()
+            rules.append((criterion, ("object", criterion.operator, None, criterion)))
+
+        rules.sort(key=lambda rule: (rule[0].position, rule[0].id))
+
+        self.rules = {}
+        self.objects = {}
+        for criterion, rule in rules:
+            self.rules[criterion.pk] = rule
+            self.objects.setdefault((criterion.content_type_id, criterion.content_id), []).append(rule)
+
+    def is_criterion_valid(self, criterion, facts):
+        """
+        Returns ``True`` if the passed criterion is valid for the passed
+        facts, otherwise ``False``. Criteria which aren't known to the table
+        are checked via their own ``is_valid`` method.
+        """
+        rule = self.rules.get(criterion.pk) if isinstance(criterion, Criterion) else None
+        if rule is None or rule[0] == "object":
+            criterion.request = facts.request
+            criterion.product = facts.product
+            return criterion.is_valid()
+        return self._is_rule_valid(criterion.content_type_id, rule, facts)
+
+    def is_valid(self, obj, facts):
+        """
+        Returns ``True`` if all criteria of the passed object are valid for
+        the passed facts, otherwise ``False``.
+        """
+        content_type = ContentType.objects.get_for_model(obj)
+        return self._is_valid(content_type.id, obj.pk, facts)
+
+    def _is_valid(self, content_type_id, content_id, facts):
+        for rule in self.objects.get((content_type_id, content_id), ()):
+            if not self._is_rule_valid(content_type_id, rule, facts):
+                return False
+        return True
+
+    def _is_rule_valid(self, content_type_id, rule, facts):
+        kind, op, value, criterion = rule
+        if kind == "number":
+            fact, number = value
+            check = NUMBER_OPERATORS.get(op)
+            return check is not None and check(getattr(facts, fact), number)
+        elif kind == "selection":
+            fact, ids, value_ctype_id = value
+            return self._is_selection_valid(content_type_id, op, fact, ids, value_ctype_id, facts)
+        else:
+            criterion = copy.copy(criterion)
+            criterion.request = facts.request
+            criterion.product = facts.product
+            return criterion.is_valid()
+
+    def _is_selection_valid(self, content_type_id, op, fact, ids, value_ctype_id, facts):
+        if fact == "country_id":
+            if op == Criterion.IS_SELECTED:
+                return facts.country_id in ids
+            return facts.country_id not in ids
+
+        # A shipping (payment) method can't check the selected shipping
+        # (payment) method, as the selected one is calculated via the valid
+        # ones, which would result in an infinite recursion.
+        if content_type_id != value_ctype_id:
+            if op == Criterion.IS_SELECTED:
+                return getattr(facts, fact) in ids
+            elif op == Criterion.IS_NOT_SELECTED:
+                return getattr(facts, fact) not in ids
+
+        if op == Criterion.IS_VALID:
+            return all(self._is_valid(value_ctype_id, pk, facts) for pk in ids)
+        elif op == Criterion.IS_NOT_VALID:
+            return not any(self._is_valid(value_ctype_id, pk, facts) for pk in ids)
+        return False
+
+
+def get_rule_table():
+    """
+    Returns the rule table of the process. The table is loaded once and
+    reloaded after the "criteria" cache tag has been invalidated, which
+    happens whenever a criterion or one of the objects a criterion refers to
+    is changed, see lfs.caching.listeners.
+    """
+    global _rule_table
+    version = get_tag_versions(["criteria"])["criteria"]
+    rule_table = _rule_table
+    if rule_table is None or rule_table.version != version:
+        rule_table = RuleTable(version)
+        rule_table.load()
+        _rule_table = rule_table
+    return rule_table
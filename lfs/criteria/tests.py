@@ -0,0 +1,93 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from unittest.mock import patch
+
+from lfs.catalog.models import Product
+from lfs.core.models import Country
+from lfs.criteria.models import CountryCriterion
+from lfs.criteria.models import Criterion
+from lfs.criteria.models import ShippingMethodCriterion
+from lfs.criteria.models import WeightCriterion
+from lfs.criteria.rules import Facts
+from lfs.criteria.utils import get_valid
+from lfs.payment.models import PaymentMethod
+from lfs.shipping.models import ShippingMethod
+from lfs.tests.utils import DummyRequest
+
+
+class RuleTableTestCase(TestCase):
+    """Tests the rule table of lfs.criteria.rules."""
+
+    fixtures = ["lfs_shop.xml", "lfs_user.xml"]
+
+    def setUp(self):
+        self.request = DummyRequest(user=User.objects.get(username="admin"))
+        self.sm1 = ShippingMethod.objects.create(name="Standard", active=True, priority=1)
+        self.sm2 = ShippingMethod.objects.create(name="Express", active=True, priority=2)
+        self.pm = PaymentMethod.objects.create(name="Direct debit", active=True)
+        self.p1 = Product.objects.create(name="Product 1", slug="p1", price=9, weight=6.0, active=True)
+        self.p2 = Product.objects.create(name="Product 2", slug="p2", price=11, weight=12.0, active=True)
+
+    def test_number_criterion(self):
+        criterion = WeightCriterion.objects.create(content=self.sm1, value=10.0, operator=Criterion.GREATER_THAN)
+
+        self.assertEqual(get_valid(self.request, [self.sm1, self.sm2], self.p1), [self.sm2])
+        self.assertEqual(get_valid(self.request, [self.sm1, self.sm2], self.p2), [self.sm1, self.sm2])
+
+        # The table is loaded once and the facts are calculated once
+        facts = Facts(self.request, self.p1)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.sm1.is_valid(self.request, self.p1, facts))
+            self.assertTrue(self.sm2.is_valid(self.request, self.p1, facts))
+
+        # Changes of criteria are taken over
+        criterion.value = 5.0
+        criterion.save()
+        self.assertTrue(self.sm1.is_valid(self.request, self.p1))
+
+        criterion.delete()
+        self.assertTrue(self.sm1.is_valid(self.request, self.p2))
+
+    def test_country_criterion(self):
+        de = Country.objects.get(code="de")
+        criterion = CountryCriterion.objects.create(content=self.sm1, operator=Criterion.IS_SELECTED)
+        self.assertFalse(self.sm1.is_valid(self.request))
+
+        criterion.value.add(de)
+        self.assertTrue(self.sm1.is_valid(self.request))
+
+        criterion.operator = Criterion.IS_NOT_SELECTED
+        criterion.save()
+        self.assertFalse(self.sm1.is_valid(self.request))
+
+    def test_shipping_method_criterion(self):
+        WeightCriterion.objects.create(content=self.sm1, value=10.0, operator=Criterion.GREATER_THAN)
+        criterion = ShippingMethodCriterion.objects.create(content=self.pm, operator=Criterion.IS_VALID)
+        criterion.value.add(self.sm1)
+
+        self.assertFalse(self.pm.is_valid(self.request, self.p1))
+        self.assertTrue(self.pm.is_valid(self.request, self.p2))
+
+        criterion.operator = Criterion.IS_NOT_VALID
+        criterion.save()
+        self.assertTrue(self.pm.is_valid(self.request, self.p1))
+
+        # Deleted shipping methods are not taken into account anymore
+        self.sm1.delete()
+        self.assertTrue(self.pm.is_valid(self.request, self.p2))
+
+    def test_get_criteria(self):
+        WeightCriterion.objects.create(content=self.sm1, value=10.0, operator=Criterion.GREATER_THAN)
+        self.assertFalse(self.sm1.is_valid(self.request, self.p1))
+
+        # The criteria are taken from get_criteria
+        with patch.object(ShippingMethod, "get_criteria", return_value=[]):
+            self.assertTrue(self.sm1.is_valid(self.request, self.p1))
+
+    def test_is_valid_without_facts(self):
+        # Overrides of is_valid without the facts parameter are still called
+        def is_valid(self, request, product=None):
+            return self.name == "Express"
+
+        with patch.object(ShippingMethod, "is_valid", is_valid):
+            self.assertEqual(get_valid(self.request, [self.sm1, self.sm2], self.p1), [self.sm2])
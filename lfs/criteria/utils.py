@@ -1,7 +1,10 @@
+import inspect
+
 from django.contrib.contenttypes.models import ContentType
 
 from lfs.core.utils import import_symbol
 from lfs.criteria.models import Criterion
+from lfs.criteria.rules import Facts
 
 import logging
 
@@ -51,12 +54,41 @@ def get_first_valid(request, objects, product=None):
     Passed object is an object which can have criteria. At the moment these are
     discounts, shipping/payment methods and shipping/payment prices.
     """
+    facts = Facts(request, product)
     for object in objects:
-        if object.is_valid(request, product):
+        if _is_valid(object, request, product, facts):
             return object
     return None
 
 
+def get_valid(request, objects, product=None):
+    """
+    Returns all valid objects of given objects as list.
+
+    All objects are checked against the same facts, so that the cart weight,
+    price, selected shipping method, etc. are calculated only once.
+    """
+    facts = Facts(request, product)
+    return [object for object in objects if _is_valid(object, request, product, facts)]
+
+
+def _is_valid(object, request, product, facts):
+    """
+    Checks the passed object with the passed facts. Objects which override
+    ``is_valid`` without the facts parameter are called as before.
+    """
+    try:
+        parameters = inspect.signature(object.is_valid).parameters.values()
+    except (TypeError, ValueError):
+        parameters = []
+
+    if any(p.name == "facts" or p.kind == p.VAR_KEYWORD for p in parameters):
+        return object.is_valid(request, product, facts=facts)
+    elif product is None:
+        return object.is_valid(request)
+    return object.is_valid(request, product)
+
+
 # DEPRECATED 0.8
 def save_criteria(request, object):
     """
@@ -1,5 +1,6 @@
 # lfs imports
 from django.core.cache import cache
+from lfs.criteria.rules import Facts
 from lfs.criteria.utils import get_first_valid
 from lfs.customer_tax.models import CustomerTax
 
@@ -26,6 +27,53 @@ def get_customer_tax_rate(request, product):
     return taxrate
 
 
+def get_customer_tax_rates(request, products, product_tax_rates=None):
+    """Returns the specific customer taxes for the current customer and the
+    passed products as dictionary of product id to tax rate.
+
+    The customer (country, selected shipping and payment method) is looked up
+    only once for all products. ``product_tax_rates`` (product id to tax rate)
+    is used for products without a specific customer tax, if passed.
+    """
+    customer_taxes = cache.get("all_customer_taxes")
+    if customer_taxes is None:
+        customer_taxes = CustomerTax.objects.all()
+        cache.set("all_customer_taxes", customer_taxes)
+
+    shared = Facts(request)
+    taxrates = {}
+    for product in products:
+        cache_key = "cached_customer_tax_rate_%s" % product.pk
+        if request and hasattr(request, cache_key):
+            taxrates[product.pk] = getattr(request, cache_key)
+            continue
+
+        facts = Facts(request, product, shared)
+        for customer_tax in customer_taxes:
+            if customer_tax.is_valid(request, product, facts):
+                taxrate = customer_tax.rate
+                break
+        else:
+            if product_tax_rates is not None and product.pk in product_tax_rates:
+                taxrate = product_tax_rates[product.pk]
+            else:
+                taxrate = _calc_product_tax_rate(request, product)
+
+        if request:
+            setattr(request, cache_key, taxrate)
+        taxrates[product.pk] = taxrate
+    return taxrates
+
+
+def get_customer_tax_context(request):
+    """Returns a string which identifies the customer facts the customer taxes
+    depend on: the shipping country and the selected shipping and payment
+    method. Prices which are cached per customer have to vary on it.
+    """
+    facts = Facts(request)
+    return "%s-%s-%s" % (facts.country_id, facts.shipping_method_id, facts.payment_method_id)
+
+
 def _calc_product_tax_rate(request, product):
     try:
         return product.get_product_tax_rate(request)
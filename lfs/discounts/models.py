@@ -107,10 +107,10 @@ class Discount(models.Model, Criteria):
 
         return 0.0
 
-    def is_valid(self, request, product=None):
+    def is_valid(self, request, product=None, facts=None):
         if self.products.exists():
             cart = lfs.cart.utils.get_cart(request)
             items = cart.get_items()
             if not items.filter(product__in=self.products.all()).exists():
                 return False
-        return super(Discount, self).is_valid(request, product)
+        return super(Discount, self).is_valid(request, product, facts=facts)
@@ -1,23 +1,23 @@
-# discounts imports
+# lfs imports
+from lfs.criteria.utils import get_valid
 from lfs.discounts.models import Discount
 
 
 def get_valid_discounts(request, product=None):
     """Returns all valid discounts as a list."""
     discounts = []
-    for discount in Discount.objects.filter(active=True):
-        if discount.is_valid(request, product):
-            discounts.append(
-                {
-                    "id": discount.id,
-                    "name": discount.name,
-                    "sku": discount.sku,
-                    "price_net": discount.get_price_net(request, product),
-                    "price_gross": discount.get_price_gross(request, product),
-                    "tax": discount.get_tax(request, product),
-                    "sums_up": discount.sums_up,
-                }
-            )
+    for discount in get_valid(request, Discount.objects.filter(active=True), product):
+        discounts.append(
+            {
+                "id": discount.id,
+                "name": discount.name,
+                "sku": discount.sku,
+                "price_net": discount.get_price_net(request, product),
+                "price_gross": discount.get_price_gross(request, product),
+                "tax": discount.get_tax(request, product),
+                "sums_up": discount.sums_up,
+            }
+        )
 
     return discounts
 
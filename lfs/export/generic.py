@@ -1,13 +1,27 @@
 import csv
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+
+from lfs.export.utils import iter_products
+
+
+class Echo(object):
+    """File-like object which returns the written value instead of storing it,
+    see export.
+    """
+
+    def write(self, value):
+        return value
 
 
 def export(request, export):
-    """Generic export method."""
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = "attachment; filename=%s.csv" % export.name
-    writer = csv.writer(response, delimiter=";", quotechar='"', quoting=csv.QUOTE_ALL)
+    """Generic export method.
+
+    The rows are streamed to the client while the products are fetched chunk
+    by chunk, see lfs.export.utils.iter_products.
+    """
+    writer = csv.writer(Echo(), delimiter=";", quotechar='"', quoting=csv.QUOTE_ALL)
+    rows = (writer.writerow((product.get_name(),)) for product in iter_products(export, request))
 
-    for product in export.get_products():
-        writer.writerow((product.get_name().encode("utf-8"),))
+    response = StreamingHttpResponse(rows, content_type="text/csv")
+    response["Content-Disposition"] = "attachment; filename=%s.csv" % export.name
     return response
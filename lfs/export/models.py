@@ -37,16 +37,7 @@ class Export(models.Model):
         """Returns selected products. Takes variant options into account."""
         import lfs.export.utils
 
-        products = []
-
-        for product in self.products.all():
-            products.append(product)
-            if product.is_product_with_variants():
-                variants = lfs.export.utils.get_variants(product, self)
-                if variants:
-                    products.extend(variants)
-
-        return products
+        return list(lfs.export.utils.iter_products(self))
 
 
 class Script(models.Model):
@@ -0,0 +1,115 @@
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from lfs.catalog.models import Category
+from lfs.catalog.models import Product
+from lfs.catalog.settings import PRODUCT_WITH_VARIANTS
+from lfs.catalog.settings import VARIANT
+from lfs.export.generic import export as export_script
+from lfs.export.models import CategoryOption
+from lfs.export.models import Export
+from lfs.export.models import Script
+from lfs.export.settings import CATEGORY_VARIANTS_ALL
+from lfs.export.settings import CATEGORY_VARIANTS_CHEAPEST
+from lfs.export.settings import CATEGORY_VARIANTS_DEFAULT
+from lfs.export.settings import CATEGORY_VARIANTS_NONE
+from lfs.export.utils import iter_products
+
+
+class ExportTestCase(TestCase):
+    """Tests the export of products."""
+
+    fixtures = ["lfs_shop.xml"]
+
+    def setUp(self):
+        self.c1 = Category.objects.create(name="Category 1", slug="c1")
+        self.c11 = Category.objects.create(name="Category 11", slug="c11", parent=self.c1)
+
+        self.p1 = Product.objects.create(name="Product 1", slug="p1", price=10, active=True)
+        self.p2 = Product.objects.create(
+            name="Product 2", slug="p2", price=10, active=True, sub_type=PRODUCT_WITH_VARIANTS
+        )
+        self.v1 = Product.objects.create(
+            name="Variant 1",
+            slug="v1",
+            price=20,
+            active=True,
+            active_name=True,
+            active_price=True,
+            sub_type=VARIANT,
+            parent=self.p2,
+            variant_position=1,
+        )
+        self.v2 = Product.objects.create(
+            name="Variant 2",
+            slug="v2",
+            price=5,
+            active=True,
+            active_name=True,
+            active_price=True,
+            sub_type=VARIANT,
+            parent=self.p2,
+            variant_position=2,
+        )
+        self.p2.categories.add(self.c11)
+
+        self.script = Script.objects.get_or_create(module="lfs.export.generic", method="export", name="Generic")[0]
+        self.export = Export.objects.create(name="Export", slug="export", script=self.script)
+        self.export.products.add(self.p1, self.p2)
+
+    def test_variants_option(self):
+        self.assertEqual(list(iter_products(self.export)), [self.p1, self.p2, self.v1])
+
+        self.export.variants_option = CATEGORY_VARIANTS_ALL
+        self.assertEqual(list(iter_products(self.export)), [self.p1, self.p2, self.v1, self.v2])
+
+        # The option of the parent category wins over the one of the export
+        CategoryOption.objects.create(export=self.export, category=self.c1, variants_option=CATEGORY_VARIANTS_CHEAPEST)
+        self.assertEqual(list(iter_products(self.export)), [self.p1, self.p2, self.v2])
+
+        CategoryOption.objects.create(export=self.export, category=self.c11, variants_option=CATEGORY_VARIANTS_NONE)
+        self.assertEqual(list(iter_products(self.export)), [self.p1, self.p2])
+
+        self.export.variants_option = CATEGORY_VARIANTS_DEFAULT
+        self.assertEqual(self.export.get_products(), [self.p1, self.p2])
+
+    def test_default_variant(self):
+        # Without a selected default variant the first active variant by name
+        # is taken, like Product.get_default_variant does.
+        self.v1.name = "Variant 3"
+        self.v1.save()
+        self.assertEqual(self.p2.get_default_variant(), self.v2)
+        self.assertEqual(list(iter_products(self.export)), [self.p1, self.p2, self.v2])
+
+        self.export.variants_option = CATEGORY_VARIANTS_ALL
+        self.assertEqual(list(iter_products(self.export)), [self.p1, self.p2, self.v1, self.v2])
+
+    def test_chunks(self):
+        for i in range(5):
+            product = Product.objects.create(name="Product %s" % i, slug="product-%s" % i, active=True)
+            self.export.products.add(product)
+
+        # Categories, category options, products and for the chunk with the
+        # product with variants: categories and variants
+        with self.assertNumQueries(5):
+            products = list(iter_products(self.export, chunk_size=2))
+        self.assertEqual(len(products), 8)
+
+    def test_generic_export(self):
+        response = export_script(None, self.export)
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode("utf-8")
+        self.assertEqual(content.split(), ['"Product', '1"', '"Product', '2"', '"Variant', '1"'])
+
+    def test_command(self):
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        os.close(fd)
+        try:
+            call_command("lfs_export", "export", path, stdout=open(os.devnull, "w"))
+            with open(path) as f:
+                self.assertEqual(f.read().splitlines(), ['"Product 1"', '"Product 2"', '"Variant 1"'])
+        finally:
+            os.remove(path)
@@ -1,3 +1,9 @@
+import itertools
+
+from django.conf import settings
+
+from lfs.catalog.models import Category
+from lfs.catalog.models import Product
 from lfs.export.models import CategoryOption
 from lfs.export.models import Script
 from lfs.export.settings import CATEGORY_VARIANTS_CHEAPEST
@@ -57,3 +63,99 @@ def get_variants(product, export):
             return [variants[0]]
         except IndexError:
             return []
+
+
+def iter_products(export, request=None, chunk_size=None):
+    """Yields the selected products of given export, each product with
+    variants followed by its variants as selected by the variants option (see
+    get_variants).
+
+    The products are fetched in chunks of ``chunk_size`` (default:
+    LFS_EXPORT_CHUNK_SIZE or 500). The variants and categories of a chunk are
+    loaded with one query each, so that memory usage and the amount of queries
+    per product don't depend on the size of the export.
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, "LFS_EXPORT_CHUNK_SIZE", 500)
+
+    category_parents = dict(Category.objects.values_list("id", "parent_id"))
+    category_options = dict(CategoryOption.objects.filter(export=export).values_list("category_id", "variants_option"))
+
+    products = export.products.all().iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(itertools.islice(products, chunk_size))
+        if not chunk:
+            break
+
+        variants = _get_chunk_variants(export, chunk, category_parents, category_options, request)
+        for product in chunk:
+            yield product
+            for variant in variants.get(product.id, []):
+                yield variant
+
+
+def _get_chunk_variants(export, chunk, category_parents, category_options, request):
+    """Returns the variants to export for the products with variants of given
+    chunk as dictionary of product id to list of variants.
+    """
+    products = [product for product in chunk if product.is_product_with_variants()]
+    if not products:
+        return {}
+    product_ids = [product.id for product in products]
+
+    # The variants option is taken from the first category of the product,
+    # see get_variants_option.
+    first_categories = {}
+    categories = Category.products.through.objects.filter(product_id__in=product_ids)
+    for product_id, category_id in categories.order_by("category__position", "category_id").values_list(
+        "product_id", "category_id"
+    ):
+        first_categories.setdefault(product_id, category_id)
+
+    # The variants are loaded in the default ordering of products, as the
+    # first of them is the default variant if none is selected (see
+    # Product.get_default_variant). They are exported by variant_position
+    # though (see Product.get_variants).
+    active_variants = {}
+    first_variants = {}
+    for variant in Product.objects.filter(parent_id__in=product_ids, active=True):
+        active_variants.setdefault(variant.parent_id, []).append(variant)
+        first_variants.setdefault(variant.parent_id, variant)
+    for variants in active_variants.values():
+        variants.sort(key=lambda k: k.variant_position)
+
+    default_variants = Product.objects.in_bulk(
+        [product.default_variant_id for product in products if product.default_variant_id]
+    )
+
+    result = {}
+    for product in products:
+        variants_option = None
+        category_id = first_categories.get(product.id)
+        while category_id:
+            if category_id in category_options:
+                variants_option = category_options[category_id]
+                break
+            category_id = category_parents.get(category_id)
+
+        if variants_option is None:
+            variants_option = export.variants_option
+
+        variants = active_variants.get(product.id, [])
+        if variants_option == CATEGORY_VARIANTS_DEFAULT:
+            default_variant = default_variants.get(product.default_variant_id)
+            if default_variant is None:
+                default_variant = first_variants.get(product.id)
+            variants = [default_variant] if default_variant else []
+        elif variants_option == CATEGORY_VARIANTS_CHEAPEST:
+            for variant in variants:
+                variant.parent = product
+            variants = [min(variants, key=lambda k: k.get_price(request))] if variants else []
+        elif variants_option != CATEGORY_VARIANTS_ALL:
+            variants = []
+
+        for variant in variants:
+            variant.parent = product
+        result[product.id] = variants
+
+    return result
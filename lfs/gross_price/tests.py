@@ -1,7 +1,9 @@
 # django imports
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.sessions.backends.file import SessionStore
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 # lfs imports
 from lfs.catalog.settings import CHOICES_YES
@@ -12,6 +14,7 @@ from lfs.catalog.settings import STANDARD_PRODUCT
 from lfs.catalog.settings import LIST
 
 from lfs.catalog.models import Product
+from lfs.gross_price.calculator import GrossPriceCalculator
 from lfs.tax.models import Tax
 from lfs.tests.utils import RequestFactory
 
@@ -365,3 +368,47 @@ class GrossPriceTestCase(TestCase):
         # Product 2 doesn't have a assigned tax rate, hence the tax should 0.0
         tax = self.p2.get_tax(self.request)
         self.assertEqual("%.2f" % tax, "0.00")
+
+    def test_bulk_prices(self):
+        """Tests that the bulk prices equal the prices of the single products."""
+        self.p1.for_sale = True
+        self.p1.save()
+        self.v1.active_for_sale_price = True
+        self.v1.save()
+
+        products = [self.p1, self.p2, self.v1]
+        prices = GrossPriceCalculator.bulk_prices(self.request, products)
+
+        for product in products:
+            request = self.get_request()
+            self.assertEqual(prices[product.id]["for_sale"], product.get_for_sale())
+            self.assertEqual(prices[product.id]["price_gross"], product.get_price_gross(request))
+            self.assertEqual(prices[product.id]["price_net"], product.get_price_net(request))
+            self.assertEqual(prices[product.id]["standard_price_gross"], product.get_standard_price_gross(request))
+            self.assertEqual(prices[product.id]["base_price_gross"], product.get_base_price_gross(request))
+            self.assertEqual(prices[product.id]["base_packing_price_gross"], None)
+
+        # The price of the product with variants is the one of the default variant
+        self.assertAlmostEqual(prices[self.p1.id]["price_gross"], 1.5)
+
+    def test_bulk_prices_queries(self):
+        """Tests that the amount of queries doesn't depend on the amount of products."""
+        for i in range(5):
+            Product.objects.create(name="Product %s" % i, slug="product-p%s" % i, tax=self.t1, price=i, active=True)
+
+        products = list(Product.objects.filter(parent=None))
+        GrossPriceCalculator.bulk_prices(self.get_request(), products)
+
+        with CaptureQueriesContext(connection) as few:
+            GrossPriceCalculator.bulk_prices(self.get_request(), products[:2])
+
+        with CaptureQueriesContext(connection) as many:
+            GrossPriceCalculator.bulk_prices(self.get_request(), products)
+
+        self.assertEqual(len(few), len(many))
+
+    def get_request(self):
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        request.user = AnonymousUser()
+        return request
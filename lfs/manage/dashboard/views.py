@@ -1,74 +1,77 @@
+# python imports
+from datetime import timedelta
+
 # django imports
 from django.contrib.auth.decorators import permission_required
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import Sum
 from django.shortcuts import render
 from django.utils import timezone
-from django.db.models import Sum
+
+# lfs imports
 from lfs.catalog.models import Product, Category
-from lfs.marketing.utils import get_orders
-from lfs.order.models import Order, OrderItem
-from lfs.marketing.models import OrderRatingMail
+from lfs.marketing.models import OrderStatistics
+from lfs.marketing.models import ProductSalesStatistics
+from lfs.marketing.statistics import get_date
 
 
 @permission_required("core.manage_shop")
 def dashboard(request, template_name="manage/dashboard/dashboard.html"):
-    """Dashboard view showing shop statistics"""
-    total_products = Product.objects.count()
-    active_products = Product.objects.filter(active=True).count()
-    inactive_products = total_products - active_products
-
-    total_categories = Category.objects.count()
-    visible_categories = Category.objects.filter(exclude_from_navigation=False).count()
-    hidden_categories = total_categories - visible_categories
+    """Dashboard view showing shop statistics.
 
-    total_orders = Order.objects.count()
+    The order numbers are read from the aggregated OrderStatistics and
+    ProductSalesStatistics, see lfs.marketing.statistics.
+    """
+    products = Product.objects.aggregate(total=Count("id"), active=Count("id", filter=Q(active=True)))
+    categories = Category.objects.aggregate(
+        total=Count("id"), visible=Count("id", filter=Q(exclude_from_navigation=False))
+    )
 
-    # Calculate orders this month (from 1st day of current month)
-    now = timezone.now()
-    first_day_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    orders_this_month = Order.objects.filter(created__gte=first_day_of_month).count()
+    today = timezone.localdate()
+    first_day_of_month = today.replace(day=1)
+    first_day_of_year = today.replace(month=1, day=1)
 
-    # Calculate orders this year (from January 1st)
-    first_day_of_year = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-    orders_this_year = Order.objects.filter(created__gte=first_day_of_year).count()
+    # Rating mails are sent for orders which are closed for 14 days, see
+    # lfs.marketing.utils.get_orders. Only whole days are taken into account.
+    rating_mail_limit = get_date(timezone.now() - timedelta(days=14))
 
-    # Calculate eligible rating mails (orders without rating mail sent)
-    orders_with_rating_mail = OrderRatingMail.objects.values_list("order_id", flat=True)
-    eligible_rating_mails = get_orders().count() - len(orders_with_rating_mail)
+    orders = OrderStatistics.objects.aggregate(
+        total_orders=Sum("orders"),
+        orders_this_month=Sum("orders", filter=Q(date__gte=first_day_of_month)),
+        orders_this_year=Sum("orders", filter=Q(date__gte=first_day_of_year)),
+        revenue_this_month=Sum("revenue", filter=Q(date__gte=first_day_of_month)),
+        revenue_this_year=Sum("revenue", filter=Q(date__gte=first_day_of_year)),
+        eligible_rating_mails=Sum(F("closed_orders") - F("rating_mails"), filter=Q(date__lt=rating_mail_limit)),
+    )
+    orders = dict((key, value or 0) for (key, value) in orders.items())
 
     # Find best selling product
     best_selling_product = None
     best_selling_count = 0
 
-    if total_orders > 0:
-        # Get product sales count from order items
-        product_sales = (
-            OrderItem.objects.values("product")
-            .annotate(total_quantity=Sum("product_amount"))
-            .order_by("-total_quantity")
-        )
-
-        if product_sales.exists():
-            best_selling_product_id = product_sales.first()["product"]
-            best_selling_count = product_sales.first()["total_quantity"]
-            try:
-                best_selling_product = Product.objects.get(id=best_selling_product_id)
-            except Product.DoesNotExist:
-                best_selling_product = None
-                best_selling_count = 0
+    best_selling = (
+        ProductSalesStatistics.objects.values("product")
+        .annotate(total_quantity=Sum("amount"))
+        .order_by("-total_quantity", "product")
+        .first()
+    )
+    if best_selling is not None and best_selling["total_quantity"] > 0:
+        best_selling_product = Product.objects.filter(pk=best_selling["product"]).first()
+        if best_selling_product is not None:
+            best_selling_count = best_selling["total_quantity"]
 
     context = {
-        "total_products": total_products,
-        "active_products": active_products,
-        "inactive_products": inactive_products,
-        "total_categories": total_categories,
-        "visible_categories": visible_categories,
-        "hidden_categories": hidden_categories,
-        "total_orders": total_orders,
-        "orders_this_month": orders_this_month,
-        "orders_this_year": orders_this_year,
-        "eligible_rating_mails": eligible_rating_mails,
+        "total_products": products["total"],
+        "active_products": products["active"],
+        "inactive_products": products["total"] - products["active"],
+        "total_categories": categories["total"],
+        "visible_categories": categories["visible"],
+        "hidden_categories": categories["total"] - categories["visible"],
         "best_selling_product": best_selling_product,
         "best_selling_count": best_selling_count,
     }
+    context.update(orders)
 
     return render(request, template_name, context)
@@ -1,12 +1,13 @@
 from django.conf import settings
 from django.urls import reverse
 from django.shortcuts import render
-from django.core.cache import cache
 from django.core.paginator import Paginator, EmptyPage, InvalidPage
 from django.template.loader import render_to_string
 
 from django.utils.translation import ngettext
+from lfs.caching.utils import get_tagged
 from lfs.caching.utils import lfs_get_object_or_404
+from lfs.caching.utils import set_tagged
 from lfs.manufacturer.models import Manufacturer
 from lfs.core.utils import lfs_pagination
 
@@ -93,7 +94,7 @@ def manufacturer_products(request, slug, start=1, template_name="lfs/manufacture
     if price_filter:
         sub_cache_key += "-%s-%s" % (price_filter["min"], price_filter["max"])
 
-    temp = cache.get(cache_key)
+    temp = get_tagged(cache_key)
     if temp is not None:
         try:
             return temp[sub_cache_key]
@@ -177,5 +178,5 @@ def manufacturer_products(request, slug, start=1, template_name="lfs/manufacture
     )
 
     temp[sub_cache_key] = result
-    cache.set(cache_key, temp)
+    set_tagged(cache_key, temp, ["shop"])
     return result
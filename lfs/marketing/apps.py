@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class LfsMarketingAppConfig(AppConfig):
+    name = "lfs.marketing"
+
+    def ready(self):
+        from . import listeners  # NOQA
@@ -0,0 +1,120 @@
+# django imports
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+# lfs imports
+from lfs.core.signals import order_created
+from lfs.marketing.models import OrderRatingMail
+from lfs.marketing.statistics import get_order_contribution
+from lfs.marketing.statistics import update_order_statistics
+from lfs.marketing.statistics import update_product_sales_statistics
+from lfs.marketing.statistics import update_rating_mail_statistics
+from lfs.order.models import Order
+from lfs.order.models import OrderItem
+
+
+# Order
+@receiver(pre_save, sender=Order)
+def order_pre_save_listener(sender, instance, raw=False, **kwargs):
+    """Remembers the contribution of the saved order to the statistics, as
+    it is stored in the database.
+    """
+    instance._statistics_contribution = None
+    if raw or instance._state.adding:
+        return
+    try:
+        old = Order.objects.only("created", "price", "state", "state_modified").get(pk=instance.pk)
+    except Order.DoesNotExist:
+        return
+    instance._statistics_contribution = get_order_contribution(old)
+
+
+@receiver(post_save, sender=Order)
+def order_post_save_listener(sender, instance, raw=False, **kwargs):
+    """Updates the statistics when an order has been created, its state has
+    been changed (order_state_changed is sent after the order has been saved)
+    or its price has been changed.
+    """
+    if raw:
+        return
+    old = getattr(instance, "_statistics_contribution", None)
+    new = get_order_contribution(instance)
+    if old == new:
+        return
+
+    has_rating_mail = False
+    if (old and old[2]) != (new and new[2]):
+        has_rating_mail = OrderRatingMail.objects.filter(order=instance).exists()
+    update_order_statistics(old, new, has_rating_mail)
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted_listener(sender, instance, **kwargs):
+    # The rating mails have been removed from the statistics already, as
+    # they are deleted before the order.
+    update_order_statistics(get_order_contribution(instance), None)
+
+
+# OrderItem
+@receiver(pre_save, sender=OrderItem)
+def order_item_pre_save_listener(sender, instance, raw=False, **kwargs):
+    instance._statistics_sale = None
+    if raw or instance._state.adding:
+        return
+    instance._statistics_sale = (
+        OrderItem.objects.filter(pk=instance.pk).values_list("product_id", "product_amount").first()
+    )
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_post_save_listener(sender, instance, raw=False, **kwargs):
+    """Updates the sold amounts per product when an order item has been
+    added or changed.
+    """
+    if raw:
+        return
+    old = getattr(instance, "_statistics_sale", None)
+    new = (instance.product_id, instance.product_amount)
+    if old == new:
+        return
+
+    created = instance.order.created
+    if old is not None:
+        update_product_sales_statistics(created, old[0], -(old[1] or 0))
+    update_product_sales_statistics(created, new[0], new[1] or 0)
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_deleted_listener(sender, instance, **kwargs):
+    created = Order.objects.filter(pk=instance.order_id).values_list("created", flat=True).first()
+    if created is not None:
+        update_product_sales_statistics(created, instance.product_id, -(instance.product_amount or 0))
+
+
+@receiver(order_created)
+def order_created_listener(sender, **kwargs):
+    """Updates the sold amounts per product for a new order. The items of new
+    orders are inserted via bulk_create (see lfs.order.utils.add_order),
+    which doesn't send the model signals.
+    """
+    sales = {}
+    for product_id, amount in sender.items.filter(product__isnull=False).values_list("product_id", "product_amount"):
+        sales[product_id] = sales.get(product_id, 0) + (amount or 0)
+    for product_id, amount in sales.items():
+        update_product_sales_statistics(sender.created, product_id, amount)
+
+
+# OrderRatingMail
+@receiver(post_save, sender=OrderRatingMail)
+def order_rating_mail_saved_listener(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        update_rating_mail_statistics(instance.order, 1)
+
+
+@receiver(post_delete, sender=OrderRatingMail)
+def order_rating_mail_deleted_listener(sender, instance, **kwargs):
+    order = Order.objects.filter(pk=instance.order_id).only("state", "state_modified").first()
+    if order is not None:
+        update_rating_mail_statistics(order, -1)
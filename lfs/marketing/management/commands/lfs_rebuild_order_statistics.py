@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Recalculates the order statistics which are shown on the dashboard."
+
+    def handle(self, *args, **options):
+        from lfs.marketing.models import OrderStatistics
+        from lfs.marketing.statistics import rebuild_order_statistics
+
+        rebuild_order_statistics()
+        self.stdout.write("Calculated the statistics of %s days" % OrderStatistics.objects.count())
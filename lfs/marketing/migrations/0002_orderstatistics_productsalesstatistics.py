@@ -0,0 +1,55 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_order_statistics(apps, schema_editor):
+    """
+    Creates the statistics of all existing orders.
+    """
+    from lfs.marketing.statistics import rebuild_order_statistics
+
+    rebuild_order_statistics(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0016_categoryclosure"),
+        ("order", "0005_alter_order_state"),
+        ("marketing", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderStatistics",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField(unique=True, verbose_name="Date")),
+                ("orders", models.IntegerField(default=0, verbose_name="Orders")),
+                ("revenue", models.FloatField(default=0.0, verbose_name="Revenue")),
+                ("closed_orders", models.IntegerField(default=0, verbose_name="Closed orders")),
+                ("rating_mails", models.IntegerField(default=0, verbose_name="Rating mails")),
+            ],
+            options={
+                "ordering": ["date"],
+            },
+        ),
+        migrations.CreateModel(
+            name="ProductSalesStatistics",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("month", models.DateField(verbose_name="Month")),
+                ("amount", models.FloatField(default=0.0, verbose_name="Amount")),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="catalog.product", verbose_name="Product"
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("month", "product")},
+            },
+        ),
+        migrations.RunPython(create_order_statistics, migrations.RunPython.noop),
+    ]
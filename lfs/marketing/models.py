@@ -57,3 +57,74 @@ class OrderRatingMail(models.Model):
 
     class Meta:
         app_label = "marketing"
+
+
+class OrderStatistics(models.Model):
+    """Stores the aggregated numbers of the orders per day, which are shown
+    on the dashboard.
+
+    The rows are maintained by the listeners of lfs.marketing, see
+    lfs.marketing.statistics.
+
+    **Attributes:**
+
+    date
+        The day the numbers belong to.
+
+    orders
+        The amount of orders which have been created on this day.
+
+    revenue
+        The total price of the orders which have been created on this day.
+
+    closed_orders
+        The amount of orders which have been closed on this day and are still
+        closed.
+
+    rating_mails
+        The amount of closed_orders for which a rating mail has been sent.
+    """
+
+    date = models.DateField(_("Date"), unique=True)
+    orders = models.IntegerField(_("Orders"), default=0)
+    revenue = models.FloatField(_("Revenue"), default=0.0)
+    closed_orders = models.IntegerField(_("Closed orders"), default=0)
+    rating_mails = models.IntegerField(_("Rating mails"), default=0)
+
+    class Meta:
+        ordering = ["date"]
+        app_label = "marketing"
+
+    def __str__(self):
+        return "%s (%s)" % (self.date, self.orders)
+
+
+class ProductSalesStatistics(models.Model):
+    """Stores the sold amount of a product per month, which is shown on the
+    dashboard.
+
+    The rows are maintained by the listeners of lfs.marketing, see
+    lfs.marketing.statistics.
+
+    **Attributes:**
+
+    month
+        The first day of the month the orders have been created in.
+
+    product
+        The sold product (or variant).
+
+    amount
+        The sold amount.
+    """
+
+    month = models.DateField(_("Month"))
+    product = models.ForeignKey(Product, models.CASCADE, verbose_name=_("Product"))
+    amount = models.FloatField(_("Amount"), default=0.0)
+
+    class Meta:
+        unique_together = ("month", "product")
+        app_label = "marketing"
+
+    def __str__(self):
+        return "%s %s (%s)" % (self.month, self.product_id, self.amount)
@@ -0,0 +1,146 @@
+# django imports
+from django.apps import apps as global_apps
+from django.db import IntegrityError
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+# lfs imports
+from lfs.marketing.models import OrderStatistics
+from lfs.marketing.models import ProductSalesStatistics
+from lfs.order.settings import CLOSED
+
+
+def get_order_contribution(order):
+    """Returns what given order contributes to the OrderStatistics: a tuple
+    of the day it has been created, its price and the day it has been closed
+    (None if it isn't closed).
+    """
+    if order.created is None:
+        return None
+    closed = get_date(order.state_modified) if order.state == CLOSED else None
+    return (get_date(order.created), order.price, closed)
+
+
+def update_order_statistics(old, new, has_rating_mail=False):
+    """Moves the contribution of an order from ``old`` to ``new`` (see
+    get_order_contribution). Either of them might be None, when the order
+    has been created or deleted. ``has_rating_mail`` states whether a rating
+    mail has been sent for the order.
+    """
+    if old == new:
+        return
+
+    if old is not None:
+        _add_order_statistics(old[0], orders=-1, revenue=-old[1])
+        if old[2] is not None:
+            _add_order_statistics(old[2], closed_orders=-1, rating_mails=-int(has_rating_mail))
+
+    if new is not None:
+        _add_order_statistics(new[0], orders=1, revenue=new[1])
+        if new[2] is not None:
+            _add_order_statistics(new[2], closed_orders=1, rating_mails=int(has_rating_mail))
+
+
+def update_rating_mail_statistics(order, amount):
+    """Adds ``amount`` rating mails to the statistics of given order, if it is
+    closed.
+    """
+    if order.state == CLOSED:
+        _add_order_statistics(get_date(order.state_modified), rating_mails=amount)
+
+
+def update_product_sales_statistics(created, product_id, amount):
+    """Adds ``amount`` to the sales of the product with given id within the
+    month of ``created``.
+    """
+    if product_id is None or not amount:
+        return
+    _add(ProductSalesStatistics, {"month": get_date(created).replace(day=1), "product_id": product_id}, amount=amount)
+
+
+def rebuild_order_statistics(apps=global_apps):
+    """Calculates all OrderStatistics and ProductSalesStatistics from scratch.
+
+    This is needed once for existing orders and after orders have been
+    changed without sending the model signals, e.g. via QuerySet.update.
+    ``apps`` might be the registry of a migration.
+    """
+    Order = apps.get_model("order", "Order")
+    OrderItem = apps.get_model("order", "OrderItem")
+    OrderStatistics = apps.get_model("marketing", "OrderStatistics")
+    ProductSalesStatistics = apps.get_model("marketing", "ProductSalesStatistics")
+
+    days = {}
+    for row in Order.objects.annotate(day=TruncDate("created")).values("day").annotate(
+        orders=Count("id"), revenue=Sum("price")
+    ):
+        days[row["day"]] = OrderStatistics(date=row["day"], orders=row["orders"], revenue=row["revenue"] or 0.0)
+
+    closed = (
+        Order.objects.filter(state=CLOSED)
+        .annotate(day=TruncDate("state_modified"))
+        .values("day")
+        .annotate(closed_orders=Count("id", distinct=True), rating_mails=Count("orderratingmail__order", distinct=True))
+    )
+    for row in closed:
+        statistics = days.setdefault(row["day"], OrderStatistics(date=row["day"]))
+        statistics.closed_orders = row["closed_orders"]
+        statistics.rating_mails = row["rating_mails"]
+
+    sales = (
+        OrderItem.objects.filter(product__isnull=False)
+        .annotate(month=TruncMonth("order__created"))
+        .values("month", "product")
+        .annotate(amount=Sum("product_amount"))
+    )
+
+    with transaction.atomic():
+        OrderStatistics.objects.all().delete()
+        OrderStatistics.objects.bulk_create(days.values(), batch_size=1000)
+
+        ProductSalesStatistics.objects.all().delete()
+        ProductSalesStatistics.objects.bulk_create(
+            (
+                ProductSalesStatistics(
+                    month=get_date(row["month"]).replace(day=1), product_id=row["product"], amount=row["amount"] or 0.0
+                )
+                for row in sales.iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+def get_date(value):
+    """Returns the date of given datetime within the current time zone."""
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date() if hasattr(value, "date") else value
+
+
+def _add_order_statistics(date, **amounts):
+    _add(OrderStatistics, {"date": date}, **amounts)
+
+
+def _add(model, lookup, **amounts):
+    """Adds given amounts to the row of given model which matches lookup,
+    which is created if it doesn't exist yet.
+    """
+    amounts = dict((name, amount) for (name, amount) in amounts.items() if amount)
+    if not amounts:
+        return
+
+    updates = dict((name, F(name) + amount) for (name, amount) in amounts.items())
+    if model.objects.filter(**lookup).update(**updates):
+        return
+
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **amounts)
+    except IntegrityError:
+        # The row has been created concurrently
+        model.objects.filter(**lookup).update(**updates)
@@ -7,7 +7,12 @@ from lfs.addresses.models import Address
 from lfs.catalog.models import Category
 from lfs.catalog.models import Product
 import lfs.marketing.utils
+from lfs.marketing.models import OrderRatingMail
+from lfs.marketing.models import OrderStatistics
+from lfs.marketing.models import ProductSalesStatistics
 from lfs.marketing.models import Topseller
+from lfs.marketing.statistics import get_date
+from lfs.marketing.statistics import rebuild_order_statistics
 from lfs.marketing.utils import calculate_product_sales
 from lfs.order.models import Order
 from lfs.order.models import OrderItem
@@ -281,3 +286,105 @@ class TopsellerUtilsTestCase(TestCase):
 
         self.assertEqual(ts[0], self.p4)
         self.assertEqual(ts[1], self.p3)
+
+
+class OrderStatisticsTestCase(TestCase):
+    """Tests the aggregated order statistics of the dashboard."""
+
+    fixtures = ["lfs_shop.xml", "lfs_user.xml"]
+
+    def setUp(self):
+        self.p1 = Product.objects.create(name="Product 1", slug="product-1", active=True)
+        self.p2 = Product.objects.create(name="Product 2", slug="product-2", active=True)
+
+        self.address = Address.objects.create()
+        self.o1 = Order.objects.create(invoice_address=self.address, shipping_address=self.address, price=10.0)
+        OrderItem.objects.create(order=self.o1, product_amount=2, product=self.p1)
+        OrderItem.objects.create(order=self.o1, product_amount=1, product=self.p2)
+
+        self.o2 = Order.objects.create(invoice_address=self.address, shipping_address=self.address, price=5.0)
+        OrderItem.objects.create(order=self.o2, product_amount=3, product=self.p1)
+
+        self.today = get_date(timezone.now())
+
+    def get_statistics(self, date=None):
+        return OrderStatistics.objects.get(date=date or self.today)
+
+    def get_sales(self):
+        return dict(ProductSalesStatistics.objects.exclude(amount=0).values_list("product_id", "amount"))
+
+    def get_rows(self):
+        rows = OrderStatistics.objects.values_list("date", "orders", "revenue", "closed_orders", "rating_mails")
+        return [row for row in rows if any(row[1:])]
+
+    def assertRebuildEqual(self):
+        """Asserts that the incrementally maintained rows equal the
+        recalculated ones, apart from rows which dropped to zero.
+        """
+        rows = self.get_rows()
+        sales = self.get_sales()
+        rebuild_order_statistics()
+        self.assertEqual(self.get_rows(), rows)
+        self.assertEqual(self.get_sales(), sales)
+
+    def test_created(self):
+        statistics = self.get_statistics()
+        self.assertEqual(statistics.orders, 2)
+        self.assertEqual(statistics.revenue, 15.0)
+        self.assertEqual(statistics.closed_orders, 0)
+        self.assertEqual(self.get_sales(), {self.p1.id: 5.0, self.p2.id: 1.0})
+        self.assertRebuildEqual()
+
+    def test_price_changed(self):
+        self.o1.price = 20.0
+        self.o1.save()
+        self.assertEqual(self.get_statistics().revenue, 25.0)
+        self.assertRebuildEqual()
+
+    def test_item_changed(self):
+        item = self.o2.items.get()
+        item.product = self.p2
+        item.product_amount = 4
+        item.save()
+        self.assertEqual(self.get_sales(), {self.p1.id: 2.0, self.p2.id: 5.0})
+
+        item.delete()
+        self.assertEqual(self.get_sales(), {self.p1.id: 2.0, self.p2.id: 1.0})
+        self.assertRebuildEqual()
+
+    def test_closed(self):
+        closed = timezone.now() - timedelta(days=20)
+        self.o1.state = CLOSED
+        self.o1.state_modified = closed
+        self.o1.save()
+
+        statistics = self.get_statistics(get_date(closed))
+        self.assertEqual(statistics.orders, 0)
+        self.assertEqual(statistics.closed_orders, 1)
+        self.assertEqual(statistics.rating_mails, 0)
+
+        OrderRatingMail.objects.create(order=self.o1)
+        self.assertEqual(self.get_statistics(get_date(closed)).rating_mails, 1)
+        self.assertRebuildEqual()
+
+        # Reopening the order removes it and its rating mail
+        self.o1.state = 0
+        self.o1.save()
+        statistics = self.get_statistics(get_date(closed))
+        self.assertEqual(statistics.closed_orders, 0)
+        self.assertEqual(statistics.rating_mails, 0)
+        self.assertRebuildEqual()
+
+    def test_deleted(self):
+        self.o1.state = CLOSED
+        self.o1.save()
+        OrderRatingMail.objects.create(order=self.o1)
+
+        self.o1.delete()
+        statistics = self.get_statistics()
+        self.assertEqual(statistics.orders, 1)
+        self.assertEqual(statistics.revenue, 5.0)
+        self.assertEqual(statistics.closed_orders, 0)
+        self.assertEqual(statistics.rating_mails, 0)
+        self.assertEqual(self.get_sales(), {self.p1.id: 3.0})
+        self.assertRebuildEqual()
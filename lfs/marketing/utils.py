@@ -69,16 +69,11 @@ def get_topseller_for_category(category, limit=5):
     if topseller is not None:
         return topseller
 
-    # 1. Get all sub catgegories of passed category
-    categories = [category]
-    categories.extend(category.get_all_children())
-    category_ids = [c.id for c in categories]
-
-    # Get all the most saled products for this categories
-    pss = ProductSales.objects.filter(product__categories__in=category_ids).order_by("-sales")[:limit]
+    # Get all the most saled products of the category and its sub categories
+    pss = ProductSales.objects.filter(product__categories__ancestor_links__ancestor=category).order_by("-sales")[:limit]
 
     objects = [ps.product for ps in pss]
-    for explicit_ts in Topseller.objects.filter(product__categories__in=category_ids):
+    for explicit_ts in Topseller.objects.filter(product__categories__ancestor_links__ancestor=category):
         if explicit_ts.product.is_active():
             # Remove explicit_ts if it's already in the object list
             if explicit_ts.product in objects:
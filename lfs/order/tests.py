@@ -4,6 +4,7 @@ import datetime
 from django.contrib.auth.models import User
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.sessions.backends.file import SessionStore
+from django.db.models.signals import post_save
 from django.test import TestCase
 
 from lfs.catalog.models import Product, DeliveryTime
@@ -19,7 +20,8 @@ from lfs.order.models import OrderItem
 from django.test import override_settings
 
 from lfs.checkout.views import thank_you
-from lfs.order.utils import add_order, order_to_tracking_snapshot
+import lfs.order.utils
+from lfs.order.utils import add_order, get_next_order_number, order_to_tracking_snapshot
 from lfs.order.settings import SUBMITTED
 from lfs.payment.models import PaymentMethod
 from lfs.shipping.models import ShippingMethod
@@ -216,6 +218,65 @@ class OrderTestCase(TestCase):
         # delivery time should of the selected shipping method should be saved with order
         self.assertTrue(order.delivery_time is not None)
 
+    def test_add_order_saves_order_once(self):
+        """Tests that the order is inserted just once, with its number."""
+        numbers = []
+
+        def listener(sender, instance, created, **kwargs):
+            numbers.append((created, instance.number))
+
+        post_save.connect(listener, sender=Order)
+        try:
+            order = add_order(self.request)
+        finally:
+            post_save.disconnect(listener, sender=Order)
+
+        self.assertEqual(numbers, [(True, order.number)])
+        self.assertTrue(order.number)
+        self.assertEqual(Order.objects.get(pk=order.pk).number, str(order.number))
+
+        # Both addresses belong to the order
+        self.assertEqual(order.invoice_address.order, order)
+        self.assertEqual(order.shipping_address.order, order)
+        self.assertEqual(Address.objects.filter(order=order).count(), 2)
+
+    def test_add_order_decreases_stock_amount(self):
+        """Tests that the stock amounts of managed products are decreased."""
+        Product.objects.filter(pk=self.p1.pk).update(manage_stock_amount=True, stock_amount=10)
+        Product.objects.filter(pk=self.p2.pk).update(manage_stock_amount=False, stock_amount=10)
+
+        add_order(self.request)
+
+        self.assertEqual(Product.objects.get(pk=self.p1.pk).stock_amount, 8)
+        self.assertEqual(Product.objects.get(pk=self.p2.pk).stock_amount, 10)
+
+    def test_get_next_order_number(self):
+        """Tests that every order number is taken from the generator."""
+        from lfs_order_numbers.models import OrderNumberGenerator
+
+        OrderNumberGenerator.objects.create(id="order_number", last=41, format="A%04d")
+
+        self.assertEqual(get_next_order_number(self.request, None), "A0042")
+        self.assertEqual(get_next_order_number(self.request, None), "A0043")
+        self.assertEqual(OrderNumberGenerator.objects.get(id="order_number").last, 43)
+
+    @override_settings(LFS_ORDER_NUMBER_BLOCK_SIZE=10)
+    def test_get_next_order_number_block(self):
+        """Tests that order numbers are reserved as block."""
+        from lfs_order_numbers.models import OrderNumberGenerator
+
+        OrderNumberGenerator.objects.create(id="order_number", last=41, format="A%04d")
+
+        lfs.order.utils._order_number_blocks.clear()
+        try:
+            numbers = [get_next_order_number(self.request, None) for i in range(11)]
+            self.assertEqual(numbers, ["A%04d" % i for i in range(42, 53)])
+
+            # The second block has been reserved with the eleventh number
+            self.assertEqual(OrderNumberGenerator.objects.get(id="order_number").last, 61)
+        finally:
+            lfs.order.utils._order_number_blocks.clear()
+
     def test_order_to_tracking_snapshot_returns_neutral_dict(self):
         order = add_order(self.request)
         snapshot = order_to_tracking_snapshot(order)
@@ -1,11 +1,20 @@
 # python imports
+import threading
+from collections import deque
 from copy import deepcopy
 
 # django imports
 from django.conf import settings
+from django.db import IntegrityError
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import F
+from django.db.models import FloatField
+from django.db.models import When
 
 # lfs imports
 from lfs.cart import utils as cart_utils
+from lfs.catalog.models import Product
 from lfs.core.signals import order_created
 from lfs.core.utils import import_symbol
 from lfs.customer import utils as customer_utils
@@ -14,6 +23,11 @@ from lfs.order.models import OrderItem
 from lfs.order.models import OrderItemPropertyValue
 from lfs.voucher.utils import delete_current_voucher_number
 
+# Order numbers which have been reserved by the current process per order
+# number generator, see get_next_order_number
+_order_number_blocks = {}
+_order_number_blocks_lock = threading.Lock()
+
 
 def order_to_tracking_snapshot(order):
     """
@@ -92,18 +106,12 @@ def add_order(request):
         discounts,
     ) = cart.get_order_data(request)
 
-    # Copy addresses
-    invoice_address = deepcopy(invoice_address)
-    invoice_address.id = None
-    invoice_address.pk = None
-    invoice_address.save()
-
-    shipping_address = deepcopy(shipping_address)
-    shipping_address.id = None
-    shipping_address.pk = None
-    shipping_address.save()
+    # The prices of all items are calculated once
+    totals = cart_utils.get_cart_totals(request, cart)
+    items = [item for item in totals.items if item["obj"].amount != 0]
+    delivery_time = cart.get_delivery_time(request)
 
-    order = Order.objects.create(
+    order = Order(
         user=user,
         session=request.session.session_key,
         price=price,
@@ -117,34 +125,17 @@ def add_order(request):
         payment_method=payment_method,
         payment_price=payment_costs["price_gross"],
         payment_tax=payment_costs["tax"],
-        invoice_address=invoice_address,
-        shipping_address=shipping_address,
         message=request.POST.get("message", ""),
     )
 
-    delivery_time = cart.get_delivery_time(request)
-    if delivery_time:
-        OrderDeliveryTime.objects.create(
-            order=order, min=delivery_time.min, max=delivery_time.max, unit=delivery_time.unit
-        )
-
-    invoice_address.order = order
-    invoice_address.save()
-
-    shipping_address.order = order
-    shipping_address.save()
-
     requested_delivery_date = request.POST.get("requested_delivery_date", None)
     if requested_delivery_date is not None:
         order.requested_delivery_date = requested_delivery_date
-        order.save()
 
     if use_voucher:
-        voucher_data["voucher"].mark_as_used()
         order.voucher_number = voucher_data["voucher_number"]
         order.voucher_price = voucher_data["voucher_value"]
         order.voucher_tax = voucher_data["voucher_tax"]
-        order.save()
 
     # Copy bank account if one exists
     if customer.selected_bank_account:
@@ -154,73 +145,199 @@ def add_order(request):
         order.bank_name = bank_account.bank_name
         order.depositor = bank_account.depositor
 
-    order.save()
-
-    # Copy cart items
-    for cart_item in cart.get_items():
-        if cart_item.amount == 0:
-            continue
-        order_item = OrderItem.objects.create(
-            order=order,
-            price_net=cart_item.get_price_net(request),
-            price_gross=cart_item.get_price_gross(request),
-            tax=cart_item.get_tax(request),
-            product=cart_item.product,
-            product_sku=cart_item.product.sku,
-            product_name=cart_item.product.get_name(),
-            product_amount=cart_item.amount,
-            product_price_net=cart_item.product.get_price_net(request),
-            product_price_gross=cart_item.get_product_price_gross(request),
-            product_tax=cart_item.product.get_tax(request),
-        )
+    # The order is saved just once, hence the number is taken in advance. This
+    # happens outside of the transaction, which would keep the generator locked
+    # until the order is complete.
+    order.number = get_next_order_number(request, order)
 
-        cart_item.product.decrease_stock_amount(cart_item.amount)
+    with transaction.atomic():
+        # Copy addresses
+        order.invoice_address = _copy_address(invoice_address)
+        order.shipping_address = _copy_address(shipping_address)
+        order.save()
+
+        if use_voucher:
+            voucher_data["voucher"].mark_as_used()
+
+        for address in (order.invoice_address, order.shipping_address):
+            address.order = order
+            type(address).objects.filter(pk=address.pk).update(order=order)
+
+        if delivery_time:
+            OrderDeliveryTime.objects.create(
+                order=order, min=delivery_time.min, max=delivery_time.max, unit=delivery_time.unit
+            )
+
+        # Copy cart items
+        order_items = []
+        for item in items:
+            cart_item = item["obj"]
+            pc = totals.calculators[cart_item.product.id]
+            order_items.append(
+                OrderItem(
+                    order=order,
+                    price_net=item["price_net"],
+                    price_gross=item["price_gross"],
+                    tax=item["tax"],
+                    product=cart_item.product,
+                    product_sku=cart_item.product.sku,
+                    product_name=cart_item.product.get_name(),
+                    product_amount=cart_item.amount,
+                    product_price_net=pc.get_price_net(),
+                    product_price_gross=item["product_price_gross"],
+                    product_tax=pc.get_customer_tax(),
+                )
+            )
+
+        for discount in discounts:
+            order_items.append(
+                OrderItem(
+                    order=order,
+                    price_net=-discount["price_net"],
+                    price_gross=-discount["price_gross"],
+                    tax=-discount["tax"],
+                    product_sku=discount["sku"],
+                    product_name=discount["name"],
+                    product_amount=1,
+                    product_price_net=-discount["price_net"],
+                    product_price_gross=-discount["price_gross"],
+                    product_tax=-discount["tax"],
+                )
+            )
+
+        _bulk_create_order_items(order, order_items)
 
         # Copy properties to order
-        if cart_item.product.is_configurable_product():
-            for cpv in cart_item.properties.all():
-                OrderItemPropertyValue.objects.create(order_item=order_item, property=cpv.property, value=cpv.value)
-
-    for discount in discounts:
-        OrderItem.objects.create(
-            order=order,
-            price_net=-discount["price_net"],
-            price_gross=-discount["price_gross"],
-            tax=-discount["tax"],
-            product_sku=discount["sku"],
-            product_name=discount["name"],
-            product_amount=1,
-            product_price_net=-discount["price_net"],
-            product_price_gross=-discount["price_gross"],
-            product_tax=-discount["tax"],
-        )
+        property_values = []
+        for item, order_item in zip(items, order_items):
+            cart_item = item["obj"]
+            if cart_item.product.is_configurable_product():
+                for cpv in cart_item.properties.all():
+                    property_values.append(
+                        OrderItemPropertyValue(order_item=order_item, property=cpv.property, value=cpv.value)
+                    )
+        OrderItemPropertyValue.objects.bulk_create(property_values)
 
-    # Re-initialize selected addresses to be equal to default addresses for next order
-    customer.sync_default_to_selected_addresses()
-    customer.save()
+        _decrease_stock_amounts(items)
 
-    # Send signal before cart is deleted.
-    order_created.send(order, cart=cart, request=request)
+        # Re-initialize selected addresses to be equal to default addresses for next order
+        customer.sync_default_to_selected_addresses()
+        customer.save()
+
+        # Send signal before cart is deleted.
+        order_created.send(order, cart=cart, request=request)
+
+        cart.delete()
 
-    cart.delete()
     delete_current_voucher_number(request)
 
     # Note: Save order for later use in thank you page. The order will be
     # removed from the session if the thank you page has been called.
     request.session["order"] = order
 
+    return order
+
+
+def _copy_address(address):
+    """Saves a copy of passed address, which is assigned to the order."""
+    address = deepcopy(address)
+    address.id = None
+    address.pk = None
+    address.save()
+    return address
+
+
+def get_next_order_number(request, order):
+    """Returns the next order number for passed order from the order number
+    generator (see LFS_ORDER_NUMBER_GENERATOR).
+
+    The row of the generator is locked while the number is taken. If
+    LFS_ORDER_NUMBER_BLOCK_SIZE is greater than 1, blocks of numbers are
+    reserved at once and handed out from the process, so that the row is just
+    locked once per block.
+    """
     ong = import_symbol(settings.LFS_ORDER_NUMBER_GENERATOR)
+    block_size = getattr(settings, "LFS_ORDER_NUMBER_BLOCK_SIZE", 1)
+
+    if block_size <= 1:
+        with transaction.atomic():
+            order_numbers = _get_order_number_generator(ong)
+            _init_order_number_generator(order_numbers, request, order)
+            return order_numbers.get_next()
+
+    with _order_number_blocks_lock:
+        order_numbers, numbers = _order_number_blocks.get(ong, (None, None))
+        if not numbers:
+            with transaction.atomic():
+                order_numbers = _get_order_number_generator(ong)
+                numbers = deque(order_numbers.reserve(block_size))
+            _order_number_blocks[ong] = (order_numbers, numbers)
+
+        _init_order_number_generator(order_numbers, request, order)
+        return order_numbers.format_number(numbers.popleft())
+
+
+def _get_order_number_generator(ong):
+    """Returns the locked order number generator. Must be called within a
+    transaction.
+    """
     try:
-        order_numbers = ong.objects.get(id="order_number")
+        return ong.objects.select_for_update().get(id="order_number")
     except ong.DoesNotExist:
-        order_numbers = ong.objects.create(id="order_number")
+        try:
+            with transaction.atomic():
+                ong.objects.create(id="order_number")
+        except IntegrityError:
+            # The generator has been created concurrently
+            pass
+        return ong.objects.select_for_update().get(id="order_number")
+
 
+def _init_order_number_generator(order_numbers, request, order):
     try:
         order_numbers.init(request, order)
     except AttributeError:
         pass
 
-    order.number = order_numbers.get_next()
-    order.save()
 
-    return order
+def _bulk_create_order_items(order, order_items):
+    """Inserts passed order items at once. Signals are not sent, see
+    lfs.marketing.listeners.
+    """
+    OrderItem.objects.bulk_create(order_items)
+    if order_items and order_items[0].pk is None:
+        # The database doesn't return the ids of bulk inserted rows, which
+        # are needed for the property values.
+        ids = OrderItem.objects.filter(order=order).order_by("pk").values_list("pk", flat=True)
+        for order_item, pk in zip(order_items, ids):
+            order_item.pk = pk
+
+
+def _decrease_stock_amounts(items):
+    """Decreases the stock amounts of the products of the passed cart items
+    (see lfs.cart.utils.CartTotals) with one UPDATE.
+    """
+    from lfs.caching.listeners import update_product_cache
+
+    amounts = {}
+    products = {}
+    for item in items:
+        product = item["product"]
+        if product.manage_stock_amount:
+            amounts[product.id] = amounts.get(product.id, 0) + item["obj"].amount
+            products[product.id] = product
+
+    if not amounts:
+        return
+
+    Product.objects.filter(pk__in=amounts.keys()).update(
+        stock_amount=Case(
+            *[When(pk=product_id, then=F("stock_amount") - amount) for (product_id, amount) in amounts.items()],
+            output_field=FloatField(),
+        )
+    )
+
+    # The products aren't saved, hence the caches have to be updated
+    # explicitly.
+    for product in products.values():
+        update_product_cache(product)
@@ -4,18 +4,19 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 # lfs imports
+from lfs.caching.utils import SimpleCacheManager
 from lfs.criteria.base import Criteria
 import lfs.payment.settings
 from lfs.tax.models import Tax
 
 
-class ActivePaymentMethodManager(models.Manager):
+class ActivePaymentMethodManager(SimpleCacheManager):
     """
     A manager which return just valid shipping methods.
     """
 
     def active(self):
-        return super(ActivePaymentMethodManager, self).get_query_set().filter(active=True)
+        return super(ActivePaymentMethodManager, self).get_queryset().filter(active=True)
 
 
 class PaymentMethod(models.Model, Criteria):
@@ -30,11 +30,7 @@ def get_valid_payment_methods(request):
     Returns all valid payment methods (aka. selectable) for given request as
     list.
     """
-    result = []
-    for pm in PaymentMethod.objects.filter(active=True):
-        if pm.is_valid(request):
-            result.append(pm)
-    return result
+    return criteria_utils.get_valid(request, PaymentMethod.objects.filter(active=True))
 
 
 def get_default_payment_method(request):
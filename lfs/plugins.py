@@ -3,6 +3,7 @@ import math
 
 # django imports
 from django import forms
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
 
 # lfs imports
@@ -59,6 +60,39 @@ class OrderNumberGenerator(models.Model):
         """
         raise NotImplementedError
 
+    def reserve(self, amount):
+        """
+        Reserves ``amount`` consecutive order numbers at once and returns them
+        unformatted as list. This is used instead of ``get_next`` if
+        ``LFS_ORDER_NUMBER_BLOCK_SIZE`` is set and is called on a row which is
+        locked via ``select_for_update``.
+
+        The default implementation increases an integer field ``last`` if the
+        generator has one, otherwise it calls ``get_next`` ``amount`` times.
+        """
+        try:
+            self._meta.get_field("last")
+        except FieldDoesNotExist:
+            return [self.get_next(formatted=False) for i in range(amount)]
+
+        first = self.last + 1
+        self.last += amount
+        self.save()
+        return list(range(first, self.last + 1))
+
+    def format_number(self, number):
+        """
+        Returns the passed order number, which has been reserved via
+        ``reserve``, within the stored format (see ``get_next``).
+
+        The default implementation uses the field ``format`` if the generator
+        has one.
+        """
+        format = getattr(self, "format", None)
+        if format:
+            return format % number
+        return number
+
     def exclude_form_fields(self):
         """
         Returns a list of fields, which are excluded from the model form, see
@@ -171,11 +205,96 @@ class PriceCalculator(object):
 
     request
         The current request.
+
+    **Keyword arguments (optional):**
+
+    default_variant, product_tax_rate, customer_tax_rate
+        Values which have been loaded in advance for several products, see
+        ``bulk_prices``. If they are not passed they are looked up on demand.
     """
 
     def __init__(self, request, product, **kwargs):
         self.request = request
         self.product = product
+        self.preloaded = kwargs
+
+    @classmethod
+    def bulk_prices(cls, request, products, with_properties=True):
+        """
+        Returns the prices of the passed products as dictionary of product id
+        to a dictionary with the keys: ``for_sale``, ``price``,
+        ``standard_price``, ``base_price`` and ``base_packing_price`` plus
+        their ``_net`` and ``_gross`` variants. The base packing prices are
+        None if the product has no active packing unit.
+
+        Default variants, parents, product tax rates and customer tax rates
+        are loaded for all products at once, so that the amount of queries
+        doesn't depend on the amount of products. All products are calculated
+        with this class; see lfs.catalog.utils.get_product_prices for products
+        with different price calculators.
+
+        **Parameters:**
+
+        products
+            The products for which the prices are calculated.
+
+        with_properties
+            If a product is a configurable product and with_properties is True
+            the prices of the default properties are added to the prices.
+        """
+        calculators = cls.bulk_calculators(request, products)
+
+        prices = {}
+        for product in products:
+            pc = calculators[product.id]
+            price_net = pc.get_price_net(with_properties)
+            price_gross = pc.get_price_gross(with_properties)
+            base_price_amount = product.get_base_price_amount()
+            try:
+                base_prices = (
+                    pc.get_price(with_properties) / base_price_amount,
+                    price_net / base_price_amount,
+                    price_gross / base_price_amount,
+                )
+            except (TypeError, ZeroDivisionError):
+                base_prices = (0.0, 0.0, 0.0)
+
+            if product.get_active_packing_unit():
+                packing_amount = pc._calc_packing_amount()
+                base_packing_prices = (
+                    pc.get_price(with_properties) * packing_amount,
+                    price_net * packing_amount,
+                    price_gross * packing_amount,
+                )
+            else:
+                base_packing_prices = (None, None, None)
+
+            prices[product.id] = {
+                "for_sale": product.get_for_sale(),
+                "price": pc.get_price(with_properties),
+                "price_net": price_net,
+                "price_gross": price_gross,
+                "standard_price": pc.get_standard_price(with_properties),
+                "standard_price_net": pc.get_standard_price_net(with_properties),
+                "standard_price_gross": pc.get_standard_price_gross(with_properties),
+                "base_price": base_prices[0],
+                "base_price_net": base_prices[1],
+                "base_price_gross": base_prices[2],
+                "base_packing_price": base_packing_prices[0],
+                "base_packing_price_net": base_packing_prices[1],
+                "base_packing_price_gross": base_packing_prices[2],
+            }
+        return prices
+
+    @classmethod
+    def bulk_calculators(cls, request, products):
+        """
+        Returns a dictionary of product id to a price calculator of this class
+        for each of the passed products. The data the prices depend on is
+        loaded for all products at once, see ``bulk_prices``.
+        """
+        preloaded = _load_price_data(request, products)
+        return dict((product.id, cls(request, product, **preloaded[product.id])) for product in products)
 
     def get_effective_price(self, amount=1):
         """Effective price is used for sorting and filtering.
@@ -203,10 +322,7 @@ class PriceCalculator(object):
         amount
             The amount of products for which the price is calculated.
         """
-        object = self.product
-
-        if object.is_product_with_variants() and object.get_default_variant():
-            object = object.get_default_variant()
+        object = self._get_object()
 
         if object.get_for_sale():
             if object.is_variant() and not object.active_for_sale_price:
@@ -267,10 +383,7 @@ class PriceCalculator(object):
         amount
             The amount of products for which the price is calculated.
         """
-        object = self.product
-
-        if object.is_product_with_variants() and object.get_default_variant():
-            object = object.get_default_variant()
+        object = self._get_object()
 
         if object.is_variant() and not object.active_price:
             object = object.parent
@@ -328,10 +441,7 @@ class PriceCalculator(object):
         amount
             The amount of products for which the price is calculated.
         """
-        object = self.product
-
-        if object.is_product_with_variants() and object.get_default_variant():
-            object = object.get_default_variant()
+        object = self._get_object()
 
         if object.is_variant() and not object.active_for_sale_price:
             object = object.parent
@@ -475,6 +585,9 @@ class PriceCalculator(object):
         """
         Returns the tax rate for the current customer and product.
         """
+        if "customer_tax_rate" in self.preloaded:
+            return self.preloaded["customer_tax_rate"]
+
         from lfs.customer_tax.utils import get_customer_tax_rate
 
         return get_customer_tax_rate(self.request, self.product)
@@ -499,6 +612,9 @@ class PriceCalculator(object):
         Returns the stored tax rate of the product. If the product is a variant
         it returns the parent's tax rate.
         """
+        if "product_tax_rate" in self.preloaded:
+            return self.preloaded["product_tax_rate"]
+
         from django.core.cache import cache
 
         if self.product.is_variant():
@@ -528,6 +644,21 @@ class PriceCalculator(object):
         """
         raise NotImplementedError
 
+    def _get_object(self):
+        """
+        Returns the product the prices are taken from: the default variant for
+        a product with variants (if there is one), otherwise the product.
+        """
+        object = self.product
+        if object.is_product_with_variants():
+            if "default_variant" in self.preloaded:
+                default_variant = self.preloaded["default_variant"]
+            else:
+                default_variant = object.get_default_variant()
+            if default_variant:
+                object = default_variant
+        return object
+
     def _calc_product_tax_rate(self):
         """
         Returns the default tax rate for the product.
@@ -550,6 +681,56 @@ class PriceCalculator(object):
         return packs * packing_amount
 
 
+def _load_price_data(request, products):
+    """
+    Loads the data the prices of the passed products depend on, see
+    PriceCalculator.bulk_prices. Returns a dictionary of product id to the
+    keyword arguments of the price calculator.
+    """
+    from django.db.models import prefetch_related_objects
+    from lfs.catalog.models import Product
+    from lfs.customer_tax.utils import get_customer_tax_rates
+    from lfs.tax.models import Tax
+
+    prefetch_related_objects([product for product in products if product.is_variant()], "parent")
+
+    # Default variants, see Product.get_default_variant
+    with_variants = dict((product.id, product) for product in products if product.is_product_with_variants())
+    default_variants = Product.objects.in_bulk(
+        [product.default_variant_id for product in with_variants.values() if product.default_variant_id]
+    )
+    first_variants = {}
+    for variant in Product.objects.filter(parent_id__in=with_variants.keys(), active=True):
+        first_variants.setdefault(variant.parent_id, variant)
+
+    variants = {}
+    for product in with_variants.values():
+        variant = default_variants.get(product.default_variant_id) or first_variants.get(product.id)
+        if variant is not None and variant.parent_id == product.id:
+            variant.parent = product
+        variants[product.id] = variant
+
+    # Product tax rates, see PriceCalculator.get_product_tax_rate
+    tax_ids = set((product.parent if product.is_variant() else product).tax_id for product in products)
+    tax_rates = dict((tax.id, tax.rate) for tax in Tax.objects.filter(pk__in=tax_ids))
+    product_tax_rates = {}
+    for product in products:
+        tax_id = (product.parent if product.is_variant() else product).tax_id
+        product_tax_rates[product.id] = tax_rates.get(tax_id, 0.0)
+
+    customer_tax_rates = get_customer_tax_rates(request, products, product_tax_rates)
+
+    preloaded = {}
+    for product in products:
+        preloaded[product.id] = {
+            "product_tax_rate": product_tax_rates[product.id],
+            "customer_tax_rate": customer_tax_rates[product.id],
+        }
+        if product.id in variants:
+            preloaded[product.id]["default_variant"] = variants[product.id]
+    return preloaded
+
+
 class ShippingMethodPriceCalculator(object):
     """
     Base class from which all 3rd-party shipping method prices should inherit.
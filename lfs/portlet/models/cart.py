@@ -13,6 +13,10 @@ from portlets.models import Portlet
 class CartPortlet(Portlet):
     """Portlet to display the cart."""
 
+    # The rendered portlet is cached, see lfs.portlet.utils.render_portlets
+    cache_vary_on = ("cart", "prices")
+    cache_tags = ("shop", "products", "prices")
+
     class Meta:
         app_label = "portlet"
 
@@ -1,7 +1,5 @@
 # django imports
-from django.conf import settings
 from django import forms
-from django.core.cache import cache
 from django.db import models
 from django.template.loader import render_to_string
 
@@ -18,6 +16,10 @@ class CategoriesPortlet(Portlet):
     start_level = models.PositiveSmallIntegerField(default=1)
     expand_level = models.PositiveSmallIntegerField(default=1)
 
+    # The rendered portlet is cached, see lfs.portlet.utils.render_portlets
+    cache_vary_on = ("category", "product")
+    cache_tags = ("shop", "categories")
+
     class Meta:
         app_label = "portlet"
 
@@ -33,26 +35,12 @@ class CategoriesPortlet(Portlet):
         category = context.get("category")
         object = category or product
 
-        if object is None:
-            object_id = None
-        else:
-            object_id = object.id
-
-        cache_key = "%s-categories-portlet-%s-%s" % (
-            settings.CACHE_MIDDLEWARE_KEY_PREFIX,
-            object.__class__.__name__,
-            object_id,
-        )
-        result = cache.get(cache_key)
-        if result is not None:
-            return result
-
         current_categories = lfs.core.utils.get_current_categories(request, object)
 
         ct = lfs.core.utils.CategoryTree(current_categories, self.start_level, self.expand_level)
         category_tree = ct.get_category_tree()
 
-        result = render_to_string(
+        return render_to_string(
             "lfs/portlets/categories.html",
             request=request,
             context={
@@ -63,10 +51,6 @@ class CategoriesPortlet(Portlet):
             },
         )
 
-        cache.set(cache_key, result)
-
-        return result
-
     def form(self, **kwargs):
         return CategoriesPortletForm(instance=self, **kwargs)
 
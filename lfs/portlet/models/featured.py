@@ -24,26 +24,35 @@ class FeaturedPortlet(Portlet):
     current_category = models.BooleanField(_("Use current category"), default=False)
     slideshow = models.BooleanField(_("Slideshow"), default=False)
 
+    # The rendered portlet is cached, see lfs.portlet.utils.render_portlets
+    cache_vary_on = ("category", "prices")
+    cache_tags = ("shop", "products", "prices", "featured")
+
     @property
     def rendered_title(self):
         return self.title or self.name
 
-    def render(self, context):
-        """Renders the portlet as html."""
+    def get_products(self, context):
+        """Returns the displayed products."""
         request = context.get("request")
 
+        featured = FeaturedProduct.objects.select_related("product")
         if self.current_category:
             obj = context.get("category") or context.get("product")
             if obj:
                 category = obj if isinstance(obj, Category) else obj.get_current_category(request)
-                categories = [category]
-                categories.extend(category.get_all_children())
-                filters = {"product__categories__in": categories}
-                products = [x.product for x in FeaturedProduct.objects.filter(**filters)[: self.limit]]
+                filters = {"product__categories__ancestor_links__ancestor": category}
+                return [x.product for x in featured.filter(**filters)[: self.limit]]
             else:
-                products = None
+                return None
         else:
-            products = [x.product for x in FeaturedProduct.objects.all()[: self.limit]]
+            return [x.product for x in featured[: self.limit]]
+
+    def render(self, context, products=None):
+        """Renders the portlet as html."""
+        request = context.get("request")
+        if products is None:
+            products = self.get_products(context)
 
         return render_to_string(
             "lfs/portlets/featured.html",
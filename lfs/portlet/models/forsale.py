@@ -21,12 +21,16 @@ class ForsalePortlet(Portlet):
     current_category = models.BooleanField(_("Use current category"), default=False)
     slideshow = models.BooleanField(_("Slideshow"), default=False)
 
+    # The rendered portlet is cached, see lfs.portlet.utils.render_portlets
+    cache_vary_on = ("category", "prices")
+    cache_tags = ("shop", "products", "prices")
+
     @property
     def rendered_title(self):
         return self.title or self.name
 
-    def render(self, context):
-        """Renders the portlet as html."""
+    def get_products(self, context):
+        """Returns the displayed products."""
         request = context.get("request")
 
         products = Product.objects.filter(for_sale=True)
@@ -34,13 +38,17 @@ class ForsalePortlet(Portlet):
             obj = context.get("category") or context.get("product")
             if obj:
                 category = obj if isinstance(obj, Category) else obj.get_current_category(request)
-                categories = [category]
-                categories.extend(category.get_all_children())
-                products = products.filter(categories__in=categories)[: self.limit]
+                return list(products.filter(categories__ancestor_links__ancestor=category)[: self.limit])
             else:
-                products = None
+                return None
         else:
-            products = products[: self.limit]
+            return list(products[: self.limit])
+
+    def render(self, context, products=None):
+        """Renders the portlet as html."""
+        request = context.get("request")
+        if products is None:
+            products = self.get_products(context)
 
         return render_to_string(
             "lfs/portlets/forsale.html",
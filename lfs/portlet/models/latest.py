@@ -24,12 +24,16 @@ class LatestPortlet(Portlet):
     current_category = models.BooleanField(_("Use current category"), default=False)
     slideshow = models.BooleanField(_("Slideshow"), default=False)
 
+    # The rendered portlet is cached, see lfs.portlet.utils.render_portlets
+    cache_vary_on = ("category", "prices")
+    cache_tags = ("shop", "products", "prices")
+
     @property
     def rendered_title(self):
         return self.title or self.name
 
-    def render(self, context):
-        """Renders the portlet as html."""
+    def get_products(self, context):
+        """Returns the displayed products."""
         request = context.get("request")
 
         latest_products = []
@@ -38,10 +42,8 @@ class LatestPortlet(Portlet):
             obj = context.get("category") or context.get("product")
             if obj:
                 category = obj if isinstance(obj, Category) else obj.get_current_category(request)
-                categories = [category]
-                categories.extend(category.get_all_children())
-                filters = {"product__categories__in": categories}
-                products = products.filter(**filters).order_by("-creation_date")[: self.limit]
+                filters = {"categories__ancestor_links__ancestor": category}
+                products = products.filter(**filters).distinct().order_by("-creation_date")[: self.limit]
         else:
             products = products.order_by("-creation_date")[: self.limit]
 
@@ -51,10 +53,18 @@ class LatestPortlet(Portlet):
             else:
                 latest_products.append(product)
 
+        return latest_products
+
+    def render(self, context, products=None):
+        """Renders the portlet as html."""
+        request = context.get("request")
+        if products is None:
+            products = self.get_products(context)
+
         return render_to_string(
             "lfs/portlets/latest.html",
             request=request,
-            context={"title": self.rendered_title, "slideshow": self.slideshow, "products": latest_products},
+            context={"title": self.rendered_title, "slideshow": self.slideshow, "products": products},
         )
 
     def form(self, **kwargs):
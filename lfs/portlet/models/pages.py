@@ -14,6 +14,10 @@ from lfs.page.models import Page
 class PagesPortlet(Portlet):
     """Portlet to display pages."""
 
+    # The rendered portlet is cached, see lfs.portlet.utils.render_portlets
+    cache_vary_on = ()
+    cache_tags = ("shop", "pages")
+
     class Meta:
         app_label = "portlet"
 
@@ -15,14 +15,18 @@ from lfs.caching.utils import lfs_get_object
 class RecentProductsPortlet(Portlet):
     """Portlet to display recent visited products."""
 
+    # The rendered portlet is cached, see lfs.portlet.utils.render_portlets
+    cache_vary_on = ("product", "recent_products")
+    cache_tags = ("shop", "products")
+
     class Meta:
         app_label = "portlet"
 
     def __str__(self):
         return "%s" % self.id
 
-    def render(self, context):
-        """Renders the portlet as html."""
+    def get_products(self, context):
+        """Returns the displayed products."""
         object = context.get("product")
         slug_not_to_display = ""
         limit = settings.LFS_RECENT_PRODUCTS_LIMIT
@@ -43,6 +47,14 @@ class RecentProductsPortlet(Portlet):
                 product = product.get_default_variant()
             products.append(product)
 
+        return products
+
+    def render(self, context, products=None):
+        """Renders the portlet as html."""
+        request = context.get("request")
+        if products is None:
+            products = self.get_products(context)
+
         return render_to_string(
             "lfs/portlets/recent_products.html",
             request=request,
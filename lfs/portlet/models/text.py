@@ -13,6 +13,10 @@ class TextPortlet(Portlet):
 
     text = models.TextField(_("Text"), blank=True)
 
+    # The rendered portlet is cached, see lfs.portlet.utils.render_portlets
+    cache_vary_on = ()
+    cache_tags = ("shop",)
+
     class Meta:
         app_label = "portlet"
 
@@ -17,23 +17,34 @@ class TopsellerPortlet(Portlet):
 
     limit = models.IntegerField(default=5)
 
+    # The rendered portlet is cached, see lfs.portlet.utils.render_portlets
+    cache_vary_on = ("category",)
+    cache_tags = ("shop", "products", "topseller")
+
     class Meta:
         app_label = "portlet"
 
     def __str__(self):
         return "%s" % self.id
 
-    def render(self, context):
-        """Renders the portlet as html."""
-        request = context.get("request")
+    def get_products(self, context):
+        """Returns the displayed products."""
         object = context.get("category") or context.get("product")
         if object is None:
-            topseller = lfs.marketing.utils.get_topseller(self.limit)
+            return lfs.marketing.utils.get_topseller(self.limit)
         elif isinstance(object, lfs.catalog.models.Product):
             category = object.get_current_category(context.get("request"))
-            topseller = lfs.marketing.utils.get_topseller_for_category(category, self.limit)
+            return lfs.marketing.utils.get_topseller_for_category(category, self.limit)
+        else:
+            return lfs.marketing.utils.get_topseller_for_category(object, self.limit)
+
+    def render(self, context, products=None):
+        """Renders the portlet as html."""
+        request = context.get("request")
+        if products is None:
+            topseller = self.get_products(context)
         else:
-            topseller = lfs.marketing.utils.get_topseller_for_category(object, self.limit)
+            topseller = products
 
         return render_to_string(
             "lfs/portlets/topseller.html",
@@ -1,17 +1,19 @@
 from django import template
 from django.conf import settings
-from django.core.cache import cache
 from django.utils.translation import gettext_lazy as _
 
 from portlets.models import Slot
 
 import lfs.core.utils
+from lfs.caching.utils import get_tagged
+from lfs.caching.utils import set_tagged
 from lfs.portlet.models.cart import CartPortlet
 from lfs.portlet.models.categories import CategoriesPortlet
 from lfs.portlet.models.pages import PagesPortlet
 from lfs.portlet.models.recent_products import RecentProductsPortlet
 from lfs.portlet.models.related_products import RelatedProductsPortlet
 from lfs.portlet.models.topseller import TopsellerPortlet
+from lfs.portlet.utils import render_portlets
 
 register = template.Library()
 
@@ -38,7 +40,7 @@ def lfs_portlet_slot(context, slot_name):
         instance.__class__.__name__,
         instance.id,
     )
-    temp = cache.get(cache_key)
+    temp = get_tagged(cache_key)
 
     if temp is None:
         try:
@@ -76,13 +78,10 @@ def lfs_portlet_slot(context, slot_name):
                 if p not in temp:
                     temp.insert(0, p)
 
-            cache.set(cache_key, temp)
+        # The shop is the last parent for portlets
+        set_tagged(cache_key, temp, ["shop", "portlets", "categories"])
 
-    rendered_portlets = []
-    for portlet in temp:
-        rendered_portlets.append(portlet.render(context))
-
-    return {"portlets": rendered_portlets}
+    return {"portlets": render_portlets(temp, context)}
 
 
 # Inclusion tags to render portlets. This can be used if one wants to display
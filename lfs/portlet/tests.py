@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.file import SessionStore
+from django.test import TestCase
+
+from lfs.catalog.models import Category
+from lfs.catalog.models import Product
+from lfs.core.signals import product_changed
+from lfs.marketing.models import FeaturedProduct
+from lfs.portlet.models import FeaturedPortlet
+from lfs.portlet.models import TextPortlet
+from lfs.portlet.utils import get_portlet_cache_key
+from lfs.portlet.utils import render_portlets
+from lfs.tests.utils import RequestFactory
+
+
+class RenderPortletsTestCase(TestCase):
+    """Tests lfs.portlet.utils.render_portlets"""
+
+    fixtures = ["lfs_shop.xml"]
+
+    def setUp(self):
+        self.request = RequestFactory().get("/")
+        self.request.session = SessionStore()
+        self.request.user = AnonymousUser()
+        self.context = {"request": self.request}
+
+        self.text = TextPortlet.objects.create(title="Text", text="Hello")
+        self.featured = FeaturedPortlet.objects.create(title="Featured", limit=5)
+        self.product = Product.objects.create(name="Product 1", slug="product-1", active=True, price=10)
+        FeaturedProduct.objects.create(product=self.product, position=1)
+
+    def test_cached(self):
+        html = render_portlets([self.text, self.featured], self.context)
+        self.assertTrue("Hello" in html[0])
+        self.assertTrue("Product 1" in html[1])
+
+        with patch.object(TextPortlet, "render") as render:
+            with patch.object(FeaturedPortlet, "get_products") as get_products:
+                self.assertEqual(render_portlets([self.text, self.featured], self.context), html)
+        render.assert_not_called()
+        get_products.assert_not_called()
+
+    def test_invalidation(self):
+        render_portlets([self.text, self.featured], self.context)
+
+        self.text.text = "Good bye"
+        self.text.save()
+        self.assertTrue("Good bye" in render_portlets([self.text], self.context)[0])
+
+        Product.objects.filter(pk=self.product.pk).update(name="Product 2")
+        product_changed.send(self.product)
+        self.assertTrue("Product 2" in render_portlets([self.featured], self.context)[0])
+
+    def test_cache_key(self):
+        key = get_portlet_cache_key(self.featured, self.context)
+        category = Category.objects.create(name="Category 1", slug="category-1")
+        self.assertNotEqual(key, get_portlet_cache_key(self.featured, {"request": self.request, "category": category}))
+
+        # Unsaved portlets, e.g. of the inclusion tags, aren't cached
+        self.assertEqual(get_portlet_cache_key(TextPortlet(text="Hello"), self.context), None)
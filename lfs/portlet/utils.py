@@ -0,0 +1,176 @@
+# python imports
+import hashlib
+
+# django imports
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import prefetch_related_objects
+from django.utils import translation
+
+# lfs imports
+from lfs.caching.utils import cache_get_many
+from lfs.caching.utils import cache_set
+from lfs.caching.utils import get_many_tagged
+from lfs.caching.utils import set_tagged
+
+
+def render_portlets(portlets, context):
+    """Renders given portlets and returns a list of their HTML.
+
+    Portlets which declare ``cache_vary_on`` (a list of dimensions the HTML
+    depends on, see get_portlet_cache_key) are served from the cache; all of
+    them are looked up with one round trip. The products of the portlets
+    which have to be rendered are loaded in one batch, see
+    prefetch_portlet_products.
+    """
+    cache_keys = [get_portlet_cache_key(portlet, context) for portlet in portlets]
+    cached = get_many_tagged([cache_key for cache_key in cache_keys if cache_key is not None])
+
+    # Portlets which provide their products separately (get_products) get the
+    # products of all portlets prefetched at once.
+    products = {}
+    for i, portlet in enumerate(portlets):
+        if cache_keys[i] not in cached and hasattr(portlet, "get_products"):
+            products[i] = portlet.get_products(context)
+    prefetch_portlet_products([product for group in products.values() for product in group or []])
+
+    rendered_portlets = []
+    for i, portlet in enumerate(portlets):
+        cache_key = cache_keys[i]
+        if cache_key in cached:
+            rendered_portlets.append(cached[cache_key])
+            continue
+
+        if i in products:
+            html = portlet.render(context, products=products[i])
+        else:
+            html = portlet.render(context)
+
+        if cache_key is not None:
+            set_tagged(cache_key, html, get_portlet_cache_tags(portlet, context))
+        rendered_portlets.append(html)
+
+    return rendered_portlets
+
+
+def get_portlet_cache_key(portlet, context):
+    """Returns the cache key of the rendered HTML of given portlet or None if
+    the portlet isn't cached.
+
+    The key contains the language and the values of the dimensions the
+    portlet declares within ``cache_vary_on``:
+
+    category
+        The current category, i.e. the displayed category or the current
+        category of the displayed product.
+
+    product
+        The displayed product.
+
+    user
+        The current user.
+
+    cart
+        The cart of the current customer.
+
+    prices
+        The facts the customer taxes are checked against (shipping country,
+        shipping and payment method).
+
+    recent_products
+        The products the customer has visited recently.
+    """
+    vary_on = getattr(portlet, "cache_vary_on", None)
+    if vary_on is None or portlet.id is None:
+        return None
+
+    values = [portlet.__class__.__name__, portlet.id, translation.get_language()]
+    for dimension in vary_on:
+        values.append(_get_vary_value(dimension, context))
+
+    return "%s-portlet-%s" % (
+        settings.CACHE_MIDDLEWARE_KEY_PREFIX,
+        hashlib.md5("|".join([str(value) for value in values]).encode("utf-8")).hexdigest(),
+    )
+
+
+def get_portlet_cache_tags(portlet, context):
+    """Returns the tags of the rendered HTML of given portlet, see
+    lfs.caching.utils.set_tagged.
+    """
+    tags = ["portlets"]
+    tags.extend(getattr(portlet, "cache_tags", []))
+    if "cart" in portlet.cache_vary_on:
+        tags.append("cart:%s" % _get_vary_value("cart", context))
+    return tags
+
+
+def prefetch_portlet_products(products):
+    """Loads the parents and images of given products at once, which are
+    needed to render them within portlets.
+    """
+    from lfs.catalog.models import Image
+    from lfs.catalog.models import Product
+
+    products = [product for product in products if product is not None]
+    if not products:
+        return
+
+    prefetch_related_objects([product for product in products if product.parent_id], "parent")
+
+    # The images are cached per product, see Product.get_images
+    cache_keys = dict(
+        ("%s-product-images-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, product.id), product) for product in products
+    )
+    cached = cache_get_many(list(cache_keys.keys()))
+    missing = [(cache_key, product) for (cache_key, product) in cache_keys.items() if cache_key not in cached]
+    if not missing:
+        return
+
+    owner_ids = {}
+    for cache_key, product in missing:
+        if product.is_variant() and not product.active_images:
+            owner_ids[cache_key] = product.parent_id
+        else:
+            owner_ids[cache_key] = product.id
+
+    images = {}
+    ctype = ContentType.objects.get_for_model(Product)
+    for image in Image.objects.filter(content_type=ctype, content_id__in=set(owner_ids.values())):
+        images.setdefault(image.content_id, []).append(image)
+
+    for cache_key, owner_id in owner_ids.items():
+        cache_set(cache_key, images.get(owner_id, []))
+
+
+def _get_vary_value(dimension, context):
+    request = context.get("request")
+
+    if dimension == "category":
+        category = context.get("category")
+        if category is None and context.get("product") is not None:
+            category = context.get("product").get_current_category(request)
+        return category.id if category is not None else None
+
+    if dimension == "product":
+        product = context.get("product")
+        return product.id if product is not None else None
+
+    if dimension == "user":
+        return request.user.pk
+
+    if dimension == "cart":
+        import lfs.cart.utils
+
+        cart = lfs.cart.utils.get_cart(request)
+        return cart.id if cart is not None else None
+
+    if dimension == "prices":
+        from lfs.customer_tax.utils import get_customer_tax_context
+
+        return get_customer_tax_context(request)
+
+    if dimension == "recent_products":
+        return ",".join(request.session.get("RECENT_PRODUCTS", []))
+
+    raise ValueError("Unknown portlet cache dimension: %s" % dimension)
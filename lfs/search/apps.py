@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class LfsSearchAppConfig(AppConfig):
+    name = "lfs.search"
+
+    def ready(self):
+        from . import listeners  # NOQA
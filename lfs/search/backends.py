@@ -0,0 +1,84 @@
+from django.db.models import Q
+
+import lfs.core.utils
+import lfs.search.index
+from lfs.search.settings import SEARCH_BACKEND
+
+
+class SearchBackend(object):
+    """
+    Base class from which all search backends should inherit. The backend is
+    selected via the LFS_SEARCH_BACKEND setting.
+    """
+
+    def search(self, query, candidates=None):
+        """
+        Returns the ids of the active products which match given query,
+        ordered by relevance.
+
+        **Parameters:**
+
+        candidates
+            Ids of products the result is restricted to, e.g. the result of a
+            shorter query, see lfs.search.livesearch.
+        """
+        raise NotImplementedError
+
+    def update_product(self, product):
+        """
+        Is called after given product has been changed.
+        """
+        pass
+
+    def remove_product(self, product):
+        """
+        Is called after given product has been deleted.
+        """
+        pass
+
+
+class DatabaseBackend(SearchBackend):
+    """
+    Searches the product fields directly within the database. Needs the
+    unaccent lookup of PostgreSQL.
+    """
+
+    def search(self, query, candidates=None):
+        from lfs.catalog.models import Product
+
+        products = Product.objects.filter(
+            Q(active=True)
+            & (
+                Q(name__unaccent__icontains=query)
+                | Q(short_description__unaccent__icontains=query)
+                | Q(description__unaccent__icontains=query)
+                | Q(manufacturer__name__unaccent__icontains=query)
+                | Q(sku_manufacturer__unaccent__icontains=query)
+            )
+        )
+        if candidates is not None:
+            products = products.filter(pk__in=candidates)
+        return list(products.values_list("id", flat=True))
+
+
+class IndexBackend(SearchBackend):
+    """
+    Searches an inverted index of the products, which is rebuilt after
+    products have been changed, see lfs.search.index.
+    """
+
+    def search(self, query, candidates=None):
+        return lfs.search.index.search(query, candidates)
+
+    def update_product(self, product):
+        lfs.search.index.invalidate_search_index()
+
+    def remove_product(self, product):
+        lfs.search.index.invalidate_search_index()
+
+
+def get_search_backend():
+    """
+    Returns the search backend of the shop, see LFS_SEARCH_BACKEND.
+    """
+    return lfs.core.utils.import_symbol(SEARCH_BACKEND)()
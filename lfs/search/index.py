@@ -0,0 +1,278 @@
+import hashlib
+import re
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.html import strip_tags
+
+from lfs.caching.utils import get_cache_group_id
+from lfs.caching.utils import invalidate_cache_group_id
+
+# The searched fields of a product and the weight of a matching word
+FIELDS = (
+    ("name", 5),
+    ("sku_manufacturer", 4),
+    ("manufacturer__name", 3),
+    ("short_description", 2),
+    ("description", 1),
+)
+
+WORD_RE = re.compile(r"\w+")
+
+# Seconds a process may take to store a built index
+LOCK_TIMEOUT = 60
+
+
+def tokenize(text):
+    """Returns the words of given text in lower case, without accents and
+    HTML tags.
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", strip_tags(str(text)))
+    text = "".join([char for char in text if not unicodedata.combining(char)])
+    return WORD_RE.findall(text.lower())
+
+
+class IncompleteIndex(Exception):
+    """Raised if parts of a cached index have been evicted from the cache."""
+
+
+class SearchIndex(object):
+    """Inverted index of all active products, see lfs.search.backends.IndexBackend.
+
+    The index is stored within the cache word by word, hence a search just
+    loads the words it needs. It isn't changed once it has been stored;
+    changes of products increment the version of the index, which is rebuilt
+    on next access then, see invalidate_search_index.
+
+    **Attributes:**
+
+    version
+        The version of the index, which is part of its cache keys.
+
+    complete
+        True if the index has been built by this process and holds all
+        entries. Otherwise the entries are loaded from the cache on demand.
+
+    terms
+        First character to the sorted list of the indexed words which start
+        with it, used for prefix matching.
+
+    postings
+        Word to a dictionary of product id to score.
+
+    products
+        Product id to a dictionary of word to score.
+    """
+
+    def __init__(self, version, complete=False):
+        self.version = version
+        self.complete = complete
+        self.terms = {}
+        self.postings = {}
+        self.products = {}
+
+    @classmethod
+    def build(cls, version):
+        """Returns a new index of all active products."""
+        index = cls(version, complete=True)
+        for values in _get_products().values_list("id", *[field for (field, weight) in FIELDS]).iterator():
+            index._add(values[0], values[1:])
+        for term in index.postings:
+            index.terms.setdefault(term[0], []).append(term)
+        for terms in index.terms.values():
+            terms.sort()
+        return index
+
+    def store(self):
+        """Stores the index within the cache. The index is marked as stored
+        only if all of its entries could be stored. Does nothing if another
+        process is storing the same version right now.
+        """
+        lock_key = _get_cache_key(self.version, "lock")
+        if not cache.add(lock_key, True, LOCK_TIMEOUT):
+            return
+        try:
+            data = {}
+            for initial, terms in self.terms.items():
+                data[_get_cache_key(self.version, "terms", initial)] = terms
+            for term, postings in self.postings.items():
+                data[_get_cache_key(self.version, "term", term)] = postings
+            for product_id, terms in self.products.items():
+                data[_get_cache_key(self.version, "product", product_id)] = terms
+
+            if not cache.set_many(data):
+                cache.set(_get_cache_key(self.version, "stored"), True)
+        finally:
+            cache.delete(lock_key)
+
+    def is_stored(self):
+        """Returns True if the index has been stored completely."""
+        return cache.get(_get_cache_key(self.version, "stored")) is not None
+
+    def search(self, query, candidates=None):
+        """Returns the ids of the products which contain all words of given
+        query, ordered by relevance.
+
+        Every word of the query matches the indexed words it is a prefix of,
+        whereas exact matches get the full score and prefix matches the half.
+        Raises IncompleteIndex if needed entries are missing within the cache.
+
+        **Parameters:**
+
+        candidates
+            Ids of products the result is restricted to, e.g. the result of a
+            shorter query. The candidates are checked one by one instead of
+            scanning the indexed words.
+        """
+        words = set(tokenize(query))
+        if not words:
+            return []
+
+        if candidates is not None:
+            scores = self._score_candidates(words, candidates)
+        else:
+            scores = self._score(words)
+
+        return [product_id for (product_id, score) in sorted(scores.items(), key=lambda item: (-item[1], item[0]))]
+
+    def _score(self, words):
+        self._load(self.terms, "terms", set(word[0] for word in words))
+
+        matches = {}
+        for word in words:
+            terms = self.terms.get(word[0], [])
+            position = bisect_left(terms, word)
+            matches[word] = []
+            while position < len(terms) and terms[position].startswith(word):
+                matches[word].append(terms[position])
+                position += 1
+
+        self._load(self.postings, "term", set(term for terms in matches.values() for term in terms))
+
+        scores = None
+        for word in words:
+            word_scores = {}
+            for term in matches[word]:
+                factor = 1.0 if term == word else 0.5
+                for product_id, score in self.postings[term].items():
+                    word_scores[product_id] = max(word_scores.get(product_id, 0), score * factor)
+
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = dict(
+                    (product_id, score + word_scores[product_id])
+                    for (product_id, score) in scores.items()
+                    if product_id in word_scores
+                )
+
+            if not scores:
+                break
+
+        return scores
+
+    def _score_candidates(self, words, candidates):
+        try:
+            self._load(self.products, "product", candidates)
+        except IncompleteIndex:
+            # Some of the candidates aren't indexed (anymore) or have been
+            # evicted, hence they can't be told apart.
+            candidates = set(candidates)
+            return dict(
+                (product_id, score) for (product_id, score) in self._score(words).items() if product_id in candidates
+            )
+
+        scores = {}
+        for product_id in candidates:
+            terms = self.products.get(product_id, {})
+            total = 0
+            for word in words:
+                word_score = 0
+                for term, score in terms.items():
+                    if term.startswith(word):
+                        factor = 1.0 if term == word else 0.5
+                        word_score = max(word_score, score * factor)
+                if word_score == 0:
+                    break
+                total += word_score
+            else:
+                scores[product_id] = total
+        return scores
+
+    def _load(self, entries, kind, names):
+        """Loads the entries of given kind with given names from the cache
+        into entries, unless they have been loaded already.
+        """
+        if self.complete:
+            return
+        cache_keys = dict(
+            (_get_cache_key(self.version, kind, name), name) for name in names if name not in entries
+        )
+        if not cache_keys:
+            return
+        values = cache.get_many(list(cache_keys))
+        if len(values) != len(cache_keys):
+            raise IncompleteIndex()
+        for cache_key, value in values.items():
+            entries[cache_keys[cache_key]] = value
+
+    def _add(self, product_id, values):
+        terms = {}
+        for (field, weight), value in zip(FIELDS, values):
+            for term in set(tokenize(value)):
+                terms[term] = terms.get(term, 0) + weight
+        for term, score in terms.items():
+            self.postings.setdefault(term, {})[product_id] = score
+        self.products[product_id] = terms
+
+
+def _get_products():
+    from lfs.catalog.models import Product
+
+    return Product.objects.filter(active=True)
+
+
+def _get_cache_key(version, kind, name=""):
+    # Words might contain any characters, hence they are hashed
+    name = hashlib.md5(str(name).encode("utf-8")).hexdigest()
+    return "%s-search-index-%s-%s-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, version, kind, name)
+
+
+def get_search_index():
+    """Returns the current search index. Builds and stores the index if it
+    isn't stored yet.
+    """
+    index = SearchIndex(get_cache_group_id("search-index"))
+    if index.is_stored():
+        return index
+
+    index = SearchIndex.build(index.version)
+    index.store()
+    return index
+
+
+def search(query, candidates=None):
+    """Searches the current search index, see SearchIndex.search. The index is
+    rebuilt if parts of it have been evicted from the cache.
+    """
+    try:
+        return get_search_index().search(query, candidates)
+    except IncompleteIndex:
+        invalidate_cache_group_id("search-index")
+        return get_search_index().search(query, candidates)
+
+
+def invalidate_search_index():
+    """Invalidates the search index by incrementing its version, e.g. after a
+    product has been changed.
+
+    This is done once more after the transaction has been committed, as an
+    index which is built in between would still contain the old data.
+    """
+    invalidate_cache_group_id("search-index")
+    transaction.on_commit(lambda: invalidate_cache_group_id("search-index"))
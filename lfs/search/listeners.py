@@ -0,0 +1,60 @@
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from lfs.catalog.models import Product
+from lfs.core.signals import manufacturer_changed
+from lfs.core.signals import product_changed
+from lfs.search.backends import get_search_backend
+from lfs.search.index import invalidate_search_index
+from lfs.search.livesearch import invalidate_livesearch_cache
+
+
+@receiver(product_changed)
+def product_changed_listener(sender, **kwargs):
+    """
+    This is called after a product has been changed.
+
+    Updates the product within the search backend and invalidates the
+    livesearch results.
+    """
+    get_search_backend().update_product(sender)
+    invalidate_livesearch_cache()
+
+
+@receiver(post_save, sender=Product)
+def product_saved_listener(sender, instance, raw=False, **kwargs):
+    """
+    This is called after a product has been saved.
+
+    Updates the product within the search backend and invalidates the
+    livesearch results.
+    """
+    if raw:
+        return
+    get_search_backend().update_product(instance)
+    invalidate_livesearch_cache()
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted_listener(sender, instance, **kwargs):
+    """
+    This is called after a product has been deleted.
+
+    Removes the product from the search backend and invalidates the
+    livesearch results.
+    """
+    get_search_backend().remove_product(instance)
+    invalidate_livesearch_cache()
+
+
+@receiver(manufacturer_changed)
+def manufacturer_changed_listener(sender, **kwargs):
+    """
+    This is called after a manufacturer has been changed.
+
+    The manufacturer's name is indexed with all its products, hence the search
+    index is rebuilt.
+    """
+    invalidate_search_index()
+    invalidate_livesearch_cache()
@@ -0,0 +1,130 @@
+import threading
+from collections import OrderedDict
+
+from django.utils import translation
+
+from lfs.caching.utils import get_tag_versions
+from lfs.caching.utils import invalidate_tags
+from lfs.search.backends import get_search_backend
+from lfs.search.index import tokenize
+from lfs.search.settings import LIVESEARCH_CACHE_SIZE
+
+
+class LivesearchCache(object):
+    """LRU cache of the livesearch results of the current process.
+
+    It holds the found product ids per normalized query as well as the
+    rendered result fragments. The cache is bounded to ``size`` entries; the
+    least recently used entries are dropped first. All entries are dropped
+    if the "livesearch" tag has been invalidated, e.g. by another process
+    (see invalidate_livesearch_cache), or any tag the prices within the
+    rendered results depend on: "prices" (taxes), "criteria" (customer
+    taxes) and "shop" (price calculator of the shop).
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.version = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def validate(self):
+        """Drops all entries if the cache has been invalidated."""
+        version = get_tag_versions(["livesearch", "prices", "criteria", "shop"])
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+_cache = LivesearchCache(LIVESEARCH_CACHE_SIZE)
+
+
+def get_livesearch_cache():
+    """Returns the livesearch cache of the process."""
+    _cache.validate()
+    return _cache
+
+
+def invalidate_livesearch_cache():
+    """Invalidates the livesearch caches of all processes."""
+    invalidate_tags("livesearch")
+
+
+def normalize_query(q):
+    """Returns given query in lower case and with single spaces."""
+    return " ".join(q.lower().split())
+
+
+def get_product_ids(q):
+    """Returns the ids of the products which match given query, see
+    lfs.search.backends.SearchBackend.search.
+
+    The results are cached per normalized query. If the result of a shorter
+    query the customer has typed before is cached, just these products are
+    checked, as adding characters only narrows the result.
+    """
+    cache = get_livesearch_cache()
+    query = normalize_query(q)
+
+    product_ids = cache.get(("ids", query))
+    if product_ids is not None:
+        return product_ids
+
+    words = tokenize(query)
+    candidates = None
+    for i in range(len(query) - 1, 0, -1):
+        prefix = query[:i].rstrip()
+        candidates = cache.get(("ids", prefix))
+        if candidates is not None and _narrows(tokenize(prefix), words):
+            break
+        candidates = None
+
+    product_ids = get_search_backend().search(query, candidates)
+    cache.set(("ids", query), product_ids)
+    return product_ids
+
+
+def get_html_key(request, q, template_name):
+    """Returns the key of the rendered results for given query and the
+    current customer.
+
+    The prices within the results depend on the customer taxes, hence the
+    facts these are checked against (shipping country, shipping and payment
+    method) are part of the key.
+    """
+    from lfs.criteria.rules import Facts
+
+    facts = Facts(request)
+    return (
+        "html",
+        template_name,
+        q,
+        translation.get_language(),
+        facts.country_id,
+        facts.shipping_method_id,
+        facts.payment_method_id,
+    )
+
+
+def _narrows(prefix_words, words):
+    """Returns True if every product which matches words matches the
+    prefix_words, too.
+    """
+    if not prefix_words:
+        return False
+    return all(any(word.startswith(prefix_word) for word in words) for prefix_word in prefix_words)
@@ -0,0 +1,4 @@
+from django.conf import settings
+
+SEARCH_BACKEND = getattr(settings, "LFS_SEARCH_BACKEND", "lfs.search.backends.DatabaseBackend")
+LIVESEARCH_CACHE_SIZE = getattr(settings, "LFS_LIVESEARCH_CACHE_SIZE", 1000)
@@ -1,9 +1,23 @@
 # django imports
+from unittest.mock import patch
+
+from django.core.cache import cache
 from django.urls import reverse
 from django.test import TestCase
 
 # test imports
 from lfs.catalog.models import Product
+from lfs.core.signals import product_changed
+from lfs.manufacturer.models import Manufacturer
+from lfs.search.index import SearchIndex
+from lfs.search.index import _get_cache_key
+from lfs.search.index import get_search_index
+from lfs.search.index import search
+from lfs.search.index import tokenize
+from lfs.search.livesearch import LivesearchCache
+from lfs.search.livesearch import get_livesearch_cache
+from lfs.search.livesearch import get_product_ids
+from lfs.tax.models import Tax
 
 
 class SearchTestCase(TestCase):
@@ -36,3 +50,160 @@ class SearchTestCase(TestCase):
         # Must not be found
         response = self.client.get(url, {"q": "Product"})
         self.assertFalse(response.content.find(b"Product 3") != -1)
+
+    @patch("lfs.search.backends.SEARCH_BACKEND", "lfs.search.backends.IndexBackend")
+    def test_livesearch(self):
+        """ """
+        url = reverse("lfs_livesearch")
+
+        response = self.client.get(url, {"q": "prod"})
+        self.assertFalse(response.content.find(b"Product 1") == -1)
+        self.assertTrue(response.content.find(b"Product 3") == -1)
+
+
+@patch("lfs.search.backends.SEARCH_BACKEND", "lfs.search.backends.IndexBackend")
+class SearchIndexTestCase(TestCase):
+    """Unit tests for lfs.search.index"""
+
+    fixtures = ["lfs_shop.xml"]
+
+    def setUp(self):
+        """ """
+        self.manufacturer = Manufacturer.objects.create(name="Acme", slug="acme")
+        self.p1 = Product.objects.create(
+            name="Red Shirt", slug="p1", description="<p>A shirt made of cotton</p>", active=True
+        )
+        self.p2 = Product.objects.create(
+            name="Café Mug",
+            slug="p2",
+            short_description="A mug for shirts",
+            active=True,
+            manufacturer=self.manufacturer,
+        )
+        self.p3 = Product.objects.create(name="Blue Shirt", slug="p3", active=False)
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("<b>Café</b> au Lait, 2x"), ["cafe", "au", "lait", "2x"])
+
+    def test_search(self):
+        index = get_search_index()
+
+        # Ranked by the field of the match, inactive products aren't indexed
+        self.assertEqual(index.search("shirt"), [self.p1.id, self.p2.id])
+        self.assertEqual(index.search("cotton"), [self.p1.id])
+
+        # Accents, prefixes and several words
+        self.assertEqual(index.search("cafe"), [self.p2.id])
+        self.assertEqual(index.search("ac"), [self.p2.id])
+        self.assertEqual(index.search("mug sh"), [self.p2.id])
+        self.assertEqual(index.search("mug hurz"), [])
+        self.assertEqual(index.search(""), [])
+
+    def test_stored(self):
+        get_search_index()
+
+        # The stored index is loaded word by word from the cache
+        with self.assertNumQueries(0):
+            index = get_search_index()
+            self.assertFalse(index.complete)
+            self.assertEqual(index.search("shirt"), [self.p1.id, self.p2.id])
+            self.assertEqual(index.search("shirt", [self.p2.id, self.p3.id]), [self.p2.id])
+        self.assertEqual(sorted(index.postings), ["shirt", "shirts"])
+
+        # Evicted parts lead to a rebuild
+        cache.delete(_get_cache_key(index.version, "term", "cotton"))
+        self.assertEqual(search("cotton"), [self.p1.id])
+        self.assertNotEqual(get_search_index().version, index.version)
+
+    def test_product_changed(self):
+        get_search_index()
+
+        # The index is rebuilt after the transaction has been committed, too,
+        # as an index built in between would contain the old data.
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Product.objects.filter(pk=self.p1.pk).update(name="Green Sweater")
+            product_changed.send(self.p1)
+            self.p3.active = True
+            self.p3.save()
+            get_search_index()
+        self.assertTrue(callbacks)
+
+        index = get_search_index()
+        self.assertEqual(index.search("sweater"), [self.p1.id])
+        self.assertEqual(index.search("red"), [])
+        self.assertEqual(index.search("shirt"), [self.p3.id, self.p1.id, self.p2.id])
+
+        self.p2.delete()
+        self.assertEqual(get_search_index().search("shirt"), [self.p3.id, self.p1.id])
+
+    def test_search_view(self):
+        self.p3.active = True
+        self.p3.save()
+        get_search_index()
+
+        # Products which have been deactivated without signals aren't displayed
+        Product.objects.filter(pk=self.p2.pk).update(active=False)
+
+        session = self.client.session
+        session["sorting"] = "-name"
+        session.save()
+
+        response = self.client.get(reverse("lfs_search"), {"q": "shirt"})
+        self.assertEqual([product.id for product in response.context["products"]], [self.p1.id, self.p3.id])
+
+
+@patch("lfs.search.backends.SEARCH_BACKEND", "lfs.search.backends.IndexBackend")
+class LivesearchTestCase(TestCase):
+    """Unit tests for lfs.search.livesearch"""
+
+    fixtures = ["lfs_shop.xml"]
+
+    def setUp(self):
+        """ """
+        self.p1 = Product.objects.create(name="Red Shirt", slug="p1", active=True)
+        self.p2 = Product.objects.create(name="Blue Shirt", slug="p2", active=True)
+        self.p3 = Product.objects.create(name="Shoe", slug="p3", active=True)
+
+    def test_prefix_reuse(self):
+        self.assertEqual(get_product_ids("Sh"), [self.p1.id, self.p2.id, self.p3.id])
+
+        # The longer query just checks the products of the shorter one
+        with patch.object(SearchIndex, "_score") as score:
+            self.assertEqual(get_product_ids("shi"), [self.p1.id, self.p2.id])
+            self.assertEqual(get_product_ids("Shirt  re"), [self.p1.id])
+        score.assert_not_called()
+
+        self.assertEqual(get_search_index().search("shirt re"), [self.p1.id])
+
+    def test_invalidation(self):
+        self.assertEqual(get_product_ids("shoe"), [self.p3.id])
+
+        Product.objects.filter(pk=self.p1.pk).update(name="Red Shoe")
+        product_changed.send(self.p1)
+        self.assertEqual(get_product_ids("shoe"), [self.p1.id, self.p3.id])
+
+    def test_tax_changed(self):
+        get_product_ids("shoe")
+        self.assertTrue(get_livesearch_cache().entries)
+
+        # The rendered results contain prices
+        Tax.objects.create(rate=19)
+        self.assertFalse(get_livesearch_cache().entries)
+
+    def test_lru(self):
+        cache = LivesearchCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(list(cache.entries.keys()), ["a", "c"])
+
+    def test_rendered_results(self):
+        url = reverse("lfs_livesearch")
+        response = self.client.get(url, {"q": "shirt"})
+        self.assertFalse(response.content.find(b"Red Shirt") == -1)
+
+        with patch("lfs.search.views.render_to_string") as render_to_string:
+            cached = self.client.get(url, {"q": "shirt"})
+        render_to_string.assert_not_called()
+        self.assertEqual(cached.content, response.content)
@@ -4,7 +4,6 @@ from django.core.paginator import EmptyPage
 from django.core.paginator import InvalidPage
 from django.core.paginator import Paginator
 from django.urls import reverse
-from django.db.models import Q
 from django.http import HttpResponse
 from django.shortcuts import render
 from django.template.loader import render_to_string
@@ -13,8 +12,10 @@ from django.utils.translation import ngettext
 import lfs.catalog.utils
 from lfs.catalog.models import Product
 from lfs.core.utils import lfs_pagination
-
-from django.db.models import Q
+from lfs.search.backends import get_search_backend
+from lfs.search.livesearch import get_html_key
+from lfs.search.livesearch import get_livesearch_cache
+from lfs.search.livesearch import get_product_ids
 
 
 def livesearch(request, template_name="lfs/search/livesearch_results.html"):
@@ -28,28 +29,23 @@ def livesearch(request, template_name="lfs/search/livesearch_results.html"):
             }
         )
     else:
-        # Products
-        query = Q(active=True) & (
-            Q(name__unaccent__icontains=q)
-            | Q(short_description__unaccent__icontains=q)
-            | Q(description__unaccent__icontains=q)
-            | Q(manufacturer__name__unaccent__icontains=q)
-            | Q(sku_manufacturer__unaccent__icontains=q)
-        )
-
-        temp = Product.objects.filter(query)
-        total = temp.count()
-        products = temp[0:5]
-
-        products = render_to_string(
-            template_name,
-            request=request,
-            context={
-                "products": products,
-                "q": q,
-                "total": total,
-            },
-        )
+        # The rendered results are cached, see lfs.search.livesearch
+        cache = get_livesearch_cache()
+        html_key = get_html_key(request, q, template_name)
+        products = cache.get(html_key)
+
+        if products is None:
+            product_ids = get_product_ids(q)
+            products = render_to_string(
+                template_name,
+                request=request,
+                context={
+                    "products": _get_products(product_ids[0:5]),
+                    "q": q,
+                    "total": len(product_ids),
+                },
+            )
+            cache.set(html_key, products)
 
         result = json.dumps(
             {
@@ -79,30 +75,23 @@ def search(request, template_name="lfs/search/search_results.html"):
 
     start = request.GET.get("start", 1)
 
-    # Products
-    query = Q(active=True) & (
-        Q(name__unaccent__icontains=q)
-        | Q(short_description__unaccent__icontains=q)
-        | Q(description__unaccent__icontains=q)
-        | Q(manufacturer__name__unaccent__icontains=q)
-        | Q(sku_manufacturer__unaccent__icontains=q)
-    )
-
-    products = Product.objects.filter(query)
-    amount_of_products = products.count()
+    # Products, ordered by relevance
+    product_ids = get_search_backend().search(q)
+    amount_of_products = len(product_ids)
 
     # Sorting
     sorting = request.session.get("sorting")
-    if sorting:
-        products = products.order_by(sorting)
+    if sorting and product_ids:
+        product_ids = lfs.catalog.utils.sort_product_ids(product_ids, sorting)
 
-    # prepare paginator
-    paginator = Paginator(products, 10)
+    # prepare paginator; just the products of the current page are loaded
+    paginator = Paginator(product_ids, 10)
 
     try:
         current_page = paginator.page(start)
     except (EmptyPage, InvalidPage):
         current_page = paginator.page(paginator.num_pages)
+    current_page.object_list = _get_products(current_page.object_list)
 
     # Calculate urls
     pagination_data = lfs_pagination(request, current_page, url=reverse("lfs_search"))
@@ -128,7 +117,20 @@ def search(request, template_name="lfs/search/search_results.html"):
             "products": current_page,
             "pagination": pagination_data,
             "q": q,
-            "total": products.count(),
+            "total": amount_of_products,
             "item_list_tracking": item_list_tracking,
         },
     )
+
+
+def _get_products(product_ids):
+    """Returns the active products with given ids in the same order. The ids
+    might contain products which have been deactivated since they have been
+    found, e.g. by the cached search index.
+    """
+    products = Product.objects.in_bulk(product_ids)
+    return [
+        products[product_id]
+        for product_id in product_ids
+        if product_id in products and products[product_id].active
+    ]
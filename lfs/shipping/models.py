@@ -4,6 +4,7 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 # lfs imports
+from lfs.caching.utils import SimpleCacheManager
 from lfs.criteria.base import Criteria
 from lfs.catalog.models import DeliveryTime
 from lfs.core.utils import import_symbol
@@ -15,7 +16,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-class ActiveShippingMethodManager(models.Manager):
+class ActiveShippingMethodManager(SimpleCacheManager):
     """
     A manager which return just active shipping methods.
     """
@@ -157,6 +157,64 @@ class ShippingMethodTestCase(TestCase):
         self.assertEqual(dt.max, self.dt2.max)
         self.assertEqual(dt.unit, self.dt2.unit)
 
+    def test_get_product_delivery_times(self):
+        """Tests the cached delivery times of several products."""
+        request = create_request()
+        request.user = AnonymousUser()
+
+        dts = utils.get_product_delivery_times(request, [self.p1, self.p2])
+        self.assertEqual(dts[self.p1.id].max, self.dt1.max)
+        self.assertEqual(dts[self.p2.id].max, self.dt1.max)
+
+        # The delivery times are cached now
+        with self.assertNumQueries(0):
+            dts = utils.get_product_delivery_times(request, [self.p1, self.p2])
+        self.assertEqual(dts[self.p1.id].max, self.dt1.max)
+
+        # Changes of the delivery time are taken over
+        self.dt1.max = 10
+        self.dt1.save()
+        dts = utils.get_product_delivery_times(request, [self.p1, self.p2])
+        self.assertEqual(dts[self.p1.id].max, 10)
+
+        # Changes of the product are taken over
+        self.p2.manual_delivery_time = True
+        self.p2.delivery_time = self.dt3
+        self.p2.save()
+        dts = utils.get_product_delivery_times(request, [self.p1, self.p2])
+        self.assertEqual(dts[self.p1.id].max, 10)
+        self.assertEqual(dts[self.p2.id].max, self.dt3.max)
+
+    def test_get_product_delivery_times_for_cart(self):
+        """Tests that the delivery times within the cart depend on the cart."""
+        request = create_request()
+        request.user = AnonymousUser()
+
+        # The standard shipping method is just valid for carts below 10
+        CartPriceCriterion.objects.create(content=self.sm1, value=10.0, operator=LESS_THAN)
+
+        # The selected shipping method isn't valid, hence the default shipping
+        # method (which depends on the cart) is taken.
+        sm3 = ShippingMethod.objects.create(name="Freight", active=True, delivery_time=self.dt3, priority=3)
+        CartPriceCriterion.objects.create(content=sm3, value=100.0, operator=GREATER_THAN)
+
+        request.session.save()
+        customer = get_or_create_customer(request)
+        customer.selected_shipping_method = sm3
+        customer.save()
+
+        cart = Cart.objects.create(session=request.session.session_key)
+        item = CartItem.objects.create(cart=cart, product=self.p1, amount=1)
+
+        dts = utils.get_product_delivery_times(request, [self.p1], for_cart=True)
+        self.assertEqual(dts[self.p1.id].max, self.dt1.max)
+
+        # Changes of the cart are taken over
+        item.amount = 2
+        item.save()
+        dts = utils.get_product_delivery_times(request, [self.p1], for_cart=True)
+        self.assertEqual(dts[self.p1.id].max, self.dt2.max)
+
     def test_active_shipping_methods_1(self):
         """Tests active shipping methods."""
         # At start we have two active shipping methods, see above.
@@ -3,7 +3,10 @@ from datetime import datetime
 from django.conf import settings
 from django.core.cache import cache
 
+import lfs.cart.utils
 import lfs.core.utils
+from lfs.caching.utils import get_many_tagged
+from lfs.caching.utils import set_tagged
 from lfs.catalog.models import DeliveryTime
 from lfs.catalog.settings import DELIVERY_TIME_UNIT_DAYS
 from lfs.catalog.settings import PRODUCT_WITH_VARIANTS
@@ -25,22 +28,61 @@ def get_product_delivery_time(request, product, for_cart=False):
     the opportunity to select a shipping method within the cart. If this
     shipping method is valid for the given product this one is taken, if not
     the default one - the default one is the first valid shipping method.
+
+    The delivery time is cached, see get_product_delivery_times.
     """
-    # TODO: Need a reasonable chaching here
-    if for_cart:
-        cache_key = "%s-shipping-delivery-time-cart-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, request.user.id)
-    else:
-        cache_key = "%s-shipping-delivery-time" % settings.CACHE_MIDDLEWARE_KEY_PREFIX
+    return get_product_delivery_times(request, [product], for_cart)[product.id]
 
-    shippings = None  # cache.get(cache_key)
-    if shippings is None:
-        shippings = {}
 
-    product_key = "product-%s" % product.id
-    shipping = shippings.get(product_key)
-    if shipping is not None:
-        return shipping
+def get_product_delivery_times(request, products, for_cart=False):
+    """Returns the delivery times of the passed products as dictionary of
+    product id to delivery time object. See get_product_delivery_time for the
+    meaning of ``for_cart``.
 
+    The delivery times are cached per product, shipping country, selected
+    payment method, day and - only if ``for_cart`` is True - selected shipping
+    method and cart, as the criteria of the shipping methods might depend on
+    all of them. They are invalidated if the product (e.g. its stock amount),
+    the shipping methods, the delivery times, the criteria, the shop or the
+    cart are changed.
+    """
+    country = get_selected_shipping_country(request)
+    # The explicitly selected payment method is taken, as the default one
+    # would need the valid payment methods to be calculated.
+    customer = customer_utils.get_customer(request)
+    key_prefix = "%s-shipping-delivery-time-%s-%s-%s" % (
+        settings.CACHE_MIDDLEWARE_KEY_PREFIX,
+        country.id if country else None,
+        customer.selected_payment_method_id if customer else None,
+        datetime.now().date().isoformat(),
+    )
+    tags = ["shipping", "criteria", "shop"]
+    if for_cart:
+        shipping_method = get_selected_shipping_method(request)
+        cart = lfs.cart.utils.get_cart(request)
+        key_prefix = "%s-cart-%s-%s" % (
+            key_prefix,
+            cart.id if cart else None,
+            shipping_method.id if shipping_method else None,
+        )
+        if cart is not None:
+            tags.append("cart:%s" % cart.id)
+
+    cache_keys = dict((product.id, "%s-%s" % (key_prefix, product.id)) for product in products)
+    delivery_times = get_many_tagged(list(cache_keys.values()))
+
+    result = {}
+    for product in products:
+        cache_key = cache_keys[product.id]
+        delivery_time = delivery_times.get(cache_key)
+        if delivery_time is None:
+            delivery_time = _calculate_product_delivery_time(request, product, for_cart)
+            set_tagged(cache_key, delivery_time, tags + ["product:%s" % (product.parent_id or product.id)])
+        result[product.id] = delivery_time
+    return result
+
+
+def _calculate_product_delivery_time(request, product, for_cart):
     # if the product is a product with variants we switch to the default
     # variant to calculate the delivery time. Please note that in this case
     # the default variant is also displayed.
@@ -98,11 +140,7 @@ def get_product_delivery_time(request, product, for_cart=False):
         delivery_time += order_time_left
         delivery_time = delivery_time.as_reasonable_unit()
 
-    delivery_time = delivery_time.round()
-    shippings[product_key] = delivery_time
-    cache.set(cache_key, shippings)
-
-    return delivery_time
+    return delivery_time.round()
 
 
 def update_to_valid_shipping_method(request, customer, save=False):
@@ -119,18 +157,13 @@ def update_to_valid_shipping_method(request, customer, save=False):
 
 def get_valid_shipping_methods(request, product=None):
     """Returns a list of all valid shipping methods for the passed request."""
-    result = []
-
     cache_key = "%s-all-active-shipping-methods" % settings.CACHE_MIDDLEWARE_KEY_PREFIX
     shipping_methods = cache.get(cache_key)
     if shipping_methods is None:
         shipping_methods = ShippingMethod.objects.filter(active=True)
         cache.set(cache_key, shipping_methods)
 
-    for sm in shipping_methods:
-        if sm.is_valid(request, product):
-            result.append(sm)
-    return result
+    return criteria_utils.get_valid(request, shipping_methods, product)
 
 
 def get_first_valid_shipping_method(request, product=None):
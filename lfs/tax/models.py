@@ -2,6 +2,9 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+# lfs imports
+from lfs.caching.utils import SimpleCacheManager
+
 
 class Tax(models.Model):
     """Represent a tax rate.
@@ -18,6 +21,8 @@ class Tax(models.Model):
     rate = models.FloatField(_("Rate"), default=0)
     description = models.TextField(_("Description"), blank=True)
 
+    objects = SimpleCacheManager()
+
     def __str__(self):
         return "%s%%" % self.rate
 
@@ -0,0 +1,193 @@
+# python imports
+import contextvars
+import functools
+import time
+
+# django imports
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.base import Template
+
+_MISSING = object()
+_request_stats = contextvars.ContextVar("lfs_request_stats", default=None)
+_template_render = Template.render
+
+
+class RequestStats(object):
+    """The numbers which are recorded for one request, see
+    lfs.utils.middleware.InstrumentationMiddleware.
+
+    **Attributes:**
+
+    queries / query_time
+        The amount of database queries and their duration in seconds.
+
+    cache_gets / cache_hits / cache_sets
+        The amount of keys which have been looked up, found and written.
+
+    cache_time
+        The duration of all cache round trips in seconds.
+
+    template_time
+        The duration of all template rendering in seconds. Included templates
+        are part of the including template.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.cache_gets = 0
+        self.cache_hits = 0
+        self.cache_sets = 0
+        self.cache_time = 0.0
+        self.template_time = 0.0
+        self._nested = False
+        self._rendering = False
+
+    @property
+    def cache_hit_ratio(self):
+        if not self.cache_gets:
+            return None
+        return float(self.cache_hits) / self.cache_gets
+
+    def as_dict(self):
+        return {
+            "queries": self.queries,
+            "query_time": round(self.query_time * 1000, 2),
+            "cache_gets": self.cache_gets,
+            "cache_hits": self.cache_hits,
+            "cache_sets": self.cache_sets,
+            "cache_hit_ratio": self.cache_hit_ratio,
+            "cache_time": round(self.cache_time * 1000, 2),
+            "template_time": round(self.template_time * 1000, 2),
+        }
+
+
+def start_request_stats():
+    """Starts recording for the current request (or context). Returns a token
+    to pass to stop_request_stats.
+    """
+    _instrument_caches()
+    _instrument_templates()
+    return _request_stats.set(RequestStats())
+
+
+def stop_request_stats(token):
+    """Stops the recording which has been started with given token and returns
+    the recorded RequestStats.
+    """
+    stats = _request_stats.get()
+    _request_stats.reset(token)
+    return stats
+
+
+def get_request_stats():
+    """Returns the RequestStats of the current request or None."""
+    return _request_stats.get()
+
+
+def record_queries():
+    """Returns a list of context managers which record the queries of all
+    database connections of the current thread.
+    """
+    return [connections[alias].execute_wrapper(_record_query) for alias in connections]
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - start
+
+
+def _instrument_caches():
+    # Cache instances are created per thread, hence every instance is wrapped
+    # once the first time it is used by a recorded request.
+    for alias in settings.CACHES:
+        cache = caches[alias]
+        if getattr(cache, "_lfs_instrumented", False):
+            continue
+        for name in ("get", "get_many"):
+            setattr(cache, name, _wrap_cache_get(getattr(cache, name), name == "get_many"))
+        for name in ("set", "set_many", "add"):
+            setattr(cache, name, _wrap_cache_set(getattr(cache, name), name == "set_many"))
+        cache._lfs_instrumented = True
+
+
+def _wrap_cache_get(method, many):
+    @functools.wraps(method)
+    def wrapper(key, *args, **kwargs):
+        stats = _request_stats.get()
+        if stats is None or stats._nested:
+            return method(key, *args, **kwargs)
+
+        # Backends might implement get_many by calling get, which must not be
+        # counted twice.
+        stats._nested = True
+        start = time.perf_counter()
+        try:
+            if many:
+                result = method(key, *args, **kwargs)
+                stats.cache_gets += len(key)
+                stats.cache_hits += len(result)
+                return result
+
+            default = args[0] if args else kwargs.pop("default", None)
+            result = method(key, _MISSING, *args[1:], **kwargs)
+            stats.cache_gets += 1
+            if result is _MISSING:
+                return default
+            stats.cache_hits += 1
+            return result
+        finally:
+            stats._nested = False
+            stats.cache_time += time.perf_counter() - start
+
+    return wrapper
+
+
+def _wrap_cache_set(method, many):
+    @functools.wraps(method)
+    def wrapper(key, *args, **kwargs):
+        stats = _request_stats.get()
+        if stats is None or stats._nested:
+            return method(key, *args, **kwargs)
+
+        stats._nested = True
+        start = time.perf_counter()
+        try:
+            return method(key, *args, **kwargs)
+        finally:
+            stats._nested = False
+            stats.cache_sets += len(key) if many else 1
+            stats.cache_time += time.perf_counter() - start
+
+    return wrapper
+
+
+def _instrument_templates():
+    if Template.render is not _template_render:
+        return
+
+    @functools.wraps(_template_render)
+    def render(self, context):
+        stats = _request_stats.get()
+        if stats is None or stats._rendering:
+            return _template_render(self, context)
+
+        stats._rendering = True
+        start = time.perf_counter()
+        try:
+            return _template_render(self, context)
+        finally:
+            stats._rendering = False
+            stats.template_time += time.perf_counter() - start
+
+    Template.render = render
@@ -1,63 +1,128 @@
 # python imports
-import hotshot
-import hotshot.stats
-import sys
-import tempfile
-from cStringIO import StringIO
+import cProfile
+import io
+import logging
+import pstats
+import random
+import time
+from contextlib import ExitStack
 
 # django imports
 from django.conf import settings
+from django.http import HttpResponse
 from django.http import HttpResponseServerError
 
+# lfs imports
+from lfs.utils.instrumentation import record_queries
+from lfs.utils.instrumentation import start_request_stats
+from lfs.utils.instrumentation import stop_request_stats
 
-class ProfileMiddleware(object):
+logger = logging.getLogger(__name__)
+
+
+class InstrumentationMiddleware(object):
     """
-    Displays hotshot profiling for any view.
-    http://yoursite.com/yourview/?prof
-
-    Add the "prof" key to query string by appending ?prof (or &prof=)
-    and you'll see the profiling results in your browser.
-    It's set up to only be available in django's debug mode,
-    but you really shouldn't add this middleware to any production configuration.
-    * Only tested on Linux
+    Records the database queries, cache round trips and template rendering of
+    a sampled fraction of the requests, see lfs.utils.instrumentation.
+
+    The numbers are logged with level INFO (the numbers are passed as
+    ``extra["instrumentation"]`` to the log record) and, if
+    ``LFS_INSTRUMENTATION_HEADERS`` is True, added to the response as
+    ``Server-Timing`` and ``X-LFS-*`` headers. Views which exceed their
+    query budget (``LFS_QUERY_BUDGETS``) are logged with level WARNING.
+
+    In debug mode the view can be profiled with cProfile by appending ?prof
+    to the URL. The profile is displayed instead of the response then.
     """
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.sample_rate = getattr(settings, "LFS_INSTRUMENTATION_SAMPLE_RATE", 1.0)
+        self.headers = getattr(settings, "LFS_INSTRUMENTATION_HEADERS", False)
+        self.query_budgets = getattr(settings, "LFS_QUERY_BUDGETS", {})
 
     def __call__(self, request):
-        if "prof" in request.GET:
-            self.tmpfile = tempfile.NamedTemporaryFile()
-            self.prof = hotshot.Profile(self.tmpfile.name)
-
-        response = self.get_response(request)
-
-        if "prof" in request.GET:
-            self.prof.close()
-
-            out = StringIO()
-            old_stdout = sys.stdout
-            sys.stdout = out
-
-            stats = hotshot.stats.load(self.tmpfile.name)
-            # stats.strip_dirs()
-            stats.sort_stats(
-                "cumulative",
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        request.view_name = None
+        token = start_request_stats()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for context_manager in record_queries():
+                    stack.enter_context(context_manager)
+                response = self.get_response(request)
+        finally:
+            stats = stop_request_stats(token)
+            total_time = time.perf_counter() - start
+
+        numbers = stats.as_dict()
+        numbers["total_time"] = round(total_time * 1000, 2)
+        numbers["path"] = request.path
+        numbers["view"] = request.view_name
+        request.instrumentation = numbers
+
+        logger.info(
+            "%(view)s %(path)s: %(queries)s queries (%(query_time)sms), %(cache_gets)s cache gets, "
+            "%(cache_hits)s hits, %(cache_sets)s cache sets (%(cache_time)sms), "
+            "templates %(template_time)sms, total %(total_time)sms" % numbers,
+            extra={"instrumentation": numbers},
+        )
+
+        budget = self._get_query_budget(request)
+        if budget is not None and stats.queries > budget:
+            logger.warning(
+                "Query budget of %s exceeded by %s %s: %s queries",
+                budget,
+                request.view_name,
+                request.path,
+                stats.queries,
+                extra={"instrumentation": numbers},
             )
-            # stats.sort_stats('time', )
-            stats.print_stats()
-
-            sys.stdout = old_stdout
-            stats_str = out.getvalue()
 
-            if response and response.content and stats_str:
-                response.content = "<pre>" + stats_str + "</pre>"
+        if self.headers:
+            self._add_headers(response, numbers)
 
         return response
 
     def process_view(self, request, callback, callback_args, callback_kwargs):
-        if "prof" in request.GET:
-            return self.prof.runcall(callback, request, *callback_args, **callback_kwargs)
+        request.view_name = "%s.%s" % (callback.__module__, getattr(callback, "__name__", callback.__class__.__name__))
+
+        if settings.DEBUG and "prof" in request.GET:
+            profile = cProfile.Profile()
+            profile.runcall(callback, request, *callback_args, **callback_kwargs)
+
+            out = io.StringIO()
+            stats = pstats.Stats(profile, stream=out)
+            stats.sort_stats("cumulative")
+            stats.print_stats()
+            return HttpResponse("<pre>%s</pre>" % out.getvalue())
+
+    def _get_query_budget(self, request):
+        """Returns the query budget of the current view, which is either
+        registered by URL name or by the dotted path of the view.
+        """
+        resolver_match = getattr(request, "resolver_match", None)
+        if resolver_match is not None and resolver_match.url_name in self.query_budgets:
+            return self.query_budgets[resolver_match.url_name]
+        return self.query_budgets.get(request.view_name)
+
+    def _add_headers(self, response, numbers):
+        response["Server-Timing"] = ", ".join(
+            [
+                "db;dur=%s" % numbers["query_time"],
+                "cache;dur=%s" % numbers["cache_time"],
+                "tpl;dur=%s" % numbers["template_time"],
+                "total;dur=%s" % numbers["total_time"],
+            ]
+        )
+        response["X-LFS-Queries"] = numbers["queries"]
+        response["X-LFS-Cache"] = "gets=%s, hits=%s, sets=%s" % (
+            numbers["cache_gets"],
+            numbers["cache_hits"],
+            numbers["cache_sets"],
+        )
 
 
 class AJAXSimpleExceptionResponse(object):
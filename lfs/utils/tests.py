@@ -0,0 +1,78 @@
+# django imports
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import modify_settings
+from django.test.utils import override_settings
+from django.urls import reverse
+
+# lfs imports
+from lfs.core.models import Shop
+from lfs.utils.instrumentation import record_queries
+from lfs.utils.instrumentation import start_request_stats
+from lfs.utils.instrumentation import stop_request_stats
+
+
+class InstrumentationTestCase(TestCase):
+    """Tests lfs.utils.instrumentation"""
+
+    fixtures = ["lfs_shop.xml"]
+
+    def test_request_stats(self):
+        cache.set("instrumentation-test", 1)
+
+        token = start_request_stats()
+        try:
+            with record_queries()[0]:
+                list(Shop.objects.all())
+            cache.get("instrumentation-test")
+            cache.get("instrumentation-missing")
+            cache.get_many(["instrumentation-test", "instrumentation-missing"])
+            cache.set_many({"instrumentation-a": 1, "instrumentation-b": 2})
+        finally:
+            stats = stop_request_stats(token)
+
+        self.assertEqual(stats.queries, 1)
+        self.assertEqual(stats.cache_gets, 4)
+        self.assertEqual(stats.cache_hits, 2)
+        self.assertEqual(stats.cache_sets, 2)
+        self.assertEqual(stats.cache_hit_ratio, 0.5)
+
+        # Nothing is recorded outside of a request
+        self.assertEqual(cache.get("instrumentation-missing", 42), 42)
+        self.assertEqual(stats.cache_gets, 4)
+
+
+@modify_settings(MIDDLEWARE={"append": "lfs.utils.middleware.InstrumentationMiddleware"})
+class InstrumentationMiddlewareTestCase(TestCase):
+    """Tests lfs.utils.middleware.InstrumentationMiddleware"""
+
+    fixtures = ["lfs_shop.xml"]
+
+    @override_settings(LFS_INSTRUMENTATION_HEADERS=True)
+    def test_headers(self):
+        response = self.client.get(reverse("lfs_shop_view"))
+        self.assertEqual(int(response["X-LFS-Queries"]), response.wsgi_request.instrumentation["queries"])
+        self.assertTrue(response.wsgi_request.instrumentation["queries"] > 0)
+        self.assertTrue(response.wsgi_request.instrumentation["template_time"] > 0)
+        self.assertTrue("total;dur=" in response["Server-Timing"])
+
+    def test_no_headers(self):
+        response = self.client.get(reverse("lfs_shop_view"))
+        self.assertFalse(response.has_header("X-LFS-Queries"))
+        self.assertEqual(response.wsgi_request.instrumentation["view"], "lfs.core.views.shop_view")
+
+    @override_settings(LFS_INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_sampling(self):
+        response = self.client.get(reverse("lfs_shop_view"))
+        self.assertFalse(hasattr(response.wsgi_request, "instrumentation"))
+
+    @override_settings(LFS_QUERY_BUDGETS={"lfs_shop_view": 0})
+    def test_query_budget(self):
+        with self.assertLogs("lfs.utils.middleware", level="WARNING") as logs:
+            self.client.get(reverse("lfs_shop_view"))
+        self.assertTrue("Query budget of 0 exceeded by lfs.core.views.shop_view" in logs.output[0])
+
+    @override_settings(DEBUG=True)
+    def test_profile(self):
+        response = self.client.get(reverse("lfs_shop_view") + "?prof")
+        self.assertTrue(b"function calls" in response.content)